@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+# wireops/benchmarks/bench_wireops.py
+
+"""
+Benchmarks for the wireops codecs.
+
+Covers every reader and writer exported by wireops.raw, every entry in
+the T_PUT_FUNCS, T_GET_FUNCS, and T_LEN_FUNCS tables, and whole-message
+encoding and decoding of the README's logEntry at several buffer sizes.
+Each result is the best time per operation, in nanoseconds, over a
+number of repeats.
+
+Typical use:
+
+    PYTHONPATH=src python3 benchmarks/bench_wireops.py --save base.json
+    ... upgrade or change something ...
+    PYTHONPATH=src python3 benchmarks/bench_wireops.py --compare base.json
+
+With --compare the exit status is 1 if any benchmark is slower than
+its baseline by more than the tolerance, 10% by default.
+"""
+
+import json
+import platform
+import sys
+import time
+from argparse import ArgumentParser
+from array import array
+
+import wireops
+from wireops import raw
+from wireops.enum import FieldTypes
+from wireops.raw import(
+    read_field_hdr, write_field_hdr, write_hdr_bytes, field_hdr_bytes,
+    read_raw_varint, write_raw_varint, write_varint_field,
+    read_varints, write_varints,
+    read_raw_packed_varint, write_packed_varint_field,
+    read_raw_b32, write_b32_field, read_raw_b64, write_b64_field,
+    read_raw_float, write_raw_float, write_float_field,
+    read_raw_double, write_raw_double, write_double_field,
+    read_raw_b32s, write_raw_b32s, read_raw_b64s, write_raw_b64s,
+    read_raw_floats, write_raw_floats, read_raw_doubles, write_raw_doubles,
+    read_raw_len_plus, write_len_plus_field,
+    read_raw_b128, write_b128_field, read_raw_b160, write_b160_field,
+    read_raw_b256, write_b256_field,
+    PACKED_FIXED_TYPES, read_raw_packed_fixed, write_raw_packed_fixed,
+    write_packed_fixed_field,
+    length_as_varint, decode_varint, WireBuffer)
+from wireops.spec import MessageSpec
+from wireops.typed import T_PUT_FUNCS, T_GET_FUNCS, T_LEN_FUNCS
+
+# operations timed per call of a benchmark's function
+BATCH = 100
+
+DEFAULT_TOLERANCE = 0.10
+
+LOG_ENTRY = MessageSpec('logEntry', [
+    ('timestamp', 0, FieldTypes.F_UINT32),
+    ('node_id', 1, FieldTypes.F_BYTES20),
+    ('key', 2, FieldTypes.F_BYTES20),
+    ('length', 3, FieldTypes.V_UINT32),
+    ('by', 4, FieldTypes.L_STRING),
+    ('path', 5, FieldTypes.L_STRING),
+])
+
+LOG_ENTRY_MSG = {
+    'timestamp': 1521828000,
+    'node_id': bytes(range(20)),
+    'key': bytes(range(20, 40)),
+    'length': 4096,
+    'by': 'jdd',
+    'path': '/var/app/sharedir/data/7f/3a/object.bin',
+}
+
+# a sample value for each field type, indexed by FieldTypes.value
+SAMPLES = [
+    True, 7, 300, -300, 1 << 40, -(1 << 40),
+    0xdeadbeef, -12345, 3.25, 1 << 60, -(1 << 60), 2.718281828,
+    'a string of moderate length', b'some bytes' * 4,
+    LOG_ENTRY.encode_exact(LOG_ENTRY_MSG).buffer[
+        :LOG_ENTRY.size(LOG_ENTRY_MSG)],
+    bytes(16), bytes(20), bytes(32),
+]
+
+# BENCHMARK CASES ===================================================
+
+# each case is (name, function), the function doing BATCH operations
+CASES = []
+
+
+def _writer(name, write, *args):
+    """ Time BATCH writes into a buffer rewound before each batch. """
+    chan = WireBuffer(1 << 16, auto_grow=True)
+
+    def run():
+        chan.position = 0
+        for _ in range(BATCH):
+            write(chan, *args)
+    CASES.append((name, run))
+
+
+def _reader(name, read, write, *args):
+    """
+    Time BATCH reads from a buffer holding BATCH values written by
+    write(chan, *args).  Field headers, if any, are read too.
+    """
+    chan = WireBuffer(1 << 16, auto_grow=True)
+    for _ in range(BATCH):
+        write(chan, *args)
+
+    def run():
+        chan.position = 0
+        for _ in range(BATCH):
+            read(chan)
+    CASES.append((name, run))
+
+
+def _field_reader(read):
+    """ Return a reader which reads a field header, then the value. """
+    def read_field(chan):
+        read_field_hdr(chan)
+        return read(chan)
+    return read_field
+
+
+def _call(name, func, *args):
+    """ Time BATCH calls of a function not involving a channel. """
+    def run():
+        for _ in range(BATCH):
+            func(*args)
+    CASES.append((name, run))
+
+
+def _raw_cases():
+    """ Every reader and writer exported by wireops.raw. """
+    _writer('raw.write_field_hdr', write_field_hdr, 5, 2)
+    _writer('raw.write_hdr_bytes', write_hdr_bytes, field_hdr_bytes(5, 2))
+    _reader('raw.read_field_hdr', read_field_hdr, write_field_hdr, 5, 2)
+    _call('raw.length_as_varint', length_as_varint, 1 << 40)
+    for label, value in (('1', 100), ('5', 1 << 30), ('10', 1 << 63)):
+        _writer('raw.write_raw_varint.%sB' % label, write_raw_varint, value)
+        _writer('raw.write_varint_field.%sB' % label,
+                write_varint_field, value, 3)
+        _reader('raw.read_raw_varint.%sB' % label,
+                read_raw_varint, write_raw_varint, value)
+        _call('raw.decode_varint.%sB' % label, decode_varint,
+              _varint_bytes(value), 0)
+
+    values = list(range(0, 1 << 20, 1 << 14))
+    _writer('raw.write_varints.64', write_varints, values)
+    _reader('raw.read_varints.64', lambda chan: read_varints(chan, 64),
+            write_varints, values)
+    _writer('raw.write_packed_varint_field.64',
+            write_packed_varint_field, values, 1)
+    _reader('raw.read_raw_packed_varint.64',
+            _field_reader(read_raw_packed_varint),
+            write_packed_varint_field, values, 1)
+
+    for name, read, write, value in (
+            ('b32', read_raw_b32, write_b32_field, 0xdeadbeef),
+            ('b64', read_raw_b64, write_b64_field, 1 << 60),
+            ('float', read_raw_float, write_float_field, 3.25),
+            ('double', read_raw_double, write_double_field, 2.5), ):
+        _writer('raw.write_%s_field' % name, write, value, 1)
+        _reader('raw.read_raw_%s' % name, _field_reader(read),
+                write, value, 1)
+    _writer('raw.write_raw_float', write_raw_float, 3.25)
+    _writer('raw.write_raw_double', write_raw_double, 2.5)
+
+    for name, read, write, value in (
+            ('b32s', read_raw_b32s, write_raw_b32s, 0xdeadbeef),
+            ('b64s', read_raw_b64s, write_raw_b64s, 1 << 60),
+            ('floats', read_raw_floats, write_raw_floats, 3.25),
+            ('doubles', read_raw_doubles, write_raw_doubles, 2.5), ):
+        run = [value] * 64
+        _writer('raw.write_raw_%s.64' % name, write, run)
+        _reader('raw.read_raw_%s.64' % name,
+                lambda chan, read=read: read(chan, 64), write, run)
+
+    for size in (16, 256, 4096):
+        data = bytes(size)
+        _writer('raw.write_len_plus_field.%d' % size,
+                write_len_plus_field, data, 1)
+        _reader('raw.read_raw_len_plus.%d' % size,
+                _field_reader(read_raw_len_plus),
+                write_len_plus_field, data, 1)
+        _reader('raw.read_raw_len_plus.%d.zero_copy' % size,
+                _field_reader(
+                    lambda chan: read_raw_len_plus(chan, zero_copy=True)),
+                write_len_plus_field, data, 1)
+
+    for size, read, write in ((128, read_raw_b128, write_b128_field),
+                              (160, read_raw_b160, write_b160_field),
+                              (256, read_raw_b256, write_b256_field)):
+        data = bytes(size // 8)
+        _writer('raw.write_b%d_field' % size, write, data, 1)
+        _reader('raw.read_raw_b%d' % size, _field_reader(read),
+                write, data, 1)
+
+    # packed fixed length values, from a list and from a matching array
+    for ftype, value in ((FieldTypes.F_FLOAT, 3.25),
+                         (FieldTypes.F_DOUBLE, 2.5),
+                         (FieldTypes.F_UINT32, 0xdeadbeef),
+                         (FieldTypes.F_UINT64, 1 << 60)):
+        listed = [value] * 1024
+        packed = array(PACKED_FIXED_TYPES[ftype], listed)
+        label = '%s.1024' % ftype.sym
+        _writer('raw.write_packed_fixed_field.%s' % label,
+                write_packed_fixed_field, listed, ftype, 1)
+        _writer('raw.write_packed_fixed_field.%s.array' % label,
+                write_packed_fixed_field, packed, ftype, 1)
+        _writer('raw.write_raw_packed_fixed.%s.array' % label,
+                write_raw_packed_fixed, packed, ftype)
+        _reader('raw.read_raw_packed_fixed.%s' % label,
+                _field_reader(
+                    lambda chan, ftype=ftype: read_raw_packed_fixed(
+                        chan, ftype)),
+                write_packed_fixed_field, packed, ftype, 1)
+        _reader('raw.read_raw_packed_fixed.%s.zero_copy' % label,
+                _field_reader(
+                    lambda chan, ftype=ftype: read_raw_packed_fixed(
+                        chan, ftype, zero_copy=True)),
+                write_packed_fixed_field, packed, ftype, 1)
+
+
+def _varint_bytes(value):
+    """ Return value encoded as a varint. """
+    chan = WireBuffer(16)
+    write_raw_varint(chan, value)
+    return bytes(chan.buffer[:chan.position])
+
+
+def _typed_cases():
+    """ Every entry in the T_PUT_FUNCS, T_GET_FUNCS, and T_LEN_FUNCS. """
+    for ftype in FieldTypes:
+        ndx = ftype.value
+        put = T_PUT_FUNCS[ndx]
+        value = SAMPLES[ndx]
+        _writer('typed.put.%s' % ftype.sym, put, value, 1)
+        _reader('typed.get.%s' % ftype.sym,
+                _field_reader(T_GET_FUNCS[ndx]), put, value, 1)
+        _call('typed.len.%s' % ftype.sym, T_LEN_FUNCS[ndx], value, 1)
+
+
+def _message_cases():
+    """ logEntry encoding and decoding, into buffers of several sizes. """
+    for size in (256, 1 << 12, 1 << 16):
+        # a batch fills about 12KB, so the smaller buffers must grow
+        def encode(size=size):
+            chan = WireBuffer(size, auto_grow=True)
+            for _ in range(BATCH):
+                LOG_ENTRY.encode(chan, LOG_ENTRY_MSG)
+        CASES.append(('spec.encode.logEntry.buf%d' % size, encode))
+
+    _call('spec.size.logEntry', LOG_ENTRY.size, LOG_ENTRY_MSG)
+    _call('spec.encode_exact.logEntry', LOG_ENTRY.encode_exact,
+          LOG_ENTRY_MSG)
+    _call('spec.decode_bytes.logEntry', LOG_ENTRY.decode_bytes, SAMPLES[
+        FieldTypes.L_MSG.value])
+
+    chan = WireBuffer(1 << 16, auto_grow=True)
+    ends = []
+    for _ in range(BATCH):
+        LOG_ENTRY.encode(chan, LOG_ENTRY_MSG)
+        ends.append(chan.position)
+
+    def decode():
+        chan.position = 0
+        for end in ends:
+            LOG_ENTRY.decode(chan, end)
+    CASES.append(('spec.decode.logEntry', decode))
+
+
+def build_cases():
+    """ Populate CASES, returning the raw functions left uncovered. """
+    _raw_cases()
+    _typed_cases()
+    _message_cases()
+    covered = {name.split('.')[1] for name, _ in CASES
+               if name.startswith('raw.')}
+    return [name for name in raw.__all__
+            if name.startswith(('read_', 'write_')) and name not in covered]
+
+# RUNNING ===========================================================
+
+
+def time_case(func, repeats, min_time):
+    """
+    Return the best time per operation in nanoseconds over repeats
+    runs, each looping over func for at least min_time seconds.
+    """
+    func()                                  # warm up
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2
+    best = elapsed
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e9 / (loops * BATCH)
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print each result beside its baseline.  Return the names of the
+    benchmarks slower than their baseline by more than tolerance.
+    """
+    regressions = []
+    base = baseline['results']
+    for name, nsec in results.items():
+        if name not in base:
+            print("%-48s %10.1f ns      (new)" % (name, nsec))
+            continue
+        ratio = nsec / base[name]
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print("%-48s %10.1f ns  %6.2fx%s" % (name, nsec, ratio, flag))
+    return regressions
+
+
+def main():
+    """ Parse the command line, run the benchmarks, report. """
+    parser = ArgumentParser(description='benchmark the wireops codecs')
+    parser.add_argument('-k', '--filter', default='',
+                        help='run only benchmarks whose names contain this')
+    parser.add_argument('-r', '--repeats', type=int, default=5,
+                        help='runs per benchmark; the best is kept')
+    parser.add_argument('-t', '--min_time', type=float, default=0.05,
+                        help='minimum seconds per run')
+    parser.add_argument('-s', '--save', metavar='FILE',
+                        help='write the results to FILE as JSON, for use '
+                        'as a baseline')
+    parser.add_argument('-c', '--compare', metavar='FILE',
+                        help='compare the results with the baseline FILE')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='fractional slowdown counted as a regression')
+    args = parser.parse_args()
+
+    uncovered = build_cases()
+    if uncovered:
+        print("WARNING: no benchmark for %s" % ', '.join(uncovered),
+              file=sys.stderr)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            baseline = json.load(file)
+
+    results = {}
+    for name, func in CASES:
+        if args.filter in name:
+            results[name] = time_case(func, args.repeats, args.min_time)
+            if baseline is None:
+                print("%-48s %10.1f ns" % (name, results[name]))
+
+    report = {
+        'wireops': wireops.__version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'batch': BATCH,
+        'results': results,
+    }
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(report, file, indent=2, sort_keys=True)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\n%d benchmark(s) regressed by more than %d%%:" % (
+                len(regressions), round(args.tolerance * 100)))
+            for name in regressions:
+                print("    %s" % name)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
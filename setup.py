@@ -3,14 +3,23 @@
 
 """ Setuptools project configuration for wireops. """
 
+import os
 from os.path import exists
-from setuptools import setup
+from setuptools import setup, Extension
 
 long_desc = None
 if exists('README.md'):
     with open('README.md', 'r') as file:
         long_desc = file.read()
 
+# The C extension is optional: if it can't be built, or
+# WIREOPS_PURE_PYTHON is set, wireops uses its pure Python code.
+ext_modules = []
+if not os.environ.get('WIREOPS_PURE_PYTHON'):
+    ext_modules.append(Extension('wireops._speedups',
+                                 sources=['src/wireops/_speedups.c'],
+                                 optional=True))
+
 setup(name='wireops',
       version='0.2.11',
       author='Jim Dixon',
@@ -22,7 +31,8 @@ setup(name='wireops',
       include_package_data=False,
       zip_safe=False,
       scripts=[],
-      ext_modules=[],
+      ext_modules=ext_modules,
+      extras_require={'numpy': ['numpy']},
       description='python3 protocol for compressed data transfer',
       url='https://jddixon.github.io/wireops',
       classifiers=[
@@ -0,0 +1,469 @@
+/* wireops/_speedups.c
+ *
+ * Optional C implementations of the hottest wireops primitives: varint
+ * reading, writing, and sizing, zig-zag encoding and decoding, and
+ * 32- and 64-bit fixed length values.
+ *
+ * Each function handles the common case directly on the channel's
+ * buffer through the buffer protocol.  Anything unusual -- a buffer
+ * which must grow, a read-only buffer, an int outside the range the
+ * pure Python code was written for -- is handed to the pure Python
+ * function of the same name, registered by raw and typed when they
+ * import this module, so behaviour is identical either way.
+ */
+
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <stdint.h>
+
+static PyObject *str_buffer;        /* "buffer" */
+static PyObject *str_position;      /* "position" */
+static PyObject *fallbacks;         /* name -> pure Python function */
+
+/* Call the pure Python version of a function. */
+static PyObject *
+fallback(const char *name, PyObject *const *args, Py_ssize_t nargs)
+{
+    PyObject *func = NULL;
+    if (fallbacks != NULL)
+        func = PyDict_GetItemString(fallbacks, name);   /* borrowed */
+    if (func == NULL) {
+        PyErr_Format(PyExc_RuntimeError,
+                     "no pure Python fallback registered for %s", name);
+        return NULL;
+    }
+    return PyObject_Vectorcall(func, args, nargs, NULL);
+}
+
+/* Return the number of bytes needed to encode value as a varint. */
+static inline int
+varint_len(uint64_t value)
+{
+    int len = 1;
+    while (value >= 0x80) {
+        value >>= 7;
+        len++;
+    }
+    return len;
+}
+
+/*
+ * Get the channel's buffer and position.  Return 0 on success, -1 with
+ * an exception set on error, and 1, with no exception set, if the
+ * buffer doesn't support the buffer protocol as required.
+ */
+static int
+get_chan(PyObject *chan, Py_buffer *view, Py_ssize_t *position, int flags)
+{
+    PyObject *buf, *pos;
+
+    pos = PyObject_GetAttr(chan, str_position);
+    if (pos == NULL)
+        return -1;
+    *position = PyLong_AsSsize_t(pos);
+    Py_DECREF(pos);
+    if (*position == -1 && PyErr_Occurred())
+        return -1;
+
+    buf = PyObject_GetAttr(chan, str_buffer);
+    if (buf == NULL)
+        return -1;
+    if (PyObject_GetBuffer(buf, view, flags) < 0) {
+        Py_DECREF(buf);
+        PyErr_Clear();
+        return 1;
+    }
+    Py_DECREF(buf);
+    if (view->itemsize != 1) {
+        PyBuffer_Release(view);
+        return 1;
+    }
+    return 0;
+}
+
+/* Set the channel's position, through its property. */
+static int
+set_position(PyObject *chan, Py_ssize_t position)
+{
+    int status;
+    PyObject *pos = PyLong_FromSsize_t(position);
+    if (pos == NULL)
+        return -1;
+    status = PyObject_SetAttr(chan, str_position, pos);
+    Py_DECREF(pos);
+    return status;
+}
+
+/*
+ * Convert an int to uint64 as the pure Python code does with & or
+ * ctypes.c_uint64: modulo 2**64.  Return 0 on success, -1 on error,
+ * and 1, with no exception set, if value is not an int, such as a
+ * NumPy integer, which the pure Python code must handle.
+ */
+static int
+as_masked_u64(PyObject *value, uint64_t *out)
+{
+    if (!PyLong_Check(value))
+        return 1;
+    *out = (uint64_t)PyLong_AsUnsignedLongLongMask(value);
+    if (*out == (uint64_t)-1 && PyErr_Occurred())
+        return -1;
+    return 0;
+}
+
+/*
+ * Convert an int in [0, 2**64) to uint64.  Return 0 on success, -1 on
+ * error, and 1, with no exception set, if the value is out of range.
+ */
+static int
+as_exact_u64(PyObject *value, uint64_t *out)
+{
+    if (!PyLong_Check(value))
+        return 1;
+    *out = (uint64_t)PyLong_AsUnsignedLongLong(value);
+    if (*out == (uint64_t)-1 && PyErr_Occurred()) {
+        if (!PyErr_ExceptionMatches(PyExc_OverflowError))
+            return -1;
+        PyErr_Clear();
+        return 1;
+    }
+    return 0;
+}
+
+#define CHECK_NARGS(name, n)                                            \
+    if (nargs != (n)) {                                                 \
+        PyErr_Format(PyExc_TypeError,                                   \
+                     name "() takes exactly %d arguments (%zd given)",  \
+                     (n), nargs);                                       \
+        return NULL;                                                    \
+    }
+
+/* VARINTS ======================================================== */
+
+static PyObject *
+length_as_varint(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    uint64_t value;
+    int status;
+
+    CHECK_NARGS("length_as_varint", 1);
+    status = as_exact_u64(args[0], &value);
+    if (status < 0)
+        return NULL;
+    if (status > 0) {
+        /* negative, huge, or not an int: let Python compare it */
+        return fallback("length_as_varint", args, nargs);
+    }
+    return PyLong_FromLong(varint_len(value));
+}
+
+static PyObject *
+read_raw_varint(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    Py_buffer view;
+    Py_ssize_t offset, end;
+    const unsigned char *buf;
+    uint64_t value = 0;
+    int shift = 0, status;
+
+    CHECK_NARGS("read_raw_varint", 1);
+    status = get_chan(args[0], &view, &offset, PyBUF_SIMPLE);
+    if (status < 0)
+        return NULL;
+    if (status > 0 || offset < 0)
+        return fallback("read_raw_varint", args, nargs);
+    buf = (const unsigned char *)view.buf;
+    end = view.len;
+    for (;;) {
+        unsigned char next_byte;
+        if (offset >= end) {
+            PyBuffer_Release(&view);
+            PyErr_SetString(PyExc_ValueError,
+                            "attempt to read beyond end of buffer");
+            return NULL;
+        }
+        next_byte = buf[offset++];
+        if (shift == 63 && next_byte > 1) {
+            /* more than 64 bits: Python ints don't overflow */
+            PyBuffer_Release(&view);
+            return fallback("read_raw_varint", args, nargs);
+        }
+        value |= (uint64_t)(next_byte & 0x7f) << shift;
+        if (next_byte < 0x80)
+            break;
+        shift += 7;
+        if (shift > 63) {
+            PyBuffer_Release(&view);
+            return fallback("read_raw_varint", args, nargs);
+        }
+    }
+    PyBuffer_Release(&view);
+    if (set_position(args[0], offset) < 0)
+        return NULL;
+    return PyLong_FromUnsignedLongLong(value);
+}
+
+static PyObject *
+write_raw_varint(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    Py_buffer view;
+    Py_ssize_t offset;
+    unsigned char *buf;
+    uint64_t value;
+    int len, status;
+
+    CHECK_NARGS("write_raw_varint", 2);
+    status = as_masked_u64(args[1], &value);
+    if (status < 0)
+        return NULL;
+    if (status > 0)
+        return fallback("write_raw_varint", args, nargs);
+    status = get_chan(args[0], &view, &offset, PyBUF_WRITABLE);
+    if (status < 0)
+        return NULL;
+    if (status > 0)
+        return fallback("write_raw_varint", args, nargs);
+    len = varint_len(value);
+    if (offset < 0 || offset + len >= view.len) {
+        /* the buffer must grow, or the write fail */
+        PyBuffer_Release(&view);
+        return fallback("write_raw_varint", args, nargs);
+    }
+    buf = (unsigned char *)view.buf + offset;
+    while (value >= 0x80) {
+        *buf++ = (unsigned char)((value & 0x7f) | 0x80);
+        value >>= 7;
+    }
+    *buf = (unsigned char)value;
+    PyBuffer_Release(&view);
+    if (set_position(args[0], offset + len) < 0)
+        return NULL;
+    Py_RETURN_NONE;
+}
+
+/* ZIG-ZAG ======================================================== */
+
+static PyObject *
+encode_sint32(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    uint64_t value;
+    uint32_t val;
+    int status;
+
+    CHECK_NARGS("encode_sint32", 1);
+    status = as_masked_u64(args[0], &value);
+    if (status < 0)
+        return NULL;
+    if (status > 0)
+        return fallback("encode_sint32", args, nargs);
+    val = (uint32_t)value;
+    return PyLong_FromUnsignedLong((val << 1) ^ (0u - (val >> 31)));
+}
+
+static PyObject *
+decode_sint32(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    uint64_t value;
+    uint32_t val;
+    int status;
+
+    CHECK_NARGS("decode_sint32", 1);
+    status = as_exact_u64(args[0], &value);
+    if (status < 0)
+        return NULL;
+    if (status > 0)
+        return fallback("decode_sint32", args, nargs);
+    val = (uint32_t)((value >> 1) ^ (0u - (value & 1)));
+    return PyLong_FromLong((int32_t)val);
+}
+
+static PyObject *
+encode_sint64(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    uint64_t value;
+    int status;
+
+    CHECK_NARGS("encode_sint64", 1);
+    status = as_masked_u64(args[0], &value);
+    if (status < 0)
+        return NULL;
+    if (status > 0)
+        return fallback("encode_sint64", args, nargs);
+    return PyLong_FromUnsignedLongLong(
+        (value << 1) ^ ((uint64_t)0 - (value >> 63)));
+}
+
+static PyObject *
+decode_sint64(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    uint64_t value;
+    int status;
+
+    CHECK_NARGS("decode_sint64", 1);
+    status = as_exact_u64(args[0], &value);
+    if (status < 0)
+        return NULL;
+    if (status > 0)
+        return fallback("decode_sint64", args, nargs);
+    value = (value >> 1) ^ ((uint64_t)0 - (value & 1));
+    return PyLong_FromLongLong((int64_t)value);
+}
+
+/* 32- AND 64-BIT FIXED LENGTH VALUES ============================= */
+
+/* all fixed length values are little-endian on the wire */
+
+static PyObject *
+read_fixed(PyObject *chan, int size)
+{
+    Py_buffer view;
+    Py_ssize_t offset;
+    const unsigned char *buf;
+    uint64_t value = 0;
+    int ndx, status;
+
+    status = get_chan(chan, &view, &offset, PyBUF_SIMPLE);
+    if (status < 0)
+        return NULL;
+    if (status > 0 || offset < 0)
+        return fallback(size == 4 ? "read_raw_b32" : "read_raw_b64",
+                        &chan, 1);
+    if (offset + size > view.len) {
+        PyBuffer_Release(&view);
+        PyErr_SetString(PyExc_ValueError,
+                        "attempt to read beyond end of buffer");
+        return NULL;
+    }
+    buf = (const unsigned char *)view.buf + offset;
+    for (ndx = size - 1; ndx >= 0; ndx--)
+        value = (value << 8) | buf[ndx];
+    PyBuffer_Release(&view);
+    if (set_position(chan, offset + size) < 0)
+        return NULL;
+    return PyLong_FromUnsignedLongLong(value);
+}
+
+static PyObject *
+write_fixed(PyObject *const *args, Py_ssize_t nargs, int size)
+{
+    const char *name = size == 4 ? "write_raw_b32" : "write_raw_b64";
+    Py_buffer view;
+    Py_ssize_t offset;
+    unsigned char *buf;
+    uint64_t value;
+    int ndx, status;
+
+    status = as_masked_u64(args[1], &value);
+    if (status < 0)
+        return NULL;
+    if (status > 0)
+        return fallback(name, args, nargs);
+    status = get_chan(args[0], &view, &offset, PyBUF_WRITABLE);
+    if (status < 0)
+        return NULL;
+    if (status > 0)
+        return fallback(name, args, nargs);
+    if (offset < 0 || offset + size >= view.len) {
+        PyBuffer_Release(&view);
+        return fallback(name, args, nargs);
+    }
+    buf = (unsigned char *)view.buf + offset;
+    for (ndx = 0; ndx < size; ndx++) {
+        buf[ndx] = (unsigned char)value;
+        value >>= 8;
+    }
+    PyBuffer_Release(&view);
+    if (set_position(args[0], offset + size) < 0)
+        return NULL;
+    Py_RETURN_NONE;
+}
+
+static PyObject *
+read_raw_b32(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    CHECK_NARGS("read_raw_b32", 1);
+    return read_fixed(args[0], 4);
+}
+
+static PyObject *
+write_raw_b32(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    CHECK_NARGS("write_raw_b32", 2);
+    return write_fixed(args, nargs, 4);
+}
+
+static PyObject *
+read_raw_b64(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    CHECK_NARGS("read_raw_b64", 1);
+    return read_fixed(args[0], 8);
+}
+
+static PyObject *
+write_raw_b64(PyObject *module, PyObject *const *args, Py_ssize_t nargs)
+{
+    CHECK_NARGS("write_raw_b64", 2);
+    return write_fixed(args, nargs, 8);
+}
+
+/* MODULE ========================================================= */
+
+static PyObject *
+register_fallbacks(PyObject *module, PyObject *funcs)
+{
+    if (!PyDict_Check(funcs)) {
+        PyErr_SetString(PyExc_TypeError, "a dict is required");
+        return NULL;
+    }
+    if (fallbacks == NULL) {
+        fallbacks = PyDict_New();
+        if (fallbacks == NULL)
+            return NULL;
+    }
+    if (PyDict_Update(fallbacks, funcs) < 0)
+        return NULL;
+    Py_RETURN_NONE;
+}
+
+#define FASTCALL(name, doc) \
+    {#name, (PyCFunction)(void (*)(void))name, METH_FASTCALL, doc}
+
+static PyMethodDef speedups_methods[] = {
+    FASTCALL(length_as_varint,
+             "Return the number of bytes occupied by an unsigned int."),
+    FASTCALL(read_raw_varint, "Read a bare varint from a channel."),
+    FASTCALL(write_raw_varint, "Write a simple varint to the channel."),
+    FASTCALL(encode_sint32, "Encode a signed int32."),
+    FASTCALL(decode_sint32, "Decode zig-zag:  stackoverflow 2210923."),
+    FASTCALL(encode_sint64, "Encode a signed int64."),
+    FASTCALL(decode_sint64, "Decode a signed int64."),
+    FASTCALL(read_raw_b32, "Read a 4-byte value from a channel."),
+    FASTCALL(write_raw_b32, "Write a simple 4-byte value to a channel."),
+    FASTCALL(read_raw_b64, "Read a simple 8-byte value from a channel."),
+    FASTCALL(write_raw_b64, "Write an 8-byte value to a channel."),
+    {"register_fallbacks", register_fallbacks, METH_O,
+     "Register the pure Python functions, a dict keyed by name, used "
+     "for cases the C code does not handle."},
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef speedups_module = {
+    PyModuleDef_HEAD_INIT,
+    "wireops._speedups",
+    "C implementations of the hottest wireops primitives.",
+    -1,
+    speedups_methods,
+    NULL, NULL, NULL, NULL
+};
+
+PyMODINIT_FUNC
+PyInit__speedups(void)
+{
+    str_buffer = PyUnicode_InternFromString("buffer");
+    if (str_buffer == NULL)
+        return NULL;
+    str_position = PyUnicode_InternFromString("position");
+    if (str_position == NULL)
+        return NULL;
+    return PyModule_Create(&speedups_module);
+}
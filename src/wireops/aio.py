@@ -0,0 +1,136 @@
+# wireops/aio.py
+
+"""
+Coroutines for reading and writing length-delimited frames over
+asyncio streams.
+
+The readers take an asyncio.StreamReader and await only as often as
+the data requires: a one-byte varint costs one await, a frame two.
+The writers hand each frame to an asyncio.StreamWriter and then await
+drain(), so a slow peer applies backpressure to the sender.
+"""
+
+from asyncio import IncompleteReadError
+
+from wireops import WireopsError
+from wireops.incremental import FieldDecoder
+from wireops.policy import DecodeLimitError
+from wireops.raw import varint_bytes, write_raw_varint, WireBuffer
+
+__all__ = [
+    'read_varint', 'read_frame', 'write_frame', 'write_msg',
+    'aiter_frames', 'aiter_fields',
+]
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+
+async def read_varint(reader, max_bytes=None):
+    """
+    Read a varint from the stream.  Return None if the stream ends
+    before its first byte; raise WireopsError if it ends part way
+    through or if the varint is longer than 10 bytes, and
+    DecodeLimitError if it is longer than max_bytes.
+    """
+    limit = 70 if max_bytes is None else 7 * max_bytes
+    try:
+        first = (await reader.readexactly(1))[0]
+    except IncompleteReadError:
+        return None
+    if first < 0x80:
+        return first
+    value = first & 0x7f
+    shift = 7
+    try:
+        while True:
+            if shift >= limit:
+                if max_bytes is not None:
+                    raise DecodeLimitError(
+                        "varint is longer than %d bytes" % max_bytes)
+                raise WireopsError("varint is longer than 10 bytes")
+            next_byte = (await reader.readexactly(1))[0]
+            value |= (next_byte & 0x7f) << shift
+            if next_byte < 0x80:
+                return value
+            shift += 7
+    except IncompleteReadError:
+        raise WireopsError("stream ends part way through a varint") from None
+
+
+async def read_frame(reader, policy=None):
+    """
+    Read a length-preceded frame from the stream and return its payload
+    as bytes.  Return None if the stream ends cleanly, between frames.
+
+    If a DecodePolicy is given, the length prefix is checked against
+    its max_varint_bytes and the length against its max_len_plus before
+    the payload is read.
+    """
+    max_bytes = None if policy is None else policy.max_varint_bytes
+    len_ = await read_varint(reader, max_bytes)
+    if len_ is None:
+        return None
+    if policy is not None:
+        policy.check_len(len_)
+    try:
+        return await reader.readexactly(len_)
+    except IncompleteReadError as exc:
+        raise WireopsError(
+            "stream ends after %d of %d bytes of a frame" % (
+                len(exc.partial), len_)) from None
+
+
+async def write_frame(writer, payload):
+    """
+    Write a serialized message, any bytes-like object, to the stream as
+    a frame and wait until the stream is ready for more.
+    """
+    writer.write(varint_bytes(len(memoryview(payload).cast('B'))))
+    writer.write(payload)
+    await writer.drain()
+
+
+async def write_msg(writer, spec, msg):
+    """ Encode msg, a dict, using the MessageSpec spec, as a frame. """
+    len_, sizes = spec.size_with_plan(msg)
+    wb_ = WireBuffer(len_ + 11)
+    write_raw_varint(wb_, len_)
+    spec.encode(wb_, msg, sizes)
+    # the transport may hold on to what it is given, so pass a copy
+    writer.write(wb_.buffer[:wb_.position])
+    await writer.drain()
+
+
+async def aiter_frames(reader, spec=None, policy=None):
+    """
+    Iterate asynchronously over the frames in the stream until it ends.
+
+    Frames are returned as bytes or, if a MessageSpec is given, as the
+    dicts the spec decodes them to, under the DecodePolicy if one is
+    given.
+    """
+    while True:
+        payload = await read_frame(reader, policy)
+        if payload is None:
+            return
+        yield payload if spec is None else spec.decode_bytes(payload,
+                                                             policy)
+
+
+async def aiter_fields(reader, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Iterate asynchronously over a stream of unframed fields, yielding
+    each as a tuple (field_nbr, ptype, value) as FieldDecoder does.
+
+    The stream is read in chunks of up to chunk_size bytes, whatever is
+    available; WireopsError is raised if it ends part way through a
+    field.
+    """
+    decoder = FieldDecoder()
+    while True:
+        chunk = await reader.read(chunk_size)
+        if not chunk:
+            break
+        for field in decoder.feed(chunk):
+            yield field
+    decoder.close()
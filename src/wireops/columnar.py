@@ -0,0 +1,325 @@
+# wireops/columnar.py
+
+"""
+Batches of records held as columns rather than as one dict per record.
+
+encode_columns() takes a dict mapping the field names of a MessageSpec
+to equal-length sequences, one value per record, and writes each record
+as an ordinary message in a length-delimited frame, exactly as
+FrameWriter.write_msg would.  decode_columns() reads such a run of
+frames back into columns: an array for each numeric field, and a list
+of values, or a (data, offsets) pair, for each string or bytes field.
+No per-record dict or message object is ever built.
+
+A value of None in a column leaves the field out of that record.  When
+decoding, a numeric field missing from a record is zero in its array
+and a string or bytes field missing from a record is None in its list
+or empty in its (data, offsets) pair.
+"""
+
+from array import array
+from functools import partial
+
+from wireops import WireopsError
+from wireops.enum import FieldTypes
+from wireops.raw import(
+    hdr_field_nbr, length_as_varint, read_raw_varint, skip_field,
+    write_hdr_bytes, write_raw_varint,
+    read_raw_len_plus, read_raw_b128, read_raw_b160, read_raw_b256,
+    WireBuffer,)
+from wireops.spec import len_plus_len, put_len_plus, ViewChannel
+
+__all__ = ['encode_columns', 'decode_columns', ]
+
+# array typecodes of the numeric field types, indexed by FieldTypes
+_TYPECODES = {
+    FieldTypes.V_BOOL: 'B',
+    FieldTypes.V_ENUM: 'H',
+    FieldTypes.V_UINT32: 'I',
+    FieldTypes.V_SINT32: 'i',
+    FieldTypes.V_UINT64: 'Q',
+    FieldTypes.V_SINT64: 'q',
+    FieldTypes.F_UINT32: 'I',
+    FieldTypes.F_SINT32: 'i',
+    FieldTypes.F_FLOAT: 'f',
+    FieldTypes.F_UINT64: 'Q',
+    FieldTypes.F_SINT64: 'q',
+    FieldTypes.F_DOUBLE: 'd',
+}
+
+# field types decoded as strings or bytes
+_BYTES_TYPES = frozenset([
+    FieldTypes.L_STRING, FieldTypes.L_BYTES,
+    FieldTypes.F_BYTES16, FieldTypes.F_BYTES20, FieldTypes.F_BYTES32, ])
+
+# lengths of the values of fixed length field types, without headers
+_FIXED_SIZES = {
+    FieldTypes.V_BOOL: 1,
+    FieldTypes.F_UINT32: 4, FieldTypes.F_SINT32: 4, FieldTypes.F_FLOAT: 4,
+    FieldTypes.F_UINT64: 8, FieldTypes.F_SINT64: 8, FieldTypes.F_DOUBLE: 8,
+    FieldTypes.F_BYTES16: 16, FieldTypes.F_BYTES20: 20,
+    FieldTypes.F_BYTES32: 32,
+}
+
+# readers which return a view of the buffer rather than a copy
+_ZERO_COPY_GETS = {
+    FieldTypes.L_STRING: partial(read_raw_len_plus, zero_copy=True),
+    FieldTypes.L_BYTES: partial(read_raw_len_plus, zero_copy=True),
+    FieldTypes.F_BYTES16: partial(read_raw_b128, zero_copy=True),
+    FieldTypes.F_BYTES20: partial(read_raw_b160, zero_copy=True),
+    FieldTypes.F_BYTES32: partial(read_raw_b256, zero_copy=True),
+}
+
+# ENCODING ==========================================================
+
+
+def _nested_put(sub, chan, item):
+    val, v_len, sizes = item
+    write_raw_varint(chan, v_len)
+    sub.encode(chan, val, sizes)
+
+
+def _encode_plan(spec, columns):
+    """
+    Return a list of (hdr_bytes, h_len, put, size, column) for the
+    columns present, in the order the spec encodes them, and the
+    number of records.  size is a function returning the length of a
+    value, or the length itself for fixed length fields.  The column of
+    an L_MSG field holds (msg, length, sizes) for each message, as
+    MessageSpec.size_with_plan() returns them.
+    """
+    unknown = set(columns) - set(decl[0] for decl in spec.fields)
+    if unknown:
+        raise WireopsError("no field %s in message %s" % (
+            ', '.join(sorted(unknown)), spec.name))
+    plan = []
+    nrows = None
+    for field in spec.plan:
+        column = columns.get(field.name)
+        if column is None:
+            continue
+        if nrows is None:
+            nrows = len(column)
+        elif len(column) != nrows:
+            raise WireopsError(
+                "column '%s' has %d values but %d were expected" % (
+                    field.name, len(column), nrows))
+        put, size = field.put, field.size
+        if not field.packed and field.ftype in _FIXED_SIZES:
+            size = _FIXED_SIZES[field.ftype]
+        elif field.ftype == FieldTypes.L_STRING:
+            # encode each string once rather than once to size it and
+            # again to write it
+            column = [None if val is None else val.encode('utf-8')
+                      for val in column]
+            put, size = put_len_plus, _len_plus_len_of
+        elif field.sub is not None:
+            # size each nested message once, keeping the lengths of the
+            # messages nested within it for the encoder
+            column = [None if val is None else
+                      (val,) + field.sub.size_with_plan(val)
+                      for val in column]
+            put = partial(_nested_put, field.sub)
+            size = _nested_len
+        plan.append((field.hdr_bytes, len(field.hdr_bytes), put, size,
+                     column))
+    return plan, nrows or 0
+
+
+def _len_plus_len_of(val):
+    return len_plus_len(len(val))
+
+
+def _nested_len(item):
+    return len_plus_len(item[1])
+
+
+def encode_columns(spec, columns, chan=None):
+    """
+    Encode a batch of records held as columns, a dict mapping field
+    names to sequences of equal length, writing each record as a
+    length-delimited frame.
+
+    The records are sized first, in one pass over the columns.  If no
+    channel is given the frames are written to a new WireBuffer just
+    big enough to hold them, whose position and limit are both the
+    length of the batch on return; otherwise they are written to chan
+    at its position, growing it if it allows that.
+    """
+    plan, nrows = _encode_plan(spec, columns)
+    # size the records a column at a time
+    sizes = [0] * nrows
+    for _, h_len, _, size, column in plan:
+        if isinstance(size, int):
+            h_len += size
+            if isinstance(column, array) or None not in column:
+                sizes = [total + h_len for total in sizes]
+            else:
+                sizes = [total if val is None else total + h_len
+                         for total, val in zip(sizes, column)]
+        else:
+            sizes = [total if val is None else total + h_len + size(val)
+                     for total, val in zip(sizes, column)]
+    total = sum(sizes) + sum(map(length_as_varint, sizes))
+
+    if chan is None:
+        # the position can never equal the capacity: allow one byte more
+        chan = WireBuffer(total + 1, exact=True)
+        chan.limit = total
+    for row, size in enumerate(sizes):
+        write_raw_varint(chan, size)
+        for hdr_bytes, _, put, _, column in plan:
+            val = column[row]
+            if val is not None:
+                write_hdr_bytes(chan, hdr_bytes)
+                put(chan, val)
+    return chan
+
+# DECODING ==========================================================
+
+
+class _Column(object):
+    """ A column being decoded. """
+
+    __slots__ = ['name', 'values', 'data', 'offsets', 'default', ]
+
+    def __init__(self, name, typecode=None, offsets=False):
+        """
+        Values go to an array if a typecode is given, else to a
+        bytearray and offsets if offsets is set, else to a list.
+        """
+        self.name = name
+        self.data = None
+        self.offsets = None
+        self.default = None
+        if typecode is not None:
+            self.values = array(typecode)
+            self.default = 0
+        elif offsets:
+            self.values = None
+            self.data = bytearray()
+            self.offsets = array('Q', [0])
+        else:
+            self.values = []
+
+    def appender(self):
+        """ Return a function adding one value to the column. """
+        if self.offsets is None:
+            return self.values.append
+        data = self.data
+        append_offset = self.offsets.append
+
+        def append(value):
+            data.extend(value)
+            append_offset(len(data))
+        return append
+
+    def pad(self):
+        """ Append the value of a field missing from a record. """
+        if self.offsets is not None:
+            self.offsets.append(len(self.data))
+        else:
+            self.values.append(self.default)
+
+    def result(self):
+        """ Return the finished column. """
+        if self.offsets is not None:
+            return self.data, self.offsets
+        return self.values
+
+
+def _decode_plan(spec, names, offsets):
+    """
+    Return a list of the _Columns wanted and a dict mapping the header
+    of each field in the spec to (bit, get, append), where bit marks
+    the column in a record's set of fields present, get reads the value
+    from a channel, and append adds it to the column.  Fields not
+    wanted map to (0, None, None).
+    """
+    wanted = None if names is None else set(names)
+    columns = []
+    plan = {}
+    for field in spec.plan:
+        fname, get, ftype = field.name, field.get, field.ftype
+        if wanted is not None and fname not in wanted:
+            plan[field.hdr] = (0, None, None)
+            continue
+        if field.sub is not None or field.packed:
+            # nested messages and packed fields are kept in lists
+            column = _Column(fname)
+        elif offsets and ftype in _BYTES_TYPES:
+            column = _Column(fname, offsets=True)
+            # view the value in place; it is copied into the column
+            get = _ZERO_COPY_GETS.get(ftype, get)
+        else:
+            column = _Column(fname, _TYPECODES.get(ftype))
+        plan[field.hdr] = (1 << len(columns), get, column.appender())
+        columns.append(column)
+    if wanted is not None:
+        unknown = wanted - set(column.name for column in columns)
+        if unknown:
+            raise WireopsError("no field %s in message %s" % (
+                ', '.join(sorted(unknown)), spec.name))
+    return columns, plan
+
+
+def decode_columns(spec, buf, offset=0, end=None, names=None,
+                   offsets=False):
+    """
+    Decode the frames in a bytes-like object from offset up to end, by
+    default the end of buf, each holding a message described by spec,
+    into columns.  Return a dict mapping field names to columns.
+
+    If names is given, only those fields are decoded; other fields are
+    stepped over.  Numeric fields are decoded to arrays, L_MSG fields
+    to lists of dicts, and packed fields to lists of arrays.  String
+    and bytes fields are decoded to lists of str and bytearray, or, if
+    offsets is set, to a pair (data, offsets) where data is a bytearray
+    holding the values end to end and offsets an array('Q') one longer
+    than the number of records: value n is data[offsets[n]:offsets[n+1]].
+    Strings are left encoded in UTF-8.
+    """
+    view = memoryview(buf).cast('B')
+    if end is None:
+        end = len(view)
+    columns, plan = _decode_plan(spec, names, offsets)
+    every = (1 << len(columns)) - 1
+    chan = ViewChannel(view)
+    chan.position = offset
+    row = 0
+    try:
+        while chan.position < end:
+            len_ = read_raw_varint(chan)
+            frame_end = chan.position + len_
+            if frame_end > end:
+                raise WireopsError("frame overruns the end of the buffer")
+            present = 0
+            while chan.position < frame_end:
+                hdr = read_raw_varint(chan)
+                try:
+                    bit, get, append = plan[hdr]
+                except KeyError:
+                    raise WireopsError(
+                        "unexpected field %d in message %s" % (
+                            hdr_field_nbr(hdr), spec.name)) from None
+                if get is None:
+                    skip_field(chan, hdr & 7)
+                    continue
+                if present & bit:
+                    raise WireopsError(
+                        "field %d repeated in record %d" % (
+                            hdr_field_nbr(hdr), row))
+                present |= bit
+                append(get(chan))
+            if chan.position != frame_end:
+                raise WireopsError(
+                    "record %d overruns its length" % row)
+            if present != every:
+                for ndx, column in enumerate(columns):
+                    if not present & (1 << ndx):
+                        column.pad()
+            row += 1
+    except OverflowError:
+        raise WireopsError(
+            "value out of range in record %d" % row) from None
+    return {column.name: column.result() for column in columns}
@@ -0,0 +1,184 @@
+# wireops/fields.py
+
+"""
+Iterate over the fields in a buffer without decoding their values.
+
+iter_fields() walks the field headers, using length arithmetic to step
+over each value, and yields a FieldRecord giving the field number,
+primitive type, offset, and length of the value.  Values are decoded
+only if asked for, so picking a few fields out of a large message costs
+little more than reading their headers.
+"""
+
+import struct
+from array import array
+
+from wireops import WireopsError
+from wireops.enum import FieldTypes, PrimTypes
+from wireops.policy import DecodeLimitError
+from wireops.raw import(
+    FIELD_PRIM_TYPES, PACKED_FIXED_TYPES, decode_varint, value_extent,
+    BIG_ENDIAN_HOST, PACKED_FIXED_SIZES)
+from wireops.typed import decode_sint32, decode_sint64
+
+__all__ = ['FieldRecord', 'iter_fields', ]
+
+# primitive types indexed by value
+_PTYPES = list(PrimTypes)
+
+_U32 = struct.Struct('<I')
+_S32 = struct.Struct('<i')
+_FLOAT = struct.Struct('<f')
+_U64 = struct.Struct('<Q')
+_S64 = struct.Struct('<q')
+_DOUBLE = struct.Struct('<d')
+
+# VALUE DECODERS ====================================================
+
+# Each takes (buf, offset, length) and returns the decoded value;
+# indexed by FieldTypes.value.
+
+
+def _varint(buf, offset, _):
+    return decode_varint(buf, offset)[0]
+
+
+def _copy(buf, offset, length):
+    return bytearray(memoryview(buf)[offset:offset + length])
+
+
+_DECODERS = [
+    lambda buf, offset, length: bool(_varint(buf, offset, length)),
+    _varint,
+    _varint,
+    lambda buf, offset, length: decode_sint32(_varint(buf, offset, length)),
+    _varint,
+    lambda buf, offset, length: decode_sint64(_varint(buf, offset, length)),
+    lambda buf, offset, _: _U32.unpack_from(buf, offset)[0],
+    lambda buf, offset, _: _S32.unpack_from(buf, offset)[0],
+    lambda buf, offset, _: _FLOAT.unpack_from(buf, offset)[0],
+    lambda buf, offset, _: _U64.unpack_from(buf, offset)[0],
+    lambda buf, offset, _: _S64.unpack_from(buf, offset)[0],
+    lambda buf, offset, _: _DOUBLE.unpack_from(buf, offset)[0],
+    lambda buf, offset, length: str(
+        memoryview(buf)[offset:offset + length], 'utf-8'),
+    _copy, _copy, _copy, _copy, _copy, ]
+
+# FIELD RECORDS =====================================================
+
+
+class FieldRecord(object):
+    """
+    The location of a field's value in a buffer.
+
+    For VARINT fields offset and length cover the varint itself; for
+    LEN_PLUS and PACKED_VARINT fields they cover the bytes following the
+    length prefix.
+    """
+
+    __slots__ = ['_buffer', 'field_nbr', 'ptype', 'offset', 'length', ]
+
+    def __init__(self, buffer, field_nbr, ptype, offset, length):
+        self._buffer = buffer
+        self.field_nbr = field_nbr
+        self.ptype = ptype
+        self.offset = offset
+        self.length = length
+
+    def __repr__(self):
+        return "FieldRecord(field_nbr=%d, ptype=%s, offset=%d, length=%d)" % (
+            self.field_nbr, self.ptype.name, self.offset, self.length)
+
+    @property
+    def end(self):
+        """ Return the offset of the byte following the value. """
+        return self.offset + self.length
+
+    def payload(self):
+        """ Return the bytes of the value as a memoryview, without copying. """
+        return memoryview(self._buffer)[self.offset:self.offset + self.length]
+
+    def decode(self, ftype):
+        """
+        Decode the value as a field of type ftype, a FieldTypes member.
+
+        Raise WireopsError if ftype is not carried by the field's
+        primitive type.
+        """
+        if FIELD_PRIM_TYPES[ftype] != self.ptype:
+            raise WireopsError("field %d is %s, which cannot carry %s" % (
+                self.field_nbr, self.ptype.name, FieldTypes(ftype).name))
+        return _DECODERS[ftype](self._buffer, self.offset, self.length)
+
+    def packed(self, ftype):
+        """
+        Return the values of a packed field of fixed length type ftype,
+        one of raw.PACKED_FIXED_TYPES, as a memoryview of the buffer
+        cast to the matching array typecode.  On a big-endian host the
+        values are instead copied into a byte-swapped array.
+
+        Raise WireopsError if the field is not LEN_PLUS or its length is
+        not a multiple of the width of ftype.
+        """
+        code = PACKED_FIXED_TYPES.get(ftype)
+        if code is None:
+            raise WireopsError("field type %s cannot be packed" % (ftype,))
+        if self.ptype != PrimTypes.LEN_PLUS or \
+                self.length % PACKED_FIXED_SIZES[code]:
+            raise WireopsError("field %d cannot hold packed %s" % (
+                self.field_nbr, FieldTypes(ftype).name))
+        view = self.payload()
+        if not BIG_ENDIAN_HOST:
+            return view.cast(code)
+        values = array(code)
+        values.frombytes(view)
+        values.byteswap()
+        return values
+
+# ITERATION =========================================================
+
+
+def iter_fields(chan, end=None, wanted=None, policy=None):
+    """
+    Yield a FieldRecord for each field from the channel's position up to
+    end, by default the channel's limit.
+
+    If wanted is given, it is a collection of field numbers and other
+    fields are stepped over without being reported.  The channel's
+    position is not changed.  If a DecodePolicy is given, varints,
+    lengths, and the number of fields are checked against its limits.
+    """
+    buf = chan.buffer
+    offset = chan.position
+    if end is None:
+        end = chan.limit
+    if end > len(buf):
+        raise ValueError("end is beyond the end of the buffer")
+    if policy is not None:
+        yield from _iter_fields_limited(buf, offset, end, wanted, policy)
+        return
+    while offset < end:
+        hdr, offset = decode_varint(buf, offset)
+        ptype = hdr & 7
+        offset, length = value_extent(buf, offset, ptype)
+        if offset + length > end:
+            raise WireopsError(
+                "field %d overruns the end of the message" % (hdr >> 3))
+        if wanted is None or (hdr >> 3) in wanted:
+            yield FieldRecord(buf, hdr >> 3, _PTYPES[ptype], offset, length)
+        offset += length
+
+
+def _iter_fields_limited(buf, offset, end, wanted, policy):
+    """ iter_fields, checking the input against a DecodePolicy. """
+    budget = policy.max_fields
+    while offset < end:
+        budget -= 1
+        if budget < 0:
+            raise DecodeLimitError("more than %d fields" % policy.max_fields)
+        hdr, offset = policy.read_varint(buf, offset, end)
+        ptype = hdr & 7
+        offset, length = policy.value_extent(buf, offset, end, ptype)
+        if wanted is None or (hdr >> 3) in wanted:
+            yield FieldRecord(buf, hdr >> 3, _PTYPES[ptype], offset, length)
+        offset += length
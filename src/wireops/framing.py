@@ -0,0 +1,202 @@
+# wireops/framing.py
+
+"""
+Length-delimited framing of messages in files and streams.
+
+Each frame is a varint giving the length of a message followed by the
+message itself.  FrameWriter coalesces frames into large writes;
+FrameReader reads frames in bulk from any binary file object.  A frame
+index, an array of the offsets at which frames begin, allows random
+access to frame N without scanning the frames before it.
+"""
+
+from array import array
+
+from wireops import WireopsError
+from wireops.incremental import FrameDecoder
+from wireops.raw import(
+    decode_varint, write_raw_varint, write_raw_bytes,
+    WireBuffer,)
+
+__all__ = [
+    'FrameWriter', 'FrameReader', 'iter_frames',
+    'build_frame_index', 'read_frame_at',
+]
+
+DEFAULT_BUFFER_SIZE = 1 << 16
+
+
+class FrameWriter(object):
+    """
+    Write length-preceded frames to a binary file object, buffering
+    them so that the file sees few, large writes.
+
+    If index is True the writer records the offset, relative to where
+    it started writing, of every frame it writes.
+    """
+
+    __slots__ = ['_fileobj', '_flush_at', '_index', '_pending', '_written', ]
+
+    def __init__(self, fileobj, buffer_size=DEFAULT_BUFFER_SIZE, index=False):
+        self._fileobj = fileobj
+        self._flush_at = buffer_size
+        self._index = array('Q') if index else None
+        self._pending = WireBuffer(buffer_size, auto_grow=True)
+        self._written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+
+    @property
+    def index(self):
+        """ Return the frame index, or None if it is not being kept. """
+        return self._index
+
+    @property
+    def offset(self):
+        """ Return the number of bytes written, including those pending. """
+        return self._written + self._pending.position
+
+    def write(self, payload):
+        """ Write a serialized message, any bytes-like object, as a frame. """
+        pending = self._pending
+        if self._index is not None:
+            self._index.append(self._written + pending.position)
+        len_ = len(memoryview(payload).cast('B'))
+        if len_ >= self._flush_at:
+            # too big to be worth copying: write it straight through
+            write_raw_varint(pending, len_)
+            self.flush()
+            self._fileobj.write(payload)
+            self._written += len_
+            return
+        write_raw_varint(pending, len_)
+        write_raw_bytes(pending, payload)
+        if pending.position >= self._flush_at:
+            self.flush()
+
+    def write_msg(self, spec, msg):
+        """ Encode msg, a dict, using the MessageSpec spec, as a frame. """
+        pending = self._pending
+        if self._index is not None:
+            self._index.append(self._written + pending.position)
+        len_, sizes = spec.size_with_plan(msg)
+        write_raw_varint(pending, len_)
+        spec.encode(pending, msg, sizes)
+        if pending.position >= self._flush_at:
+            self.flush()
+
+    def flush(self):
+        """ Write any pending frames to the file object. """
+        pending = self._pending
+        if pending.position:
+            with memoryview(pending.buffer)[:pending.position] as view:
+                self._fileobj.write(view)
+            self._written += pending.position
+            pending.position = 0
+
+
+class FrameReader(object):
+    """
+    Iterate over the frames in a binary file object, reading it in
+    chunks of chunk_size bytes.
+
+    Frames are returned as bytes or, if a MessageSpec is given, as the
+    dicts the spec decodes them to.  WireopsError is raised if the file
+    ends part way through a frame.  A DecodePolicy, if given, is
+    applied as by FrameDecoder.
+    """
+
+    __slots__ = ['_chunk_size', '_decoder', '_fileobj', ]
+
+    def __init__(self, fileobj, chunk_size=DEFAULT_BUFFER_SIZE, spec=None,
+                 policy=None):
+        self._chunk_size = chunk_size
+        self._decoder = FrameDecoder(spec, policy)
+        self._fileobj = fileobj
+
+    def __iter__(self):
+        read = self._fileobj.read
+        feed = self._decoder.feed
+        while True:
+            chunk = read(self._chunk_size)
+            if not chunk:
+                break
+            yield from feed(chunk)
+        self._decoder.close()
+
+
+def iter_frames(buf, offset=0, end=None, zero_copy=False):
+    """
+    Iterate over the frames in a bytes-like object from offset up to
+    end, by default the end of buf.
+
+    Frames are returned as bytes or, if zero_copy is set, as memoryview
+    slices of buf.
+    """
+    view = memoryview(buf).cast('B')
+    if end is not None:
+        view = view[:end]
+    end = len(view)
+    while offset < end:
+        try:
+            len_, offset = decode_varint(view, offset)
+        except ValueError:
+            raise WireopsError(
+                "frame at offset %d is truncated" % offset) from None
+        if offset + len_ > end:
+            raise WireopsError("frame overruns the end of the buffer")
+        frame = view[offset:offset + len_]
+        yield frame if zero_copy else bytes(frame)
+        offset += len_
+
+
+def _read_prefix(fileobj, offset):
+    """
+    Read the length prefix of the frame at offset in a seekable binary
+    file object, returning the length and the length of the prefix.
+    """
+    fileobj.seek(offset)
+    prefix = fileobj.read(10)
+    try:
+        return decode_varint(prefix, 0)
+    except ValueError:
+        raise WireopsError(
+            "frame at offset %d is truncated" % offset) from None
+
+
+def build_frame_index(fileobj):
+    """
+    Scan a seekable binary file object from its current position,
+    reading only the length prefixes, and return an array('Q') of the
+    offsets at which frames begin.
+    """
+    index = array('Q')
+    offset = fileobj.tell()
+    end = fileobj.seek(0, 2)
+    while offset < end:
+        len_, prefix_len = _read_prefix(fileobj, offset)
+        if offset + prefix_len + len_ > end:
+            raise WireopsError(
+                "frame at offset %d overruns the end of the file" % offset)
+        index.append(offset)
+        offset += prefix_len + len_
+    fileobj.seek(offset)
+    return index
+
+
+def read_frame_at(fileobj, index, nnn):
+    """
+    Return frame nnn of a seekable binary file object as bytes, given
+    the file's frame index.
+    """
+    offset = index[nnn]
+    len_, prefix_len = _read_prefix(fileobj, offset)
+    fileobj.seek(offset + prefix_len)
+    frame = fileobj.read(len_)
+    if len(frame) != len_:
+        raise WireopsError("frame %d is truncated" % nnn)
+    return frame
@@ -0,0 +1,227 @@
+# wireops/incremental.py
+
+"""
+Push-style decoders for data arriving in pieces, as from a socket.
+
+Bytes are fed in chunks of any size.  A decoder keeps whatever partial
+varint or partial payload the previous chunk ended with and resumes
+from there, so nothing is parsed twice.  FieldDecoder emits complete
+fields; FrameDecoder emits complete messages, each preceded on the
+wire by a varint giving its length.
+"""
+
+import struct
+
+from wireops import WireopsError
+from wireops.enum import PrimTypes
+from wireops.policy import DecodeLimitError
+
+__all__ = ['FieldDecoder', 'FrameDecoder', ]
+
+# primitive types indexed by value
+_PTYPES = list(PrimTypes)
+
+# lengths of fixed length values indexed by primitive type
+_FIXED_LENS = [None, None, 4, 8, None, 16, 20, 32]
+
+_B32 = struct.Struct('<I')
+_B64 = struct.Struct('<Q')
+
+# decoder states
+_HDR, _VARINT, _LEN, _BYTES = range(4)
+
+
+class _Decoder(object):
+    """
+    The state shared by the incremental decoders: a varint being
+    accumulated and a payload being collected.
+    """
+
+    __slots__ = ['_state', '_acc', '_shift', '_need', '_partial', ]
+
+    def __init__(self, state):
+        self._state = state
+        self._acc = 0
+        self._shift = 0
+        self._need = 0
+        self._partial = bytearray()
+
+    def _varint(self, data, offset, end, max_bytes=None):
+        """
+        Continue the varint being accumulated.  Return the offset
+        following it, or None if data ran out first.  Raise
+        DecodeLimitError if the varint is longer than max_bytes, a
+        policy's limit, or WireopsError if it is longer than 10 bytes.
+        """
+        limit = 70 if max_bytes is None else 7 * max_bytes
+        acc = self._acc
+        shift = self._shift
+        while offset < end:
+            next_byte = data[offset]
+            offset += 1
+            acc |= (next_byte & 0x7f) << shift
+            if next_byte < 0x80:
+                self._acc = acc
+                self._shift = 0
+                return offset
+            shift += 7
+            if shift >= limit:
+                if max_bytes is not None:
+                    raise DecodeLimitError(
+                        "varint is longer than %d bytes" % max_bytes)
+                raise WireopsError("varint is longer than 10 bytes")
+        self._acc = acc
+        self._shift = shift
+        return None
+
+    def _bytes(self, view, offset, end):
+        """
+        Continue collecting the payload of self._need bytes.  Return the
+        payload and the offset following it, or (None, end) if data ran
+        out first.
+        """
+        need = self._need
+        partial = self._partial
+        if not partial and end - offset >= need:
+            # the whole payload is in this chunk: copy it just once
+            return bytes(view[offset:offset + need]), offset + need
+        take = min(need - len(partial), end - offset)
+        partial += view[offset:offset + take]
+        offset += take
+        if len(partial) < need:
+            return None, offset
+        self._partial = bytearray()
+        return bytes(partial), offset
+
+    @property
+    def at_boundary(self):
+        """
+        Return whether everything fed so far has been emitted, with no
+        partial field or message pending.
+        """
+        return (self._state == self._INITIAL and
+                self._shift == 0 and not self._partial)
+
+    def close(self):
+        """ Raise WireopsError if a partial field or message is pending. """
+        if not self.at_boundary:
+            raise WireopsError("input ends part way through a value")
+
+
+class FieldDecoder(_Decoder):
+    """
+    Decode a stream of fields fed in chunks, emitting each field as a
+    tuple (field_nbr, ptype, value) as soon as it is complete.
+
+    VARINT, B32, and B64 values are ints; other values are bytes, with
+    LEN_PLUS and PACKED_VARINT values stripped of their length prefix.
+    """
+
+    __slots__ = ['_field_nbr', '_ptype', ]
+
+    _INITIAL = _HDR
+
+    def __init__(self):
+        super().__init__(_HDR)
+        self._field_nbr = 0
+        self._ptype = 0
+
+    def feed(self, data):
+        """ Consume a chunk of bytes, returning the fields completed. """
+        view = memoryview(data).cast('B')
+        offset = 0
+        end = len(view)
+        fields = []
+        while offset < end:
+            state = self._state
+            if state == _BYTES:
+                value, offset = self._bytes(view, offset, end)
+                if value is None:
+                    break
+                ptype = self._ptype
+                if ptype == PrimTypes.B32:
+                    value = _B32.unpack(value)[0]
+                elif ptype == PrimTypes.B64:
+                    value = _B64.unpack(value)[0]
+                fields.append((self._field_nbr, _PTYPES[ptype], value))
+                self._state = _HDR
+                continue
+
+            offset = self._varint(view, offset, end)
+            if offset is None:
+                break
+            value = self._acc
+            self._acc = 0
+            if state == _HDR:
+                self._field_nbr = value >> 3
+                ptype = self._ptype = value & 7
+                if ptype == PrimTypes.VARINT:
+                    self._state = _VARINT
+                elif _FIXED_LENS[ptype] is None:
+                    self._state = _LEN
+                else:
+                    self._need = _FIXED_LENS[ptype]
+                    self._state = _BYTES
+            elif state == _VARINT:
+                fields.append((self._field_nbr, PrimTypes.VARINT, value))
+                self._state = _HDR
+            elif value == 0:                    # _LEN: empty payload
+                fields.append((self._field_nbr, _PTYPES[self._ptype], b''))
+                self._state = _HDR
+            else:                               # _LEN
+                self._need = value
+                self._state = _BYTES
+        return fields
+
+
+class FrameDecoder(_Decoder):
+    """
+    Decode a stream of length-preceded messages fed in chunks.
+
+    Each complete message is emitted as bytes or, if a MessageSpec is
+    given, as the dict the spec decodes it to.  If a DecodePolicy is
+    given, length prefixes are checked against its max_varint_bytes and
+    frame lengths against its max_len_plus before any of the frame is
+    buffered, and messages are decoded under it.
+    """
+
+    __slots__ = ['_spec', '_policy', ]
+
+    _INITIAL = _LEN
+
+    def __init__(self, spec=None, policy=None):
+        super().__init__(_LEN)
+        self._spec = spec
+        self._policy = policy
+
+    def feed(self, data):
+        """ Consume a chunk of bytes, returning the messages completed. """
+        view = memoryview(data).cast('B')
+        offset = 0
+        end = len(view)
+        frames = []
+        max_bytes = None
+        if self._policy is not None:
+            max_bytes = self._policy.max_varint_bytes
+        while offset < end:
+            if self._state == _LEN:
+                offset = self._varint(view, offset, end, max_bytes)
+                if offset is None:
+                    break
+                self._need = self._acc
+                self._acc = 0
+                if self._policy is not None:
+                    self._policy.check_len(self._need)
+                if self._need:
+                    self._state = _BYTES
+                    continue
+                payload = b''
+            else:
+                payload, offset = self._bytes(view, offset, end)
+                if payload is None:
+                    break
+                self._state = _LEN
+            if self._spec is not None:
+                payload = self._spec.decode_bytes(payload, self._policy)
+            frames.append(payload)
+        return frames
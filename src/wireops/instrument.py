@@ -0,0 +1,234 @@
+# wireops/instrument.py
+
+"""
+Opt-in counters for the typed dispatch tables and the raw primitives.
+
+enable() swaps every entry in the typed dispatch tables, every public
+read_* and write_* function in raw, and WireBuffer.reserve for wrappers
+which count calls, bytes, and time.  Raw functions are swapped wherever
+a loaded wireops module holds them: under the name it imported, and in
+its module-level lists and dicts, such as the value writers of spec,
+whether directly or in a partial.  disable() puts the original
+functions back, so when instrumentation is off the hot paths are
+exactly what they would be without this module: there is no flag to
+test.
+
+Bytes are the change in the channel's position for readers and writers
+and the value returned for length functions.  Times are inclusive: a
+typed put also counts toward the raw writers it calls.  The counters
+are not locked, so under threads they are approximate.
+
+A MessageSpec compiled, or a record class generated, while
+instrumentation is off holds the original functions in its plan, so
+only the raw calls made within those functions are counted for it.
+"""
+
+import sys
+from functools import partial
+from time import perf_counter
+
+from wireops import raw
+from wireops.enum import FieldTypes
+from wireops.raw import WireBuffer
+from wireops.typed import(
+    T_PUT_FUNCS, T_GET_FUNCS, T_LEN_FUNCS, T_PUT_CHECKED_FUNCS)
+
+__all__ = ['enable', 'disable', 'is_enabled', 'snapshot', 'reset', ]
+
+# (table, kind) for each dispatch table, indexed as FieldTypes
+_TABLES = ((T_PUT_FUNCS, 'put'), (T_GET_FUNCS, 'get'), (T_LEN_FUNCS, 'len'),
+           (T_PUT_CHECKED_FUNCS, 'put_checked'))
+
+# counters, each a list [calls, bytes, seconds]
+_TYPED = {}         # (FieldTypes member, kind) -> counter
+_RAW = {}           # primitive name -> counter
+_GROWTH = [0, 0]    # growth events, bytes added
+
+# what enable() replaced: (table, key, original) and (name, original)
+_SAVED_ENTRIES = []
+_SAVED_NAMES = []
+_SAVED_RESERVE = []
+
+# WRAPPERS ==========================================================
+
+
+def _wrap_chan_func(func, counter):
+    """ Wrap a function taking a channel as its first argument. """
+    def wrapper(chan, *args, **kwargs):
+        before = chan.position
+        start = perf_counter()
+        result = func(chan, *args, **kwargs)
+        counter[2] += perf_counter() - start
+        counter[0] += 1
+        counter[1] += chan.position - before
+        return result
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def _wrap_len_func(func, counter):
+    """ Wrap a T_LEN_FUNCS entry, counting the lengths it returns. """
+    def wrapper(val, ndx):
+        start = perf_counter()
+        result = func(val, ndx)
+        counter[2] += perf_counter() - start
+        counter[0] += 1
+        counter[1] += result
+        return result
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def _wrap_reserve(reserve):
+    """ Wrap WireBuffer.reserve, counting the times it grows a buffer. """
+    def wrapper(self, k):
+        before = self.capacity
+        reserve(self, k)
+        if self.capacity != before:
+            _GROWTH[0] += 1
+            _GROWTH[1] += self.capacity - before
+    wrapper.__name__ = reserve.__name__
+    wrapper.__doc__ = reserve.__doc__
+    return wrapper
+
+
+def _raw_primitives():
+    """ Return the names of the public readers and writers in raw. """
+    return [name for name, value in vars(raw).items()
+            if name.startswith(('read_', 'write_')) and callable(value)]
+
+
+def _wireops_modules():
+    """ Return the wireops modules loaded so far. """
+    return [mod for name, mod in list(sys.modules.items())
+            if mod is not None and
+            (name == 'wireops' or name.startswith('wireops.'))]
+
+
+def _table_entries(modules):
+    """
+    Return (table, key, value) for each entry in the module-level lists
+    and dicts of modules, where functions may be bound at import time.
+    """
+    entries = []
+    for mod in modules:
+        for name, table in list(vars(mod).items()):
+            if name.startswith('__'):
+                continue
+            if isinstance(table, list):
+                entries.extend((table, ndx, value)
+                               for ndx, value in enumerate(table))
+            elif isinstance(table, dict):
+                entries.extend((table, key, value)
+                               for key, value in table.items())
+    return entries
+
+# PUBLIC INTERFACE ##################################################
+
+
+def is_enabled():
+    """ Return whether instrumentation is on. """
+    return bool(_SAVED_NAMES)
+
+
+def enable():
+    """
+    Swap the instrumented wrappers into the dispatch tables and into
+    every loaded wireops module.  Calling enable() again does nothing.
+    """
+    if is_enabled():
+        return
+    for table, kind in _TABLES:
+        for ftype in FieldTypes:
+            ndx = ftype.value
+            func = table[ndx]
+            counter = _TYPED.setdefault((ftype, kind), [0, 0, 0.0])
+            if kind == 'len':
+                table[ndx] = _wrap_len_func(func, counter)
+            else:
+                table[ndx] = _wrap_chan_func(func, counter)
+            _SAVED_ENTRIES.append((table, ndx, func))
+
+    modules = _wireops_modules()
+    wrappers = {}
+    for name in _raw_primitives():
+        func = getattr(raw, name)
+        counter = _RAW.setdefault(name, [0, 0, 0.0])
+        wrapper = _wrap_chan_func(func, counter)
+        # modules which imported the function hold their own reference
+        for mod in modules:
+            if vars(mod).get(name) is func:
+                setattr(mod, name, wrapper)
+        _SAVED_NAMES.append((name, func, wrapper))
+        wrappers[func] = wrapper
+
+    # as do tables built when a module was imported
+    for table, key, value in _table_entries(modules):
+        if not callable(value):
+            continue
+        if isinstance(value, partial) and value.func in wrappers:
+            table[key] = partial(wrappers[value.func], *value.args,
+                                 **value.keywords)
+        elif value in wrappers:
+            table[key] = wrappers[value]
+        else:
+            continue
+        _SAVED_ENTRIES.append((table, key, value))
+
+    reserve = WireBuffer.reserve
+    WireBuffer.reserve = _wrap_reserve(reserve)
+    _SAVED_RESERVE.append(reserve)
+
+
+def disable():
+    """ Restore the original functions.  The counters are kept. """
+    if not is_enabled():
+        return
+    for table, key, func in _SAVED_ENTRIES:
+        table[key] = func
+    modules = _wireops_modules()
+    for name, func, wrapper in _SAVED_NAMES:
+        for mod in modules:
+            if vars(mod).get(name) is wrapper:
+                setattr(mod, name, func)
+    WireBuffer.reserve = _SAVED_RESERVE[0]
+    del _SAVED_ENTRIES[:]
+    del _SAVED_NAMES[:]
+    del _SAVED_RESERVE[:]
+
+
+def reset():
+    """ Zero all counters. """
+    for counter in list(_TYPED.values()) + list(_RAW.values()):
+        counter[:] = [0, 0, 0.0]
+    _GROWTH[:] = [0, 0]
+
+
+def snapshot():
+    """
+    Return the counters as plain dicts, suitable for JSON:
+
+        {'typed': {sym: {kind: {'calls': n, 'bytes': n, 'seconds': t}}},
+         'raw': {name: {'calls': n, 'bytes': n, 'seconds': t}},
+         'growth': {'events': n, 'bytes': n}}
+
+    where sym is a FieldTypes symbol such as 'vuint32' and kind is one
+    of 'put', 'get', 'len', and 'put_checked'.  Only entries which have
+    been called appear.
+    """
+    def as_dict(counter):
+        return {'calls': counter[0], 'bytes': counter[1],
+                'seconds': counter[2]}
+
+    typed = {}
+    for (ftype, kind), counter in _TYPED.items():
+        if counter[0]:
+            typed.setdefault(ftype.sym, {})[kind] = as_dict(counter)
+    return {
+        'typed': typed,
+        'raw': {name: as_dict(counter)
+                for name, counter in _RAW.items() if counter[0]},
+        'growth': {'events': _GROWTH[0], 'bytes': _GROWTH[1]},
+    }
@@ -0,0 +1,86 @@
+# wireops/ints.py
+
+"""
+Normalization of Python ints to fixed-width integers.
+
+The as_* functions wrap silently, using only masks and shifts: a value
+out of range keeps its low-order bits, as a C cast would.  The check_*
+functions return the value unchanged if it is in range and raise
+otherwise: TypeError if it is not an integer and ValueError if it does
+not fit.  Use them to reject bad data rather than encode it.
+"""
+
+from operator import index
+
+__all__ = [
+    'as_uint16', 'as_int32', 'as_uint32', 'as_int64', 'as_uint64',
+    'check_uint16', 'check_int32', 'check_uint32',
+    'check_int64', 'check_uint64',
+]
+
+_MASK16 = 0xffff
+_MASK32 = 0xffffffff
+_MASK64 = 0xffffffffffffffff
+_SIGN32 = 0x80000000
+_SIGN64 = 0x8000000000000000
+
+# UNCHECKED =========================================================
+
+
+def as_uint16(value):
+    """ Return the low-order 16 bits of value, unsigned. """
+    return value & _MASK16
+
+
+def as_uint32(value):
+    """ Return the low-order 32 bits of value, unsigned. """
+    return value & _MASK32
+
+
+def as_int32(value):
+    """ Return the low-order 32 bits of value, as two's complement. """
+    return ((value & _MASK32) ^ _SIGN32) - _SIGN32
+
+
+def as_uint64(value):
+    """ Return the low-order 64 bits of value, unsigned. """
+    return value & _MASK64
+
+
+def as_int64(value):
+    """ Return the low-order 64 bits of value, as two's complement. """
+    return ((value & _MASK64) ^ _SIGN64) - _SIGN64
+
+# CHECKED ===========================================================
+
+
+def _check(value, lowest, highest, what):
+    value = index(value)            # TypeError if not an integer
+    if not lowest <= value <= highest:
+        raise ValueError("%s is out of range for %s" % (value, what))
+    return value
+
+
+def check_uint16(value):
+    """ Return value if it fits in an unsigned 16 bits, else raise. """
+    return _check(value, 0, _MASK16, 'uint16')
+
+
+def check_uint32(value):
+    """ Return value if it fits in an unsigned 32 bits, else raise. """
+    return _check(value, 0, _MASK32, 'uint32')
+
+
+def check_int32(value):
+    """ Return value if it fits in a signed 32 bits, else raise. """
+    return _check(value, -_SIGN32, _SIGN32 - 1, 'int32')
+
+
+def check_uint64(value):
+    """ Return value if it fits in an unsigned 64 bits, else raise. """
+    return _check(value, 0, _MASK64, 'uint64')
+
+
+def check_int64(value):
+    """ Return value if it fits in a signed 64 bits, else raise. """
+    return _check(value, -_SIGN64, _SIGN64 - 1, 'int64')
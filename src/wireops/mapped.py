@@ -0,0 +1,177 @@
+# wireops/mapped.py
+
+"""
+A channel over a memory-mapped file.
+
+MappedBuffer has the buffer, position, limit, and capacity of a
+WireBuffer, so every reader and writer in raw works on it unchanged,
+but its buffer is an mmap of a file rather than a bytearray.  Pages
+are read in by the operating system as they are touched, so a file
+much larger than memory can be decoded, and zero-copy reads return
+memoryview slices of the page cache itself.
+"""
+
+import mmap
+import os
+
+__all__ = ['MappedBuffer', ]
+
+
+class MappedBuffer(object):
+    """
+    A channel whose buffer is a read-only or read-write mapping of a
+    file.
+
+    The size of the mapping is fixed: writers raise ValueError rather
+    than grow it.  As with WireBuffer, the position is kept inside the
+    buffer when writing, so writers leave the last byte of a writable
+    mapping unused.  Readers may consume the whole file.
+    """
+
+    __slots__ = ['_buffer', '_fileobj', '_limit', '_position', '_writable', ]
+
+    def __init__(self, path, writable=False, size=None):
+        """
+        Map the file at path.  If writable is set the file is opened
+        for update, and if size is also given the file is created if
+        need be and truncated or extended to size bytes first.
+
+        The limit is set to the size of the mapping.
+        """
+        if size is not None and not writable:
+            raise ValueError("only a writable mapping can be sized")
+        if writable:
+            fd_ = os.open(path, os.O_RDWR | (
+                os.O_CREAT if size is not None else 0), 0o644)
+            fileobj = os.fdopen(fd_, 'r+b')
+            access = mmap.ACCESS_WRITE
+        else:
+            fileobj = open(path, 'rb')
+            access = mmap.ACCESS_READ
+        try:
+            if size is not None:
+                fileobj.truncate(size)
+            # raises ValueError if the file is empty
+            buf = mmap.mmap(fileobj.fileno(), 0, access=access)
+        except BaseException:
+            fileobj.close()
+            raise
+        self._buffer = buf
+        self._fileobj = fileobj
+        self._limit = len(buf)
+        self._position = 0
+        self._writable = writable
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def copy(self):
+        """
+        Return another MappedBuffer over the same mapping, with its own
+        position and limit.  Closing either closes the mapping.
+        """
+        other = MappedBuffer.__new__(MappedBuffer)
+        other._buffer = self._buffer
+        other._fileobj = self._fileobj
+        other._limit = self._limit
+        other._position = 0
+        other._writable = self._writable
+        return other
+
+    @property
+    def buffer(self):
+        """ Return the mmap object. """
+        return self._buffer
+
+    @property
+    def position(self):
+        """ Return the current position in the mapping. """
+        return self._position
+
+    @position.setter
+    def position(self, offset):
+        """
+        Set the current position in the mapping.  Unlike WireBuffer,
+        the position may equal the capacity, after the last byte of the
+        file has been read.
+        """
+        if offset < 0:
+            raise ValueError('position cannot be negative')
+        if offset > len(self._buffer):
+            raise ValueError('position cannot be beyond capacity')
+        self._position = offset
+
+    @property
+    def limit(self):
+        """
+        Return the current limit of the mapping.
+
+        0 <= limit <= capacity.
+        """
+        return self._limit
+
+    @limit.setter
+    def limit(self, offset):
+        """ Set the value of the mapping's limit. """
+        if offset < 0:
+            raise ValueError('limit cannot be set to a negative')
+        if offset < self._position:
+            raise ValueError(
+                "limit can't be set to less than current position")
+        if offset > len(self._buffer):
+            raise ValueError('limit cannot be beyond capacity')
+        self._limit = offset
+
+    @property
+    def capacity(self):
+        """ Return the capacity of the mapping, the size of the file. """
+        return len(self._buffer)
+
+    @property
+    def writable(self):
+        """ Return whether the mapping may be written to. """
+        return self._writable
+
+    @property
+    def closed(self):
+        """ Return whether the mapping has been closed. """
+        return self._buffer.closed
+
+    def reserve(self, k):
+        """
+        Check that k more bytes can be written at the current position,
+        raising ValueError if not: a mapping is never grown.
+        """
+        if k < 0:
+            raise ValueError(
+                "attempt to increase MappedBuffer size by negative number")
+        if self._position + k >= len(self._buffer):
+            raise ValueError("can't fit %u bytes into mapping" % k)
+
+    def flip(self):
+        """
+        Flip the buffer, making its current position the limit and
+        setting its position to zero.
+        """
+        self._limit = self._position
+        self._position = 0
+
+    def flush(self):
+        """ Write any changes to a writable mapping back to the file. """
+        if self._writable:
+            self._buffer.flush()
+
+    def close(self):
+        """
+        Flush and unmap the file and close it.
+
+        Raises BufferError if zero-copy views of the mapping are still
+        alive: release them first.
+        """
+        if not self._buffer.closed:
+            self.flush()
+            self._buffer.close()
+        self._fileobj.close()
@@ -0,0 +1,117 @@
+# wireops/parallel.py
+
+"""
+Decode a large file of length-delimited frames on several cores.
+
+The file is split into byte ranges which begin and end on frame
+boundaries, and each range is decoded by a worker in a process pool.
+Only the path, the MessageSpec, and the two offsets are sent to a
+worker, which maps the file itself: the data is shared through the
+page cache rather than pickled.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+
+from wireops import WireopsError
+from wireops.mapped import MappedBuffer
+from wireops.raw import decode_varint, read_raw_varint
+
+__all__ = ['split_frames', 'decode_range', 'decode_file', ]
+
+
+def split_frames(path, nnn, index=None):
+    """
+    Split the framed file at path into at most nnn byte ranges of
+    roughly equal size, each a whole number of frames.  Return a list
+    of (start, end) pairs.
+
+    If a frame index for the file, as kept by FrameWriter, is given the
+    split points are taken from it; otherwise the length prefixes are
+    scanned.
+    """
+    if nnn < 1:
+        raise ValueError("number of ranges must be positive but is %d" % nnn)
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    bounds = [0]
+    if index is not None:
+        count = len(index)
+        for k in range(1, nnn):
+            bound = index[count * k // nnn]
+            if bound > bounds[-1]:
+                bounds.append(bound)
+    else:
+        with MappedBuffer(path) as mbuf:
+            buf = mbuf.buffer
+            offset = 0
+            for target in (size * k // nnn for k in range(1, nnn)):
+                while offset < target:
+                    try:
+                        len_, offset = decode_varint(buf, offset)
+                    except ValueError:
+                        raise WireopsError(
+                            "frame at offset %d is truncated" %
+                            offset) from None
+                    offset += len_
+                if bounds[-1] < offset < size:
+                    bounds.append(offset)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def decode_range(path, spec, start, end):
+    """
+    Decode the frames in the byte range [start, end) of the framed file
+    at path, returning a list of the dicts spec decodes them to or, if
+    spec is None, of their payloads as bytes.
+
+    This is the work done by each worker process.
+    """
+    out = []
+    with MappedBuffer(path) as mbuf:
+        mbuf.position = start
+        buf = mbuf.buffer
+        while mbuf.position < end:
+            offset = mbuf.position
+            try:
+                len_ = read_raw_varint(mbuf)
+            except ValueError:
+                raise WireopsError(
+                    "frame at offset %d is truncated" % offset) from None
+            frame_end = mbuf.position + len_
+            if frame_end > end:
+                raise WireopsError(
+                    "frame at offset %d overruns its range" % mbuf.position)
+            if spec is None:
+                out.append(buf[mbuf.position:frame_end])
+                mbuf.position = frame_end
+            else:
+                out.append(spec.decode(mbuf, frame_end))
+    return out
+
+
+def decode_file(path, spec=None, max_workers=None, chunks=None,
+                ordered=True, index=None):
+    """
+    Decode every frame in the file at path using a pool of max_workers
+    processes, by default one per CPU, and iterate over the results.
+
+    The file is split into chunks ranges, by default four per worker.
+    If ordered is set the messages are returned in file order;
+    otherwise each range's messages are returned as soon as the range
+    is decoded, which keeps all the workers busy.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if chunks is None:
+        chunks = 4 * max_workers
+    ranges = split_frames(path, chunks, index)
+    if not ranges:
+        return
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(decode_range, path, spec, start, end)
+                   for start, end in ranges]
+        for future in futures if ordered else as_completed(futures):
+            yield from future.result()
@@ -0,0 +1,125 @@
+# wireops/policy.py
+
+"""
+Resource limits for decoding data from untrusted sources.
+
+By default wireops trusts what it decodes: a varint may run on for as
+many bytes as have the continuation bit set and a declared length is
+believed until the buffer runs out.  Decoders which accept a
+DecodePolicy check every varint, length, nesting level, and field
+count against its limits before acting on it, raising DecodeLimitError
+as soon as one is exceeded.  The checks are made once per value, on
+lengths and offsets, not once per byte.
+"""
+
+from wireops import WireopsError
+from wireops.enum import PrimTypes
+
+__all__ = ['DecodeLimitError', 'DecodePolicy', ]
+
+# lengths of fixed length values indexed by primitive type
+_FIXED_LENS = [None, None, 4, 8, None, 16, 20, 32]
+
+
+class DecodeLimitError(WireopsError):
+    """ Raised when input exceeds a limit set by a DecodePolicy. """
+
+
+class DecodePolicy(object):
+    """
+    Limits on what a decoder will accept:
+
+    max_varint_bytes    longest varint, at most 10
+    max_len_plus        largest length prefix, of a LEN_PLUS or packed
+                        value or of a frame
+    max_depth           deepest nesting of messages, the outermost
+                        message being at depth 1
+    max_fields          most fields in a message, nested messages
+                        included
+    """
+
+    __slots__ = ['_max_varint_bytes', '_max_len_plus', '_max_depth',
+                 '_max_fields', ]
+
+    def __init__(self, max_varint_bytes=10, max_len_plus=1 << 24,
+                 max_depth=32, max_fields=1 << 20):
+        if not 1 <= max_varint_bytes <= 10:
+            raise ValueError(
+                "max_varint_bytes must be in 1..10 but is %d" %
+                max_varint_bytes)
+        for name, value in (('max_len_plus', max_len_plus),
+                            ('max_depth', max_depth),
+                            ('max_fields', max_fields)):
+            if value < 0:
+                raise ValueError(
+                    "%s cannot be negative but is %d" % (name, value))
+        self._max_varint_bytes = max_varint_bytes
+        self._max_len_plus = max_len_plus
+        self._max_depth = max_depth
+        self._max_fields = max_fields
+
+    @property
+    def max_varint_bytes(self):
+        """ Return the maximum length of a varint in bytes. """
+        return self._max_varint_bytes
+
+    @property
+    def max_len_plus(self):
+        """ Return the maximum value of a length prefix. """
+        return self._max_len_plus
+
+    @property
+    def max_depth(self):
+        """ Return the maximum nesting depth of messages. """
+        return self._max_depth
+
+    @property
+    def max_fields(self):
+        """ Return the maximum number of fields in a message tree. """
+        return self._max_fields
+
+    def check_len(self, len_):
+        """ Raise DecodeLimitError if a length prefix is too large. """
+        if len_ > self._max_len_plus:
+            raise DecodeLimitError(
+                "length %d exceeds the limit of %d" % (
+                    len_, self._max_len_plus))
+
+    def read_varint(self, buf, offset, end):
+        """
+        Decode a varint at offset in buf, which must end before both
+        end and max_varint_bytes.  Return the value and the offset of
+        the next byte.
+        """
+        stop = min(end, offset + self._max_varint_bytes)
+        value = 0
+        shift = 0
+        while offset < stop:
+            next_byte = buf[offset]
+            offset += 1
+            value |= (next_byte & 0x7f) << shift
+            if next_byte < 0x80:
+                return value, offset
+            shift += 7
+        if stop < end:
+            raise DecodeLimitError(
+                "varint is longer than %d bytes" % self._max_varint_bytes)
+        raise WireopsError("varint overruns the end of the message")
+
+    def value_extent(self, buf, offset, end, ptype):
+        """
+        Like raw.value_extent, return the offset and length of the value
+        of a field of primitive type ptype starting at offset, checking
+        the value against the limits and against end.
+        """
+        length = _FIXED_LENS[ptype]
+        if length is None:
+            if ptype == PrimTypes.VARINT:
+                start = offset
+                _, offset = self.read_varint(buf, offset, end)
+                return start, offset - start
+            length, offset = self.read_varint(buf, offset, end)
+            self.check_len(length)
+        if offset + length > end:
+            raise WireopsError("value overruns the end of the message")
+        return offset, length
@@ -0,0 +1,114 @@
+# wireops/pool.py
+
+""" A pool of WireBuffers which can be reused across messages. """
+
+import threading
+from contextlib import contextmanager
+
+from wireops.raw import next_power_of_two, WireBuffer
+
+__all__ = ['WireBufferPool', ]
+
+
+class WireBufferPool(object):
+    """
+    A thread-safe pool of WireBuffers, grouped into size classes.
+
+    Each size class holds free buffers of a single capacity, a power of
+    two.  A buffer taken from the pool is not zeroed: it holds whatever
+    the previous user wrote to it.
+    """
+
+    __slots__ = ['_auto_grow', '_classes', '_discards', '_hits',
+                 '_lock', '_max_per_class', '_misses', ]
+
+    def __init__(self, max_per_class=16, auto_grow=False):
+        """
+        Initialize the pool.  At most max_per_class free buffers are kept
+        in each size class; buffers released beyond that are dropped.
+        New buffers are created with the auto_grow setting given.
+        """
+        if max_per_class < 0:
+            raise ValueError(
+                "max_per_class cannot be negative but is %d" % max_per_class)
+        self._auto_grow = auto_grow
+        self._classes = {}
+        self._discards = 0
+        self._hits = 0
+        self._lock = threading.Lock()
+        self._max_per_class = max_per_class
+        self._misses = 0
+
+    def acquire(self, nnn=1024):
+        """
+        Return a WireBuffer with a capacity of at least nnn bytes, the
+        next power of two, reusing a free buffer if there is one.
+        """
+        capacity = next_power_of_two(nnn)
+        with self._lock:
+            free = self._classes.get(capacity)
+            if free:
+                self._hits += 1
+                return free.pop()
+            self._misses += 1
+        return WireBuffer(capacity, auto_grow=self._auto_grow)
+
+    def release(self, wb_):
+        """
+        Return a buffer to the pool, resetting its position and limit.
+
+        A buffer which has grown is filed under its new capacity.  The
+        caller must not use the buffer after releasing it.
+        """
+        wb_.position = 0
+        wb_.limit = wb_.capacity
+        with self._lock:
+            free = self._classes.setdefault(wb_.capacity, [])
+            if len(free) < self._max_per_class:
+                free.append(wb_)
+            else:
+                self._discards += 1
+
+    @contextmanager
+    def buffer(self, nnn=1024):
+        """
+        Context manager which acquires a buffer and releases it on exit:
+
+            with pool.buffer(4096) as wb_:
+                ...
+        """
+        wb_ = self.acquire(nnn)
+        try:
+            yield wb_
+        finally:
+            self.release(wb_)
+
+    @property
+    def max_per_class(self):
+        """ Return the maximum number of free buffers per size class. """
+        return self._max_per_class
+
+    @property
+    def hits(self):
+        """ Return the number of requests satisfied by a free buffer. """
+        return self._hits
+
+    @property
+    def misses(self):
+        """ Return the number of requests which allocated a new buffer. """
+        return self._misses
+
+    @property
+    def discards(self):
+        """ Return the number of buffers dropped because a class was full. """
+        return self._discards
+
+    def free_counts(self):
+        """ Return a dict mapping each capacity to its free buffer count. """
+        with self._lock:
+            return {cap: len(free) for cap, free in self._classes.items()}
+
+    def clear(self):
+        """ Drop all free buffers, leaving the counters alone. """
+        with self._lock:
+            self._classes.clear()
@@ -3,23 +3,40 @@
 """
 Functions supporting the low-level manipulation of fields on the wire.
 """
-import ctypes       # XXX
+import os
+import struct
+import sys
+from array import array
 from wireops import WireopsError
 from wireops.enum import FieldTypes, PrimTypes
 
 __all__ = [
     'field_hdr_val', 'read_field_hdr', 'field_hdr_len',
     'hdr_field_nbr', 'hdr_ptype',
+    'FIELD_PRIM_TYPES', 'field_hdr_bytes', 'write_field_hdr',
+    'value_extent', 'skip_field', 'find_field',
+    'write_hdr_bytes', 'varint_bytes',
+    'max_cached_field_nbr', 'set_max_cached_field_nbr',
     'length_as_varint', 'write_varint_field',
-    'read_raw_varint', 'write_raw_varint',
+    'read_raw_varint', 'write_raw_varint', 'decode_varint',
+    'read_varints', 'write_varints',
+    'read_raw_packed_varint', 'write_packed_varint_field',
     'read_raw_b32', 'write_b32_field',
     'read_raw_b64', 'write_b64_field',
-    'read_raw_len_plus', 'write_len_plus_field',
+    'read_raw_float', 'write_raw_float', 'write_float_field',
+    'read_raw_double', 'write_raw_double', 'write_double_field',
+    'read_raw_b32s', 'write_raw_b32s', 'read_raw_b64s', 'write_raw_b64s',
+    'read_raw_floats', 'write_raw_floats',
+    'read_raw_doubles', 'write_raw_doubles',
+    'PACKED_FIXED_TYPES', 'PACKED_FIXED_SIZES', 'BIG_ENDIAN_HOST',
+    'packed_fixed_len', 'read_raw_packed_fixed',
+    'write_raw_packed_fixed', 'write_packed_fixed_field',
+    'read_raw_len_plus', 'write_len_plus_field', 'bytes_len',
     'read_raw_b128', 'write_b128_field',
     'read_raw_b160', 'write_b160_field',
     'read_raw_b256', 'write_b256_field',
     # -- methods --------------------------------------------
-    'next_power_of_two',
+    'next_power_of_two', 'HAVE_SPEEDUPS',
     # -- classes --------------------------------------------
     'WireBuffer',
 ]
@@ -47,32 +64,17 @@ def field_hdr_len(ndx, ftype):
     Return the length of a header, given the field number ndx and its
     field type.
 
-    The 'type' is FieldType.value.
-
-    XXX THE NEXT CALCULATION IS AN ERROR.  There are currently 8 PrimTypes
-    but 18 FieldTypes.
-    """
-    fndx = ftype.value
-    # pylint is a bit thick
-    # pylint: disable=unsubscriptable-object
-    if fndx < FieldTypes.F_UINT32.value:
-        ptype = PrimTypes.VARINT
-    elif fndx < FieldTypes.F_UINT64.value:
-        ptype = PrimTypes.B32
-    elif fndx < FieldTypes.L_STRING.value:
-        ptype = PrimTypes.B64
-    elif fndx < FieldTypes.F_BYTES16.value:
-        ptype = PrimTypes.LEN_PLUS
-    elif fndx == FieldTypes.F_BYTES16.value:
-        ptype = PrimTypes.B128
-    elif fndx == FieldTypes.F_BYTES20.value:
-        ptype = PrimTypes.B160
-    elif fndx == FieldTypes.F_BYTES32.value:
-        ptype = PrimTypes.B256
-    else:
-        raise WireopsError("FieldType has invalid index %d" % fndx)
-
-    return length_as_varint(field_hdr_val(ndx, ptype))
+    The field type is mapped to the primitive type which carries it on
+    the wire using FIELD_PRIM_TYPES; headers for small field numbers
+    are looked up in a precomputed table.
+    """
+    try:
+        hdr = (ndx << 3) | _FIELD_PRIM_VALUES[ftype]
+    except IndexError:
+        raise WireopsError("FieldType has invalid index %d" % ftype) from None
+    if 0 <= hdr < len(_HDR_LENS):
+        return _HDR_LENS[hdr]
+    return length_as_varint(hdr)
 
 
 def hdr_field_nbr(header):
@@ -97,6 +99,172 @@ def read_field_hdr(chan):
     field_nbr = hdr_field_nbr(hdr)
     return (ptype, field_nbr)
 
+# SKIPPING FIELDS ===================================================
+
+# primitive types indexed by value
+_PTYPES = list(PrimTypes)
+
+# lengths of fixed length values indexed by primitive type; None marks
+# values whose length must be read from the buffer
+_FIXED_LENS = [None, None, 4, 8, None, 16, 20, 32]
+
+
+def value_extent(buf, offset, ptype):
+    """
+    Given the offset in buf of the value of a field of primitive type
+    ptype, return the offset and length of the value proper.
+
+    For LEN_PLUS and PACKED_VARINT values this excludes the length
+    prefix.  Nothing is decoded beyond a length prefix.
+    """
+    length = _FIXED_LENS[ptype]
+    if length is None:
+        if ptype == PrimTypes.VARINT:
+            start = offset
+            try:
+                while buf[offset] & 0x80:
+                    offset += 1
+            except IndexError:
+                raise ValueError(
+                    "attempt to read beyond end of buffer") from None
+            return start, offset + 1 - start
+        length, offset = decode_varint(buf, offset)
+    return offset, length
+
+
+def skip_field(chan, ptype):
+    """
+    Move the channel past the value of a field of primitive type ptype
+    without decoding it.  The field header must already have been read.
+    """
+    buf = chan.buffer
+    offset, length = value_extent(buf, chan.position, ptype)
+    offset += length
+    if offset > len(buf):
+        raise ValueError("attempt to read beyond end of buffer")
+    chan.position = offset
+
+
+def find_field(chan, field_nbr, end=None):
+    """
+    Search from the channel's position up to end, by default the
+    channel's limit, for a field with field number field_nbr.
+
+    If it is found, leave the channel positioned at its value and return
+    its primitive type.  Otherwise return None, leaving the channel's
+    position unchanged.  Fields passed over are skipped, not decoded.
+    """
+    buf = chan.buffer
+    offset = chan.position
+    if end is None:
+        end = chan.limit
+    while offset < end:
+        hdr, offset = decode_varint(buf, offset)
+        if hdr >> 3 == field_nbr:
+            chan.position = offset
+            return _PTYPES[hdr & 7]
+        offset, length = value_extent(buf, offset, hdr & 7)
+        offset += length
+    return None
+
+# HEADER TABLES =====================================================
+
+# the primitive type carrying each field type, indexed by FieldTypes.value
+FIELD_PRIM_TYPES = (
+    [PrimTypes.VARINT] * 6 +            # V_BOOL .. V_SINT64
+    [PrimTypes.B32] * 3 +               # F_UINT32, F_SINT32, F_FLOAT
+    [PrimTypes.B64] * 3 +               # F_UINT64, F_SINT64, F_DOUBLE
+    [PrimTypes.LEN_PLUS] * 3 +          # L_STRING, L_BYTES, L_MSG
+    [PrimTypes.B128, PrimTypes.B160, PrimTypes.B256])
+assert len(FIELD_PRIM_TYPES) == len(FieldTypes)
+_FIELD_PRIM_VALUES = [ptype.value for ptype in FIELD_PRIM_TYPES]
+
+# Encoded headers and their lengths, indexed by header value, that is
+# by (field number << 3) | primitive type.
+_HDR_BYTES = []
+_HDR_LENS = []
+
+
+def varint_bytes(value):
+    """ Return an unsigned value encoded as a varint. """
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def max_cached_field_nbr():
+    """ Return the highest field number whose headers are precomputed. """
+    return (len(_HDR_BYTES) >> 3) - 1
+
+
+def set_max_cached_field_nbr(nnn):
+    """
+    Rebuild the header tables to cover field numbers 0 through nnn.
+
+    Headers for higher field numbers are encoded as they are written.
+    """
+    if nnn < 0:
+        raise ValueError(
+            "max cached field number cannot be negative but is %d" % nnn)
+    hdr_bytes = [varint_bytes(hdr) for hdr in range((nnn + 1) << 3)]
+    # update in place: other modules may hold references to the tables
+    _HDR_BYTES[:] = hdr_bytes
+    _HDR_LENS[:] = [len(_) for _ in hdr_bytes]
+
+
+set_max_cached_field_nbr(255)
+
+
+def field_hdr_bytes(ndx, ptype):
+    """
+    Return the encoded header for field number ndx and primitive type
+    ptype as bytes.
+    """
+    hdr = (ndx << 3) | ptype
+    if 0 <= hdr < len(_HDR_BYTES):
+        return _HDR_BYTES[hdr]
+    return varint_bytes(hdr)
+
+
+def write_hdr_bytes(chan, hdr_bytes):
+    """ Write an encoded header, as from field_hdr_bytes, to a channel. """
+    buf = chan.buffer
+    offset = chan.position
+    end = offset + len(hdr_bytes)
+    if end >= len(buf):
+        buf = _make_room(chan, offset, len(hdr_bytes))
+    buf[offset:end] = hdr_bytes
+    chan.position = end
+
+
+def write_field_hdr(chan, field_nbr, prim_type):
+    """ Write the field header for a primitive type. """
+    hdr = (field_nbr << 3) | prim_type
+    if 0 <= hdr < len(_HDR_BYTES):
+        write_hdr_bytes(chan, _HDR_BYTES[hdr])
+    else:
+        write_raw_varint(chan, hdr)
+
+# BUFFER SPACE ######################################################
+
+
+def _make_room(chan, offset, k):
+    """
+    Called by writers when k bytes at offset would not leave the
+    channel's position inside its buffer.
+
+    If the channel is an auto-growing WireBuffer, grow it and return
+    the (possibly reallocated) buffer.  Otherwise raise ValueError.
+    """
+    if not getattr(chan, 'auto_grow', False):
+        raise ValueError("can't fit %u bytes into buffer" % k)
+    chan.position = offset
+    chan.reserve(k)
+    return chan.buffer
+
 # VARINTS ###########################################################
 
 
@@ -154,19 +322,38 @@ def read_raw_varint(chan):
     return value
 
 
+def decode_varint(buf, offset):
+    """
+    Decode a varint starting at offset in buf, any object indexable as
+    unsigned bytes.  Return the value and the offset of the next byte.
+    """
+    value = 0
+    shift = 0
+    try:
+        while True:
+            next_byte = buf[offset]
+            offset += 1
+            value |= (next_byte & 0x7f) << shift
+            if next_byte < 0x80:
+                return value, offset
+            shift += 7
+    except IndexError:
+        raise ValueError("attempt to read beyond end of buffer") from None
+
+
 def write_raw_varint(chan, string):
     """ Write a simple varint to the channel. """
 
     buf = chan.buffer
     offset = chan.position
     # all varints are construed as 64 bit unsigned numbers
-    value = ctypes.c_uint64(string).value
+    value = string & 0xffffffffffffffff
 #   # DEBUG
 #   print "entering writeRaw: will write 0x%x at offset %u" % ( v, offset)
 #   # END
     len_ = length_as_varint(value)
-    if offset + len_ > len(buf):
-        raise ValueError("can't fit varint of length %u into buffer" % len_)
+    if offset + len_ >= len(buf):
+        buf = _make_room(chan, offset, len_)
     while True:
         buf[offset] = (value & 0x7f)
         offset += 1
@@ -184,60 +371,169 @@ def write_varint_field(chan, varint_, nnn):
 
     The header is the field number << 3 ORed with 0, PrimTypes.VARINT.
     """
-    hdr = field_hdr_val(nnn, PrimTypes.VARINT)
-    write_raw_varint(chan, hdr)
+    write_field_hdr(chan, nnn, PrimTypes.VARINT)
 #   # DEBUG
 #   print "header was 0x%x; writing value 0x%x at offset %u" % (
 #                                               hdr, v, chan.position)
 #   # END
     write_raw_varint(chan, varint_)
 
-# 32- AND 64-BIT FIXED LENGTH FIELDS ################################
+# PACKED VARINTS ####################################################
 
 
-def read_raw_b32(chan):
+def read_varints(chan, count):
     """
-    Read a 4-byte value from a channel.
+    Read count bare varints from a channel, returning them as an
+    array('Q').
 
-    buf construed as array of unsigned bytes.
+    The whole run is decoded in a single pass over the buffer and the
+    channel's position is updated once, at the end.
     """
     buf = chan.buffer
     offset = chan.position
-    # XXX verify buffer long enough
-    value = buf[offset]
-    offset += 1         # little-endian
-    value |= buf[offset] << 8
-    offset += 1
-    value |= buf[offset] << 16
-    offset += 1
-    value |= buf[offset] << 24
-    offset += 1
+    end = len(buf)
+    values = array('Q')
+    append = values.append
+    for _ in range(count):
+        value = 0
+        shift = 0
+        while True:
+            if offset >= end:
+                raise ValueError("attempt to read beyond end of buffer")
+            next_byte = buf[offset]
+            offset += 1
+            value |= (next_byte & 0x7f) << shift
+            if next_byte < 0x80:
+                break
+            shift += 7
+        append(value)
     chan.position = offset
-    return value
+    return values
 
 
-def write_raw_b32(chan, value):
-    """ Write a simple 4-byte value to a channel. """
+def write_varints(chan, values):
+    """
+    Write a sequence of bare varints to a channel.
+
+    values may be any iterable of ints; like write_raw_varint, each is
+    construed as a 64 bit unsigned number.  The channel's position is
+    updated once, after the last value has been written.
+    """
+    buf = chan.buffer
+    offset = chan.position
+    end = len(buf)
+    for value in values:
+        value &= 0xffffffffffffffff
+        if offset + 10 >= end:
+            # close to the end: check the exact length
+            len_ = length_as_varint(value)
+            if offset + len_ >= end:
+                buf = _make_room(chan, offset, len_)
+                end = len(buf)
+        while value >= 0x80:
+            buf[offset] = (value & 0x7f) | 0x80
+            offset += 1
+            value >>= 7
+        buf[offset] = value
+        offset += 1
+    chan.position = offset
+
+
+def read_raw_packed_varint(chan):
+    """
+    Read a length-preceded run of varints from a channel, returning
+    them as an array('Q').
+
+    The length is the number of bytes occupied by the packed varints,
+    not the number of values.
+    """
+    len_ = read_raw_varint(chan)
     buf = chan.buffer
     offset = chan.position
-    buf[offset] = 0xff & value
-    value >>= 8
-    offset += 1
-    buf[offset] = 0xff & value
-    value >>= 8
-    offset += 1
-    buf[offset] = 0xff & value
-    value >>= 8
-    offset += 1
-    buf[offset] = 0xff & value
-    offset += 1
+    end = offset + len_
+    if end > len(buf):
+        raise ValueError("attempt to read beyond end of buffer")
+    values = array('Q')
+    append = values.append
+    while offset < end:
+        value = 0
+        shift = 0
+        while True:
+            next_byte = buf[offset]
+            offset += 1
+            value |= (next_byte & 0x7f) << shift
+            if next_byte < 0x80:
+                break
+            shift += 7
+        append(value)
+    if offset != end:
+        raise ValueError("packed varint overruns its declared length")
     chan.position = offset
+    return values
+
+
+def write_packed_varint_field(chan, values, nnn):
+    """
+    Write a header followed by a length-preceded run of varints.
+
+    The header is the field number << 3 ORed with PrimTypes.PACKED_VARINT.
+    """
+    values = [value & 0xffffffffffffffff for value in values]
+    len_ = 0
+    for value in values:
+        len_ += length_as_varint(value)
+    write_field_hdr(chan, nnn, PrimTypes.PACKED_VARINT)
+    write_raw_varint(chan, len_)
+    write_varints(chan, values)
+
+# 32- AND 64-BIT FIXED LENGTH FIELDS ################################
+
+# all fixed length values are little-endian on the wire
+_B32 = struct.Struct('<I')
+_B64 = struct.Struct('<Q')
+_FLOAT = struct.Struct('<f')
+_DOUBLE = struct.Struct('<d')
+
+
+def _read_raw_struct(chan, fmt):
+    """ Unpack a single value in format fmt from the channel. """
+    buf = chan.buffer
+    offset = chan.position
+    try:
+        value = fmt.unpack_from(buf, offset)[0]
+    except struct.error:
+        raise ValueError("attempt to read beyond end of buffer") from None
+    chan.position = offset + fmt.size
+    return value
+
+
+def _write_raw_struct(chan, fmt, value):
+    """ Pack a single value in format fmt into the channel. """
+    buf = chan.buffer
+    offset = chan.position
+    if offset + fmt.size >= len(buf):
+        buf = _make_room(chan, offset, fmt.size)
+    fmt.pack_into(buf, offset, value)
+    chan.position = offset + fmt.size
+
+
+def read_raw_b32(chan):
+    """
+    Read a 4-byte value from a channel.
+
+    buf construed as array of unsigned bytes.
+    """
+    return _read_raw_struct(chan, _B32)
+
+
+def write_raw_b32(chan, value):
+    """ Write a simple 4-byte value to a channel. """
+    _write_raw_struct(chan, _B32, value & 0xffffffff)
 
 
 def write_b32_field(chan, value, ndx):
     """ Write a header followed by a 4-byte value to a channel. """
-    hdr = field_hdr_val(ndx, PrimTypes.B32)
-    write_raw_varint(chan, hdr)
+    write_field_hdr(chan, ndx, PrimTypes.B32)
     write_raw_b32(chan, value)
 
 
@@ -247,117 +543,332 @@ def read_raw_b64(chan):
 
     buf construed as array of unsigned bytes
     """
-    buf = chan.buffer
-    offset = chan.position
-    # XXX verify buffer long enough
-    value = buf[offset]
-    offset += 1         # little-endian
-    value |= buf[offset] << 8
-    offset += 1
-    value |= buf[offset] << 16
-    offset += 1
-    value |= buf[offset] << 24
-    offset += 1
-    value |= buf[offset] << 32
-    offset += 1
-    value |= buf[offset] << 40
-    offset += 1
-    value |= buf[offset] << 48
-    offset += 1
-    value |= buf[offset] << 56
-    offset += 1
-    chan.position = offset
-    return value
+    return _read_raw_struct(chan, _B64)
 
 
 def write_raw_b64(chan, value):
     """ Write an 8-byte value to a channel. """
-    # XXX verify buffer long enough
-    buf = chan.buffer
-    offset = chan.position
-    buf[offset] = 0xff & value
-    value >>= 8
-    offset += 1
-    buf[offset] = 0xff & value
-    value >>= 8
-    offset += 1
-    buf[offset] = 0xff & value
-    value >>= 8
-    offset += 1
-    buf[offset] = 0xff & value
-    value >>= 8
-    offset += 1
-    buf[offset] = 0xff & value
-    value >>= 8
-    offset += 1
-    buf[offset] = 0xff & value
-    value >>= 8
-    offset += 1
-    buf[offset] = 0xff & value
-    value >>= 8
-    offset += 1
-    buf[offset] = 0xff & value
-    offset += 1
-    chan.position = offset
+    _write_raw_struct(chan, _B64, value & 0xffffffffffffffff)
 
 
 def write_b64_field(chan, value, ndx):
     """ Write a header and an 8-byte value to a channel. """
-    hdr = field_hdr_val(ndx, PrimTypes.B64)
-    write_raw_varint(chan, hdr)
+    write_field_hdr(chan, ndx, PrimTypes.B64)
     write_raw_b64(chan, value)
 
+
+def read_raw_float(chan):
+    """ Read a 4-byte IEEE 754 float from a channel. """
+    return _read_raw_struct(chan, _FLOAT)
+
+
+def write_raw_float(chan, value):
+    """ Write a float to a channel as 4 bytes. """
+    _write_raw_struct(chan, _FLOAT, value)
+
+
+def write_float_field(chan, value, ndx):
+    """ Write a header followed by a 4-byte float to a channel. """
+    write_field_hdr(chan, ndx, PrimTypes.B32)
+    write_raw_float(chan, value)
+
+
+def read_raw_double(chan):
+    """ Read an 8-byte IEEE 754 double from a channel. """
+    return _read_raw_struct(chan, _DOUBLE)
+
+
+def write_raw_double(chan, value):
+    """ Write a float to a channel as an 8-byte double. """
+    _write_raw_struct(chan, _DOUBLE, value)
+
+
+def write_double_field(chan, value, ndx):
+    """ Write a header followed by an 8-byte double to a channel. """
+    write_field_hdr(chan, ndx, PrimTypes.B64)
+    write_raw_double(chan, value)
+
+# runs of fixed length values ---------------------------------------
+
+
+def _read_raw_run(chan, code, size, count):
+    """ Read count consecutive values in struct format code. """
+    buf = chan.buffer
+    offset = chan.position
+    try:
+        values = struct.unpack_from('<%d%s' % (count, code), buf, offset)
+    except struct.error:
+        raise ValueError("attempt to read beyond end of buffer") from None
+    chan.position = offset + size * count
+    return list(values)
+
+
+def _write_raw_run(chan, code, size, values):
+    """ Write a sequence of values in struct format code. """
+    buf = chan.buffer
+    offset = chan.position
+    count = len(values)
+    if offset + size * count >= len(buf):
+        buf = _make_room(chan, offset, size * count)
+    struct.pack_into('<%d%s' % (count, code), buf, offset, *values)
+    chan.position = offset + size * count
+
+
+def read_raw_b32s(chan, count):
+    """ Read count consecutive 4-byte unsigned values from a channel. """
+    return _read_raw_run(chan, 'I', 4, count)
+
+
+def write_raw_b32s(chan, values):
+    """ Write a sequence of ints to a channel as consecutive 4-byte values. """
+    _write_raw_run(chan, 'I', 4, [v & 0xffffffff for v in values])
+
+
+def read_raw_b64s(chan, count):
+    """ Read count consecutive 8-byte unsigned values from a channel. """
+    return _read_raw_run(chan, 'Q', 8, count)
+
+
+def write_raw_b64s(chan, values):
+    """ Write a sequence of ints to a channel as consecutive 8-byte values. """
+    _write_raw_run(chan, 'Q', 8, [v & 0xffffffffffffffff for v in values])
+
+
+def read_raw_floats(chan, count):
+    """ Read count consecutive 4-byte floats from a channel. """
+    return _read_raw_run(chan, 'f', 4, count)
+
+
+def write_raw_floats(chan, values):
+    """ Write a sequence of floats to a channel as 4-byte floats. """
+    _write_raw_run(chan, 'f', 4, list(values))
+
+
+def read_raw_doubles(chan, count):
+    """ Read count consecutive 8-byte doubles from a channel. """
+    return _read_raw_run(chan, 'd', 8, count)
+
+
+def write_raw_doubles(chan, values):
+    """ Write a sequence of floats to a channel as 8-byte doubles. """
+    _write_raw_run(chan, 'd', 8, list(values))
+
+# packed runs of fixed length values --------------------------------
+
+# The values of a packed fixed length field are written back to back,
+# little-endian, as the value of a single LEN_PLUS field.  They are
+# decoded as views of the buffer cast to the matching array typecode;
+# only a big-endian host needs to copy and swap them.
+
+# array typecodes of the field types which may be packed, indexed by
+# FieldTypes member
+PACKED_FIXED_TYPES = {
+    FieldTypes.F_UINT32: 'I',
+    FieldTypes.F_SINT32: 'i',
+    FieldTypes.F_FLOAT: 'f',
+    FieldTypes.F_UINT64: 'Q',
+    FieldTypes.F_SINT64: 'q',
+    FieldTypes.F_DOUBLE: 'd',
+}
+
+# lengths on the wire, indexed by typecode
+PACKED_FIXED_SIZES = {code: struct.calcsize('<' + code)
+                      for code in PACKED_FIXED_TYPES.values()}
+
+# whether packed values must be byte-swapped to or from the wire
+BIG_ENDIAN_HOST = sys.byteorder == 'big'
+
+
+def _packed_code(ftype):
+    """ Return the array typecode for a packable field type. """
+    try:
+        return PACKED_FIXED_TYPES[ftype]
+    except KeyError:
+        raise WireopsError(
+            "field type %s cannot be packed" % (ftype,)) from None
+
+
+def _packed_view(values, code):
+    """
+    Return values as a flat memoryview of bytes in wire order.
+
+    An object supporting the buffer protocol whose items already have
+    the right format, such as an array of the same typecode, is used
+    in place on a little-endian host; anything else is converted
+    through an array.
+    """
+    try:
+        view = memoryview(values)
+    except TypeError:
+        view = None
+    if view is not None:
+        if (not BIG_ENDIAN_HOST and view.ndim == 1 and view.c_contiguous and
+                view.format.lstrip('@=<') == code):
+            return view.cast('B')
+        view.release()
+    try:
+        values = array(code, values)
+    except OverflowError as exc:
+        msg = "value out of range for typecode '%s': %s" % (code, exc)
+        raise ValueError(msg) from None
+    if BIG_ENDIAN_HOST:
+        values.byteswap()
+    return memoryview(values).cast('B')
+
+
+def packed_fixed_len(values, ftype):
+    """
+    Return the length of the value of a packed field, including its
+    length prefix but not its header.
+    """
+    len_ = len(values) * PACKED_FIXED_SIZES[_packed_code(ftype)]
+    return length_as_varint(len_) + len_
+
+
+def write_packed_fixed_field(chan, values, ftype, nnn):
+    """
+    Write a header followed by the length-preceded values of a packed
+    field of fixed length type ftype, one of PACKED_FIXED_TYPES.
+
+    values may be an array or other buffer of the matching typecode,
+    which is copied to the channel in a single slice assignment, or any
+    sequence of numbers.  The header is the field number << 3 ORed with
+    PrimTypes.LEN_PLUS.
+    """
+    view = _packed_view(values, _packed_code(ftype))
+    write_field_hdr(chan, nnn, PrimTypes.LEN_PLUS)
+    write_raw_varint(chan, len(view))
+    _write_raw_view(chan, view)
+
+
+def write_raw_packed_fixed(chan, values, ftype):
+    """
+    Write the length-preceded values of a packed field without its
+    header; see write_packed_fixed_field.
+    """
+    view = _packed_view(values, _packed_code(ftype))
+    write_raw_varint(chan, len(view))
+    _write_raw_view(chan, view)
+
+
+def read_raw_packed_fixed(chan, ftype, zero_copy=False):
+    """
+    Read the length-preceded values of a packed field of fixed length
+    type ftype.
+
+    By default the values are copied out into an array of the matching
+    typecode.  If zero_copy is True they are instead returned as a
+    memoryview of the channel's buffer cast to that typecode, subject
+    to the caveats of read_raw_len_plus; on a big-endian host, where
+    the values must be byte-swapped, a copy is returned regardless.
+    """
+    code = _packed_code(ftype)
+    len_ = read_raw_varint(chan)
+    size = PACKED_FIXED_SIZES[code]
+    if len_ % size:
+        raise ValueError(
+            "packed length %d is not a multiple of %d" % (len_, size))
+    view = _read_raw_fixed(chan, len_, True)
+    if zero_copy and not BIG_ENDIAN_HOST:
+        return view.cast(code)
+    values = array(code)
+    values.frombytes(view)
+    view.release()
+    if BIG_ENDIAN_HOST:
+        values.byteswap()
+    return values
+
 # VARIABLE LENGTH FIELDS ############################################
 
 
-def read_raw_len_plus(chan):
-    """ Read a length-preceded value from a channel. """
+def read_raw_len_plus(chan, zero_copy=False):
+    """
+    Read a length-preceded value from a channel.
+
+    By default the value is copied out into a new bytearray.  If
+    zero_copy is True a memoryview slice of the channel's buffer is
+    returned instead; it stays valid only as long as the buffer is not
+    overwritten, and a bytearray with live views cannot be resized.
+    """
 
     # read the varint len
     len_ = read_raw_varint(chan)
+    return _read_raw_fixed(chan, len_, zero_copy)
+
+
+def _read_raw_fixed(chan, len_, zero_copy):
+    """
+    Read len_ bytes from a channel, either as a copy or as a memoryview
+    slice of its buffer.
+    """
     buf = chan.buffer
     offset = chan.position
+    end = offset + len_
+    if end > len(buf):
+        raise ValueError("attempt to read beyond end of buffer")
+    value = memoryview(buf)[offset:end]
+    if not zero_copy:
+        value = bytearray(value)
+    chan.position = end
+    return value
 
-#   # DEBUG
-#   print "readRawLenPlus: length of text is %d bytes" % len_
-#   # END
 
-    # then read n actual bytes
-    string = []
-    count = 0
-    while count < len_:
-        string.append(buf[offset])
-        count += 1
-        offset += 1
-    chan.position = offset
-    return bytearray(string)
+def write_raw_bytes(chan, bytes_):
+    """
+    Write a sequence of bytes to a channel using a single slice
+    assignment.
 
+    bytes_ may be any object supporting the buffer protocol: bytes,
+    bytearray, memoryview, array, mmap, and so forth.  Items wider than
+    a byte are written in their in-memory representation.  A sequence
+    of small ints is also accepted.
+    """
+    _write_raw_view(chan, _byte_view(bytes_))
 
-def write_raw_bytes(chan, bytes_):
-    """ bytes a byte array """
-    buf = chan.buffer
-    offset = chan.position
-    # XXX CHECK LEN OFFSET
 
-    # DEBUG
-    # print("writeRawBytes: type(bytes) is ", type(bytes_))
-    # END
+def _byte_view(value):
+    """ Return a flat memoryview of unsigned bytes over value. """
+    try:
+        view = memoryview(value)
+    except TypeError:
+        # eg a list of ints
+        view = memoryview(bytes(value))
+    if view.format != 'B' or view.ndim != 1:
+        view = view.cast('B')
+    return view
 
-    for b_val in bytes_:
-        buf[offset] = int(b_val)
-        offset += 1
-#   # DEBUG
-#   print("wrote '%s' as %u raw bytes" % (str(bytes_), len(bytes_)))
-#   # END
-    chan.position = offset
 
-# XXX 2012-12-11 currently used only in one place
+def bytes_len(value):
+    """
+    Return the number of bytes write_raw_bytes() writes for value,
+    which is not its len() if its items are wider than a byte.
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    return _byte_view(value).nbytes
 
 
-def write_field_hdr(chan, field_nbr, prim_type):
-    """ Write the field header for a primitive type. """
-    hdr = field_hdr_val(field_nbr, prim_type)
-    write_raw_varint(chan, hdr)
+def _write_raw_view(chan, view):
+    """
+    Copy a memoryview of unsigned bytes into the channel at its
+    current position, checking bounds once.
+    """
+    buf = chan.buffer
+    offset = chan.position
+    end = offset + len(view)
+    if end >= chan.capacity:
+        buf = _make_room(chan, offset, len(view))
+    buf[offset:end] = view
+    chan.position = end
+
+
+def _write_raw_fixed(chan, value, len_):
+    """ Write the first len_ bytes of value to the channel. """
+    view = _byte_view(value)
+    if len(view) < len_:
+        raise ValueError(
+            "value has %u bytes but %u are required" % (len(view), len_))
+    _write_raw_view(chan, view[:len_])
 
 
 def write_len_plus_field(chan, string, ndx):
@@ -367,123 +878,82 @@ def write_len_plus_field(chan, string, ndx):
     s is a bytearray or string.
     """
     write_field_hdr(chan, ndx, PrimTypes.LEN_PLUS)
+    view = _byte_view(string)
     # write the length of the byte array --------
-    write_raw_varint(chan, len(string))
+    write_raw_varint(chan, len(view))
 
     # now write the byte array itself -----------
-    write_raw_bytes(chan, string)
+    _write_raw_view(chan, view)
 
 # LONGER FIXED-LENGTH BYTE FIELDS ===================================
 
 
-def read_raw_b128(chan):
+def read_raw_b128(chan, zero_copy=False):
     """
     Read a 16-byte value from a channel.
 
-    buf construed as array of unsigned bytes
+    buf construed as array of unsigned bytes; see read_raw_len_plus
+    for the meaning of zero_copy.
     """
-    # XXX verify buffer long enough
-    buf = chan.buffer
-    offset = chan.position
-    string = []
-    for i in range(16):
-        string.append(buf[offset + i])
-    offset += 16
-    chan.position = offset
-    return bytearray(string)
+    return _read_raw_fixed(chan, 16, zero_copy)
 
 
 def write_raw_b128(chan, value):
     """
     Write a 16-byte value to a channel.
 
-    value is a bytearray or string.
+    value is a bytes-like object; only its first 16 bytes are written.
     """
-    buf = chan.buffer
-    offset = chan.position
-    for i in range(16):
-        # this is a possibly unnecessary cast
-        buf[offset] = 0xff & value[i]
-        offset += 1
-    chan.position = offset
+    _write_raw_fixed(chan, value, 16)
 
 
 def write_b128_field(chan, value, ndx):
     """ Write a header and 16-byte value to a channel.  """
-    hdr = field_hdr_val(ndx, PrimTypes.B128)
-    write_raw_varint(chan, hdr)
+    write_field_hdr(chan, ndx, PrimTypes.B128)
     write_raw_b128(chan, value)                  # GEEP
 
 
-def read_raw_b160(chan):
+def read_raw_b160(chan, zero_copy=False):
     """
     Read a 20 byte value from a channel.
 
-    buf construed as array of unsigned bytes.
+    buf construed as array of unsigned bytes; see read_raw_len_plus
+    for the meaning of zero_copy.
     """
-    # XXX verify buffer long enough
-    buf = chan.buffer
-    offset = chan.position
-    string = []
-    for i in range(20):
-        string.append(buf[offset + i])
-    offset += 20
-    chan.position = offset
-    return bytearray(string)
+    return _read_raw_fixed(chan, 20, zero_copy)
 
 
 def write_raw_b160(chan, value):
     """
     Write a 20-byte value to a channel.
 
-    v is a bytearray or string.
+    value is a bytes-like object; only its first 20 bytes are written.
     """
-    buf = chan.buffer
-    offset = chan.position
-    for i in range(20):
-        buf[offset] = value[i]
-        offset += 1
-    chan.position = offset
+    _write_raw_fixed(chan, value, 20)
 
 
 def write_b160_field(chan, value, ndx):
     """ Write a header and 20-byte value to this ndx. """
-    hdr = field_hdr_val(ndx, PrimTypes.B160)
-    write_raw_varint(chan, hdr)
+    write_field_hdr(chan, ndx, PrimTypes.B160)
     write_raw_b160(chan, value)                  # GEEP
 
 
-def read_raw_b256(chan):
-    """ buf construed as array of unsigned bytes """
-    # XXX verify buffer long enough
-    buf = chan.buffer
-    offset = chan.position
-    string = []
-    for i in range(32):
-        string.append(buf[offset + i])
-    offset += 32
-    chan.position = offset
-    return bytearray(string)
+def read_raw_b256(chan, zero_copy=False):
+    """
+    buf construed as array of unsigned bytes; see read_raw_len_plus
+    for the meaning of zero_copy.
+    """
+    return _read_raw_fixed(chan, 32, zero_copy)
 
 
 def write_raw_b256(chan, value):
-    """ v is a bytearray or string """
-    buf = chan.buffer
-    offset = chan.position
-    # DEBUG
-    # print "DEBUG: writeRawB256 datum len is %s" % len(v)
-    # END
-    for i in range(32):
-        # print "DEBUG:    v[%u] = %s" % (i, binascii.b2a_hex(v[i]))
-        buf[offset] = value[i]
-        offset += 1
-    chan.position = offset
+    """ value is a bytes-like object; its first 32 bytes are written. """
+    _write_raw_fixed(chan, value, 32)
 
 
 def write_b256_field(chan, value, ndx):
     """ Write a 32-byte value to a channel. """
-    hdr = field_hdr_val(ndx, PrimTypes.B256)
-    write_raw_varint(chan, hdr)
+    write_field_hdr(chan, ndx, PrimTypes.B256)
     write_raw_b256(chan, value)
 
 # PRIMITIVE FIELD NAMES =============================================
@@ -563,42 +1033,53 @@ class WireBuffer(object):
     """
     A buffer handling data holding binary data to be put on the wire.
 
-    The capacity of the buffer will be a power of two.
+    The capacity of the buffer will be a power of two unless exact is
+    set, in which case it is exactly nnn.  If auto_grow is set, the
+    writers in this module reserve() whatever space they need rather
+    than raising when the buffer is full.
     """
 
-    __slots__ = ['_buffer', '_capacity', '_limit', '_position', ]
+    __slots__ = ['_buffer', '_capacity', '_limit', '_position',
+                 '_auto_grow', '_high_water', ]
 
-    def __init__(self, nnn=1024, buffer=None):
+    def __init__(self, nnn=1024, buffer=None, auto_grow=False,
+                 exact=False):
         """
         Initialize the object.  If a buffer is specified, use it.
         Otherwise create one.  The resulting buffer will have a
-        capacity which is the next power of 2 greater than or equal to nnn.
+        capacity which is the next power of 2 greater than or equal to nnn,
+        or, if exact is set, which is nnn or the buffer's length.
         """
         if buffer:
             self._buffer = buffer
             buf_size = len(buffer)
             if nnn < buf_size:
                 nnn = buf_size
-            nnn = next_power_of_two(nnn)
+            if not exact:
+                nnn = next_power_of_two(nnn)
             # DANGER: buffer capacities of cloned buffers can get out of sync
             if nnn > buf_size:
                 more = bytearray(nnn - buf_size)
                 self.buffer.extend(more)
         else:
-            nnn = next_power_of_two(nnn)
+            if not exact:
+                nnn = next_power_of_two(nnn)
             # allocate and initialize the buffer; init probably a waste of time
             self._buffer = bytearray(nnn)
 
         self._capacity = nnn
         self._limit = nnn
         self._position = 0
+        self._auto_grow = auto_grow
+        self._high_water = 0
 
     def copy(self):
         """
         Returns a copy of this WireBuffer using the same underlying
-        bytearray.
+        bytearray, whose length is taken as it is.
         """
-        return WireBuffer(len(self._buffer), self._buffer)
+        return WireBuffer(len(self._buffer), self._buffer, self._auto_grow,
+                          exact=True)
 
     @property
     def buffer(self):
@@ -645,16 +1126,74 @@ class WireBuffer(object):
         """ Return the capacity of the buffer. """
         return len(self._buffer)
 
+    @property
+    def auto_grow(self):
+        """ Return whether writers may grow the buffer as needed. """
+        return self._auto_grow
+
+    @property
+    def high_water(self):
+        """
+        Return the largest extent (position plus bytes reserved) the
+        buffer has been asked to hold so far.
+
+        This is a good size for buffers carrying similar messages.
+        """
+        return max(self._high_water, self._position)
+
     def reserve(self, k):
         """
         We need to add k more bytes; if the buffer isn't big enough,
         resize it.
+
+        Growth is geometric: the capacity at least doubles, and a large
+        request is satisfied in a single step.
         """
         if k < 0:
             raise ValueError(
                 "attempt to increase WireBuffer size by negative number")
-        if self._position + k >= self._capacity:
-            # wildly inefficient, I'm sure
-            more = bytearray(self._capacity)
-            self._buffer.extend(more)
-            self._capacity *= 2
+        needed = self._position + k
+        if needed > self._high_water:
+            self._high_water = needed
+        old_capacity = len(self._buffer)
+        if needed >= old_capacity:
+            # the position can never equal the capacity, so the buffer
+            # must hold at least one byte more than is needed
+            new_capacity = max(2 * old_capacity,
+                               next_power_of_two(needed + 1))
+            self._buffer.extend(bytearray(new_capacity - old_capacity))
+            if self._limit == self._capacity:
+                self._limit = new_capacity
+            self._capacity = new_capacity
+
+# C ACCELERATION ####################################################
+
+# The pure Python versions of the functions the optional extension
+# replaces.  The C code hands them anything it does not handle itself,
+# such as a buffer which must grow.
+_PY_FUNCS = {
+    'length_as_varint': length_as_varint,
+    'read_raw_varint': read_raw_varint,
+    'write_raw_varint': write_raw_varint,
+    'read_raw_b32': read_raw_b32,
+    'write_raw_b32': write_raw_b32,
+    'read_raw_b64': read_raw_b64,
+    'write_raw_b64': write_raw_b64,
+}
+
+HAVE_SPEEDUPS = False
+if not os.environ.get('WIREOPS_PURE_PYTHON'):
+    try:
+        from wireops import _speedups
+    except ImportError:
+        pass
+    else:
+        _speedups.register_fallbacks(_PY_FUNCS)
+        length_as_varint = _speedups.length_as_varint
+        read_raw_varint = _speedups.read_raw_varint
+        write_raw_varint = _speedups.write_raw_varint
+        read_raw_b32 = _speedups.read_raw_b32
+        write_raw_b32 = _speedups.write_raw_b32
+        read_raw_b64 = _speedups.read_raw_b64
+        write_raw_b64 = _speedups.write_raw_b64
+        HAVE_SPEEDUPS = True
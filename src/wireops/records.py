@@ -0,0 +1,241 @@
+# wireops/records.py
+
+"""
+Compact record classes generated from message specs.
+
+record_class(spec) returns a class with one slot per field of the
+MessageSpec, and with encode_into(), decode_into(), decode_from(), and
+wire_len() methods whose source is generated for that spec: each field
+is written, sized, and matched by header with straight-line code using
+the writers and readers the spec compiled, so there is no per-field
+table lookup and no dict per message.  encode_into() sizes each
+nested record once, recording the lengths its prefix needs before
+writing anything, as MessageSpec.encode() does.
+
+decode_into() overwrites an existing record, reusing the records of
+any nested messages as well, so a loop decoding one message after
+another need allocate nothing but the values themselves.
+
+A field which is None is not written, and a field missing from the
+input is None after decoding.  An L_MSG field holds a record of the
+class generated for the nested spec.
+"""
+
+from keyword import iskeyword
+from weakref import WeakKeyDictionary
+
+from wireops import WireopsError
+from wireops.raw import read_raw_varint, write_hdr_bytes, write_raw_varint
+from wireops.spec import len_plus_len, ViewChannel
+
+__all__ = ['record_class', ]
+
+# names a field may not have, as they are taken by the generated class
+_RESERVED = frozenset([
+    'encode_into', 'decode_into', 'decode_from', 'decode_bytes',
+    'wire_len', 'as_dict', ])
+
+# generated classes, indexed by spec; a class does not refer to its
+# spec, so an entry goes when the spec does
+_CLASSES = WeakKeyDictionary()
+
+
+def record_class(spec):
+    """
+    Return the record class for a MessageSpec, generating it, and the
+    classes for any nested specs, on first use.
+    """
+    cls = _CLASSES.get(spec)
+    if cls is None:
+        cls = _make_class(spec)
+        _CLASSES[spec] = cls
+    return cls
+
+
+def _make_class(spec):
+    """ Generate the source of a record class for spec and compile it. """
+    # pylint: disable=too-many-locals
+    names = [field.name for field in spec.plan]
+    for fname in names:
+        if fname in _RESERVED or fname.startswith('_') or iskeyword(fname):
+            raise WireopsError(
+                "field name '%s' cannot be used in a record class" % fname)
+    env = {
+        'WireopsError': WireopsError,
+        'read_raw_varint': read_raw_varint,
+        'write_hdr_bytes': write_hdr_bytes,
+        'write_raw_varint': write_raw_varint,
+        'len_plus_len': len_plus_len,
+    }
+    nested = []
+    init = []
+    encode = []
+    size = []
+    decode = []
+    reset = []
+    for ndx, field in enumerate(spec.plan):
+        fname = field.name
+        h_len = len(field.hdr_bytes)
+        env['_h%d' % ndx] = bytes(field.hdr_bytes)
+        init.append("    _self.%s = %s" % (fname, fname))
+        encode.append("    val = self.%s" % fname)
+        encode.append("    if val is not None:")
+        encode.append("        write_hdr_bytes(chan, _h%d)" % ndx)
+        size.append("    val = self.%s" % fname)
+        size.append("    if val is not None:")
+        test = "if" if not decode else "elif"
+        decode.append("        %s hdr == %d:" % (test, field.hdr))
+        if field.sub is None:
+            env['_put%d' % ndx] = field.put
+            env['_size%d' % ndx] = field.size
+            env['_get%d' % ndx] = field.get
+            encode.append("        _put%d(chan, val)" % ndx)
+            size.append("        total += %d + _size%d(val)" % (h_len, ndx))
+            decode.append("            self.%s = _get%d(chan)" % (
+                fname, ndx))
+        else:
+            env['_cls%d' % ndx] = record_class(field.sub)
+            nested.append(fname)
+            encode.append("        write_raw_varint(chan, next(sizes))")
+            encode.append("        val._encode(chan, sizes)")
+            # reserve the nested record's place in sizes, ahead of the
+            # records nested within it
+            size.append("        slot = len(sizes)")
+            size.append("        sizes.append(0)")
+            size.append("        v_len = val._size_into(sizes)")
+            size.append("        sizes[slot] = v_len")
+            size.append(
+                "        total += %d + len_plus_len(v_len)" % h_len)
+            # keep the nested record to decode into it again
+            reset.append("    old%d = getattr(self, '%s', None)" % (
+                ndx, fname))
+            decode.append("            len_ = read_raw_varint(chan)")
+            decode.append("            if type(old%d) is not _cls%d:" % (
+                ndx, ndx))
+            decode.append("                old%d = _cls%d.__new__(_cls%d)" % (
+                ndx, ndx, ndx))
+            decode.append(
+                "            self.%s = old%d.decode_into("
+                "chan, chan.position + len_)" % (fname, ndx))
+    reset.extend("    self.%s = None" % fname for fname in names)
+
+    src = []
+    # field names cannot begin with '_', so none clashes with _self
+    src.append("def __init__(_self, %s):" % ''.join(
+        '%s=None, ' % fname for fname in names))
+    src.extend(init or ["    pass"])
+    src.append("def encode_into(self, chan):")
+    src.append("    ''' Write the fields of the record to the channel. '''")
+    if nested:
+        # size the nested records once, before any is written
+        src.append("    sizes = []")
+        src.append("    self._size_into(sizes)")
+        src.append("    self._encode(chan, iter(sizes))")
+    else:
+        src.append("    self._encode(chan, None)")
+    src.append("def _encode(self, chan, sizes):")
+    src.append("    '''")
+    src.append("    Write the record, taking the lengths of nested records")
+    src.append("    from the iterator sizes.")
+    src.append("    '''")
+    src.extend(encode or ["    pass"])
+    src.append("def wire_len(self):")
+    src.append("    ''' Return the number of bytes encode_into() writes. '''")
+    src.append("    return self._size_into([])")
+    src.append("def _size_into(self, sizes):")
+    src.append("    '''")
+    src.append("    Return the encoded length of the record, appending the")
+    src.append("    lengths of nested records to sizes in the order they")
+    src.append("    are encoded.")
+    src.append("    '''")
+    src.append("    total = 0")
+    src.extend(size)
+    src.append("    return total")
+    src.append("def decode_into(self, chan, end=None):")
+    src.append("    '''")
+    src.append("    Read fields from the channel until its position reaches")
+    src.append("    end, by default the channel's limit, overwriting the")
+    src.append("    record and reusing its nested records.  Return the")
+    src.append("    record.")
+    src.append("    '''")
+    src.append("    if end is None:")
+    src.append("        end = chan.limit")
+    src.extend(reset)
+    src.append("    while chan.position < end:")
+    src.append("        hdr = read_raw_varint(chan)")
+    indent = '        '
+    if decode:
+        src.extend(decode)
+        src.append("        else:")
+        indent += '    '
+    src.append(indent + "raise WireopsError(")
+    src.append(indent + "    'unexpected field %%d in message %s' %% "
+               "(hdr >> 3))" % spec.name)
+    src.append("    if chan.position != end:")
+    src.append("        raise WireopsError("
+               "'message %s overruns its length')" % spec.name)
+    src.append("    return self")
+    exec('\n'.join(src), env)          # pylint: disable=exec-used
+
+    namespace = {
+        '__slots__': tuple(names),
+        '_nested': frozenset(nested),
+        '__doc__': "Record of a %s message." % spec.name,
+        '__init__': env['__init__'],
+        '__repr__': _repr,
+        '__eq__': _eq,
+        '__hash__': None,
+        'encode_into': env['encode_into'],
+        '_encode': env['_encode'],
+        'wire_len': env['wire_len'],
+        '_size_into': env['_size_into'],
+        'decode_into': env['decode_into'],
+        'decode_from': classmethod(_decode_from),
+        'decode_bytes': classmethod(_decode_bytes),
+        'as_dict': _as_dict,
+    }
+    return type(spec.name, (object,), namespace)
+
+# METHODS COMMON TO ALL RECORD CLASSES ==============================
+
+
+def _decode_from(cls, chan, end=None):
+    """
+    Read fields from the channel until its position reaches end, by
+    default the channel's limit, and return them as a new record.
+    """
+    return cls.__new__(cls).decode_into(chan, end)
+
+
+def _decode_bytes(cls, data):
+    """
+    Decode a new record from data, a bytes-like object holding exactly
+    one serialized message.
+    """
+    return cls.__new__(cls).decode_into(ViewChannel(data), len(data))
+
+
+def _as_dict(self):
+    """
+    Return the fields which are not None as a dict, in the form
+    MessageSpec.encode() takes.
+    """
+    msg = {}
+    for fname in self.__slots__:
+        val = getattr(self, fname)
+        if val is not None:
+            msg[fname] = val.as_dict() if fname in self._nested else val
+    return msg
+
+
+def _repr(self):
+    return "%s(%s)" % (type(self).__name__, ', '.join(
+        '%s=%r' % (fname, getattr(self, fname))
+        for fname in self.__slots__))
+
+
+def _eq(self, other):
+    if type(other) is not type(self):
+        return NotImplemented
+    return all(getattr(self, fname) == getattr(other, fname)
+               for fname in self.__slots__)
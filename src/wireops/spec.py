@@ -0,0 +1,521 @@
+# wireops/spec.py
+
+"""
+Message specifications compiled into encoders, decoders, and size
+calculators.
+
+A MessageSpec is built from an ordered list of field declarations like
+those in a message declaration:
+
+    LOG_ENTRY = MessageSpec('logEntry', [
+        ('timestamp', 0, FieldTypes.F_UINT32),
+        ('node_id', 1, FieldTypes.F_BYTES20),
+        ('key', 2, FieldTypes.F_BYTES20),
+        ('length', 3, FieldTypes.V_UINT32),
+        ('by', 4, FieldTypes.L_STRING),
+        ('path', 5, FieldTypes.L_STRING),
+    ])
+
+An L_MSG field takes the MessageSpec of the nested message as a fourth
+element.  A fixed length field, one of raw.PACKED_FIXED_TYPES, with
+PACKED as its fourth element holds a sequence of values written as a
+single LEN_PLUS field; it is decoded to an array, a copy which outlives
+the buffer.  Use FieldRecord.packed() to view the values in place.
+
+Headers are encoded and writer functions chosen once, when the spec is
+built, so encoding does no per-field table lookups.
+
+Sizing a message walks the whole tree once, recording the length of
+each nested message in the order the encoder will need them, so the
+length prefixes of L_MSG fields never require a second traversal.
+"""
+
+import re
+from functools import partial
+
+from wireops import WireopsError
+from wireops.enum import FieldTypes, PrimTypes
+from wireops.raw import(
+    FIELD_PRIM_TYPES, field_hdr_bytes, write_hdr_bytes, hdr_field_nbr,
+    length_as_varint, read_raw_varint, write_raw_varint,
+    write_raw_b32, write_raw_b64, write_raw_float, write_raw_double,
+    write_raw_bytes, write_raw_b128, write_raw_b160, write_raw_b256,
+    bytes_len, PACKED_FIXED_TYPES, packed_fixed_len, read_raw_packed_fixed,
+    write_raw_packed_fixed, WireBuffer,)
+from wireops.ints import(
+    as_uint32, as_uint64,
+    check_uint16, check_int32, check_uint32, check_int64, check_uint64)
+from wireops.policy import DecodeLimitError
+from wireops.typed import T_GET_FUNCS, encode_sint32, encode_sint64
+
+__all__ = ['MessageSpec', 'FieldPlan', 'PACKED',
+           'len_plus_len', 'put_len_plus', 'ViewChannel', ]
+
+_NAME_RE = re.compile(r'\A[A-Za-z_][A-Za-z0-9_]*\Z')
+
+# marks a packed field in a field declaration
+PACKED = 'packed'
+
+# VALUE WRITERS =====================================================
+
+# Each writes a value without its header; indexed by FieldTypes.value.
+
+
+def _vbool_put(chan, val):
+    write_raw_varint(chan, 1 if val else 0)
+
+
+def _venum_put(chan, val):
+    write_raw_varint(chan, val & 0xffff)
+
+
+def _vuint32_put(chan, val):
+    write_raw_varint(chan, val & 0xffffffff)
+
+
+def _vsint32_put(chan, val):
+    write_raw_varint(chan, encode_sint32(val))
+
+
+def _vuint64_put(chan, val):
+    write_raw_varint(chan, val & 0xffffffffffffffff)
+
+
+def _vsint64_put(chan, val):
+    write_raw_varint(chan, encode_sint64(val))
+
+
+def _lstring_put(chan, val):
+    val = val.encode('utf-8')
+    write_raw_varint(chan, len(val))
+    write_raw_bytes(chan, val)
+
+
+def put_len_plus(chan, val):
+    """ Write a bytes-like value, without its header, as a LEN_PLUS. """
+    write_raw_varint(chan, bytes_len(val))
+    write_raw_bytes(chan, val)
+
+
+_VALUE_PUTS = [
+    _vbool_put, _venum_put, _vuint32_put, _vsint32_put,
+    _vuint64_put, _vsint64_put,
+    write_raw_b32, write_raw_b32, write_raw_float,
+    write_raw_b64, write_raw_b64, write_raw_double,
+    _lstring_put, put_len_plus, put_len_plus,
+    write_raw_b128, write_raw_b160, write_raw_b256, ]
+
+# Checked writers raise on an integer which would not fit in its field.
+
+
+def _venum_put_checked(chan, val):
+    write_raw_varint(chan, check_uint16(val))
+
+
+def _vuint32_put_checked(chan, val):
+    write_raw_varint(chan, check_uint32(val))
+
+
+def _vsint32_put_checked(chan, val):
+    write_raw_varint(chan, encode_sint32(check_int32(val)))
+
+
+def _vuint64_put_checked(chan, val):
+    write_raw_varint(chan, check_uint64(val))
+
+
+def _vsint64_put_checked(chan, val):
+    write_raw_varint(chan, encode_sint64(check_int64(val)))
+
+
+def _fuint32_put_checked(chan, val):
+    write_raw_b32(chan, check_uint32(val))
+
+
+def _fsint32_put_checked(chan, val):
+    write_raw_b32(chan, as_uint32(check_int32(val)))
+
+
+def _fuint64_put_checked(chan, val):
+    write_raw_b64(chan, check_uint64(val))
+
+
+def _fsint64_put_checked(chan, val):
+    write_raw_b64(chan, as_uint64(check_int64(val)))
+
+
+_VALUE_PUTS_CHECKED = [
+    _vbool_put, _venum_put_checked, _vuint32_put_checked,
+    _vsint32_put_checked, _vuint64_put_checked, _vsint64_put_checked,
+    _fuint32_put_checked, _fsint32_put_checked, write_raw_float,
+    _fuint64_put_checked, _fsint64_put_checked, write_raw_double,
+    _lstring_put, put_len_plus, put_len_plus,
+    write_raw_b128, write_raw_b160, write_raw_b256, ]
+
+
+# VALUE LENGTHS =====================================================
+
+# Each returns the length of a value without its header.
+
+
+def len_plus_len(v_len):
+    """ Return the length of a LEN_PLUS value of v_len bytes. """
+    return length_as_varint(v_len) + v_len
+
+
+_VALUE_LENS = [
+    lambda val: 1,
+    lambda val: length_as_varint(val & 0xffff),
+    lambda val: length_as_varint(val & 0xffffffff),
+    lambda val: length_as_varint(encode_sint32(val)),
+    lambda val: length_as_varint(val & 0xffffffffffffffff),
+    lambda val: length_as_varint(encode_sint64(val)),
+    lambda val: 4, lambda val: 4, lambda val: 4,
+    lambda val: 8, lambda val: 8, lambda val: 8,
+    lambda val: len_plus_len(len(val.encode('utf-8'))),
+    lambda val: len_plus_len(bytes_len(val)),
+    lambda val: len_plus_len(bytes_len(val)),
+    lambda val: 16, lambda val: 20, lambda val: 32, ]
+
+# MESSAGE SPEC ======================================================
+
+
+class ViewChannel(object):
+    """
+    A minimal read-only channel over any bytes-like object, for
+    decoding a serialized message in place.
+    """
+
+    __slots__ = ['buffer', 'position', 'limit', ]
+
+    def __init__(self, data):
+        self.buffer = data
+        self.position = 0
+        self.limit = len(data)
+
+
+class FieldPlan(object):
+    """
+    How a MessageSpec writes, sizes, and reads one of its fields, for
+    code generating its own encoders and decoders from a spec.
+
+    name, field_nbr, and ftype come from the field's declaration;
+    packed is set for a packed field, and sub is the spec of an L_MSG
+    field, else None.  hdr is the field's header as read_raw_varint()
+    returns it and hdr_bytes its encoding.  put(chan, val) writes a
+    value and size(val) returns its length, in each case without the
+    header; both are None for an L_MSG field.  get(chan) reads a value
+    following the header.
+    """
+
+    __slots__ = ['name', 'field_nbr', 'ftype', 'packed', 'sub',
+                 'hdr', 'hdr_bytes', 'put', 'size', 'get', ]
+
+    def __init__(self, name, field_nbr, ftype, packed, sub,
+                 hdr, hdr_bytes, put, size, get):
+        # pylint: disable=too-many-arguments
+        self.name = name
+        self.field_nbr = field_nbr
+        self.ftype = ftype
+        self.packed = packed
+        self.sub = sub
+        self.hdr = hdr
+        self.hdr_bytes = hdr_bytes
+        self.put = put
+        self.size = size
+        self.get = get
+
+    def __repr__(self):
+        return "FieldPlan(%s, %d, %s)" % (
+            self.name, self.field_nbr, self.ftype.name)
+
+
+class MessageSpec(object):
+    """
+    An ordered list of typed, numbered fields compiled into an encoder,
+    a decoder, and a size calculator.
+
+    Messages are represented as dicts mapping field names to values.
+    A field whose value is missing or None is not written.
+
+    By default integers are silently truncated to the width of their
+    fields.  A spec built with checked=True instead raises TypeError or
+    ValueError when encoding an integer which does not fit.  Nested
+    messages follow the setting of their own specs.
+    """
+
+    __slots__ = ['_name', '_fields', '_checked', '_plan', '_put_plan',
+                 '_get_plan', '_len_plan', '_nested', '__weakref__', ]
+
+    def __init__(self, name, fields, checked=False):
+        """
+        Build and compile the spec.  Each field is a tuple
+        (name, field_nbr, ftype), (name, field_nbr, FieldTypes.L_MSG,
+        spec) for a nested message, or (name, field_nbr, ftype, PACKED)
+        for a packed sequence of fixed length values.
+        """
+        if not _NAME_RE.match(name):
+            raise WireopsError("invalid message name '%s'" % name)
+        self._name = name
+        self._fields = tuple(tuple(field) for field in fields)
+        self._checked = bool(checked)
+        self._compile()
+
+    def _compile(self):
+        """ Build the encoding, decoding, and sizing plans. """
+        names = set()
+        nbrs = set()
+        plan = []
+        put_plan = []
+        get_plan = {}
+        len_plan = []
+        value_puts = _VALUE_PUTS_CHECKED if self._checked else _VALUE_PUTS
+        for field in self._fields:
+            if len(field) == 3:
+                (fname, field_nbr, ftype), sub = field, None
+            elif len(field) == 4:
+                fname, field_nbr, ftype, sub = field
+            else:
+                raise WireopsError("badly formed field %s" % (field,))
+            if not _NAME_RE.match(fname):
+                raise WireopsError("invalid field name '%s'" % fname)
+            if fname in names:
+                raise WireopsError("duplicate field name '%s'" % fname)
+            if field_nbr < 0 or field_nbr in nbrs:
+                raise WireopsError(
+                    "bad or duplicate field number %d" % field_nbr)
+            names.add(fname)
+            nbrs.add(field_nbr)
+            ftype = FieldTypes(ftype)
+
+            ndx = ftype.value
+            hdr_bytes = field_hdr_bytes(field_nbr, FIELD_PRIM_TYPES[ndx])
+            hdr = (field_nbr << 3) | FIELD_PRIM_TYPES[ndx]
+            packed = isinstance(sub, str) and sub == PACKED
+            if packed:
+                if ftype not in PACKED_FIXED_TYPES:
+                    raise WireopsError(
+                        "field '%s' is packed but is %s" % (
+                            fname, ftype.name))
+                hdr_bytes = field_hdr_bytes(field_nbr, PrimTypes.LEN_PLUS)
+                hdr = (field_nbr << 3) | PrimTypes.LEN_PLUS
+                put = partial(write_raw_packed_fixed, ftype=ftype)
+                get = partial(read_raw_packed_fixed, ftype=ftype)
+                size = partial(packed_fixed_len, ftype=ftype)
+                sub = None
+            elif sub is not None:
+                if ftype != FieldTypes.L_MSG:
+                    raise WireopsError(
+                        "field '%s' has a spec but is not an L_MSG" % fname)
+                put = size = None
+                get = sub._nested_get
+            else:
+                put = value_puts[ndx]
+                get = T_GET_FUNCS[ndx]
+                size = _VALUE_LENS[ndx]
+            plan.append(FieldPlan(fname, field_nbr, ftype, packed, sub,
+                                  hdr, hdr_bytes, put, size, get))
+            put_plan.append((fname, hdr_bytes, put, sub))
+            get_plan[hdr] = (fname, get, sub)
+            len_plan.append((fname, len(hdr_bytes), size, sub))
+
+        self._plan = tuple(plan)
+        self._put_plan = tuple(put_plan)
+        self._get_plan = get_plan
+        self._len_plan = tuple(len_plan)
+        self._nested = any(field[3] is not None for field in put_plan)
+
+    def __reduce__(self):
+        """
+        Pickle the spec as its declaration, compiling it again when it
+        is unpickled, as in a worker process.
+        """
+        return (MessageSpec, (self._name, self._fields, self._checked))
+
+    @property
+    def name(self):
+        """ Return the name of the message. """
+        return self._name
+
+    @property
+    def fields(self):
+        """ Return the field declarations the spec was built from. """
+        return self._fields
+
+    @property
+    def checked(self):
+        """ Return whether integers are range checked when encoding. """
+        return self._checked
+
+    @property
+    def plan(self):
+        """
+        Return a FieldPlan for each field, in the order the spec
+        encodes them.
+        """
+        return self._plan
+
+    # -- encoding ---------------------------------------------------
+
+    def encode(self, chan, msg, sizes=None):
+        """
+        Write the fields of msg, a dict, to the channel.
+
+        sizes is the list of nested message lengths returned by
+        size_with_plan(); if it is not given, msg is sized again.
+        """
+        if sizes is None and self._nested:
+            sizes = []
+            self._size(msg, sizes)
+        self._encode(chan, msg, None if sizes is None else iter(sizes))
+
+    def _encode(self, chan, msg, sizes):
+        """
+        Write msg to the channel, taking the lengths of nested messages
+        from the iterator sizes.
+        """
+        for fname, hdr_bytes, put, sub in self._put_plan:
+            val = msg.get(fname)
+            if val is not None:
+                write_hdr_bytes(chan, hdr_bytes)
+                if sub is None:
+                    put(chan, val)
+                else:
+                    write_raw_varint(chan, next(sizes))
+                    sub._encode(chan, val, sizes)
+
+    def encode_exact(self, msg):
+        """
+        Size msg, then encode it into a new WireBuffer just big enough
+        to hold it, with a capacity of one byte more than its length, so
+        that no writer ever needs to grow the buffer.
+
+        On return the buffer's position and limit are both the length of
+        the encoded message.
+        """
+        sizes = []
+        size = self._size(msg, sizes)
+        # the position can never equal the capacity: allow one byte more
+        wb_ = WireBuffer(size + 1, exact=True)
+        self._encode(wb_, msg, iter(sizes))
+        wb_.limit = size
+        return wb_
+
+    # -- sizing -----------------------------------------------------
+
+    def size(self, msg):
+        """ Return the number of bytes encode() will write for msg. """
+        return self._size(msg, [])
+
+    def size_with_plan(self, msg):
+        """
+        Return the number of bytes encode() will write for msg and the
+        lengths of its nested messages, which encode() takes as sizes,
+        so that msg need be sized only once.
+        """
+        sizes = []
+        return self._size(msg, sizes), sizes
+
+    def _size(self, msg, sizes):
+        """
+        Return the encoded length of msg, appending the lengths of any
+        nested messages to the list sizes in the order they are encoded.
+        """
+        total = 0
+        for fname, h_len, size, sub in self._len_plan:
+            val = msg.get(fname)
+            if val is None:
+                continue
+            if sub is None:
+                total += h_len + size(val)
+            else:
+                slot = len(sizes)
+                sizes.append(0)
+                v_len = sub._size(val, sizes)
+                sizes[slot] = v_len
+                total += h_len + length_as_varint(v_len) + v_len
+        return total
+
+    # -- decoding ---------------------------------------------------
+
+    def decode(self, chan, end=None, policy=None):
+        """
+        Read fields from the channel until its position reaches end,
+        by default the channel's limit, and return them as a dict.
+
+        If a DecodePolicy is given, the input is checked against its
+        limits as it is decoded; otherwise it is trusted.
+        """
+        if end is None:
+            end = chan.limit
+        if policy is not None:
+            return self._decode_limited(chan, end, policy, 1,
+                                        [policy.max_fields])
+        plan = self._get_plan
+        msg = {}
+        while chan.position < end:
+            hdr = read_raw_varint(chan)
+            try:
+                fname, get, _ = plan[hdr]
+            except KeyError:
+                raise WireopsError(
+                    "unexpected field %d in message %s" % (
+                        hdr_field_nbr(hdr), self._name)) from None
+            msg[fname] = get(chan)
+        if chan.position != end:
+            raise WireopsError(
+                "message %s overruns its length" % self._name)
+        return msg
+
+    def decode_bytes(self, data, policy=None):
+        """
+        Decode a message from data, a bytes-like object holding exactly
+        one serialized message.  The data is not copied.
+        """
+        return self.decode(ViewChannel(data), len(data), policy)
+
+    def _decode_limited(self, chan, end, policy, depth, budget):
+        """
+        Decode a message at the given nesting depth, checking its
+        extent and that of every field against the policy before the
+        field is read.  budget is a one-element list holding the number
+        of fields which may yet be read.
+        """
+        if depth > policy.max_depth:
+            raise DecodeLimitError(
+                "messages are nested more than %d deep" % policy.max_depth)
+        buf = chan.buffer
+        if end > len(buf):
+            raise WireopsError(
+                "message %s overruns the buffer" % self._name)
+        plan = self._get_plan
+        msg = {}
+        offset = chan.position
+        while offset < end:
+            budget[0] -= 1
+            if budget[0] < 0:
+                raise DecodeLimitError(
+                    "more than %d fields" % policy.max_fields)
+            hdr, offset = policy.read_varint(buf, offset, end)
+            try:
+                fname, get, sub = plan[hdr]
+            except KeyError:
+                raise WireopsError(
+                    "unexpected field %d in message %s" % (
+                        hdr_field_nbr(hdr), self._name)) from None
+            start, length = policy.value_extent(buf, offset, end, hdr & 7)
+            if sub is None:
+                chan.position = offset
+                msg[fname] = get(chan)
+            else:
+                chan.position = start
+                msg[fname] = sub._decode_limited(
+                    chan, start + length, policy, depth + 1, budget)
+            offset = start + length
+        chan.position = offset
+        return msg
+
+    def _nested_get(self, chan):
+        """ Read the length-preceded value of an L_MSG field. """
+        len_ = read_raw_varint(chan)
+        return self.decode(chan, chan.position + len_)
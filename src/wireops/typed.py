@@ -6,15 +6,19 @@ Operations on typed fields.
 Sets up tables holding put, get, and len functions for specific types.
 """
 
-import ctypes
-import struct
+import os
 
 # from wireops.field_types import FieldTypes
 from wireops.enum import FieldTypes
+from wireops.ints import(
+    as_int32, as_uint32, as_int64, as_uint64,
+    check_uint16, check_int32, check_uint32, check_int64, check_uint64)
 
 from wireops.raw import(
-    field_hdr_len, length_as_varint, write_varint_field, read_raw_varint,
+    field_hdr_len, length_as_varint, bytes_len,
+    write_varint_field, read_raw_varint,
     read_raw_b32, write_b32_field, read_raw_b64, write_b64_field,
+    read_raw_float, write_float_field, read_raw_double, write_double_field,
     read_raw_len_plus, write_len_plus_field, read_raw_b128, write_b128_field,
     read_raw_b160, write_b160_field, read_raw_b256, write_b256_field,
 )
@@ -23,13 +27,13 @@ __all__ = [
     'encode_sint32', 'decode_sint32',
     'encode_sint64', 'decode_sint64',
     'not_impl',
-    'T_PUT_FUNCS', 'T_GET_FUNCS', 'T_LEN_FUNCS',
+    'T_PUT_FUNCS', 'T_GET_FUNCS', 'T_LEN_FUNCS', 'T_PUT_CHECKED_FUNCS',
 ]
 
 
 def encode_sint32(value):
     """ Encode a signed int32. """
-    val = ctypes.c_int32(0xffffffff & value).value
+    val = as_int32(value)
     # we must have the sign filling in from the left
     varint_ = (val << 1) ^ (val >> 31)
 #   # DEBUG
@@ -41,7 +45,7 @@ def encode_sint32(value):
 def decode_sint32(varint_):
     """ Decode zig-zag:  stackoverflow 2210923. """
     val = (varint_ >> 1) ^ (-(varint_ & 1))
-    value = ctypes.c_int32(val).value
+    value = as_int32(val)
 #   # DEBUG
 #   print "decodeSint32: 0x%x --> 0x%x" % (v, s)
 #   # END
@@ -50,7 +54,7 @@ def decode_sint32(varint_):
 
 def encode_sint64(value):
     """ Encode a signed int64. """
-    varint_ = ctypes.c_int64(0xffffffffffffffff & value).value
+    varint_ = as_int64(value)
     # we must have the sign filling in from the left
     varint_ = (varint_ << 1) ^ (varint_ >> 63)
     return varint_
@@ -59,7 +63,7 @@ def encode_sint64(value):
 def decode_sint64(varint_):
     """ Decode a signed int64. """
     varint_ = (varint_ >> 1) ^ (-(varint_ & 1))
-    value = ctypes.c_int64(varint_).value
+    value = as_int64(varint_)
     return value
 
 # DISPATCH TABLES ===================================================
@@ -135,7 +139,7 @@ T_PUT_FUNCS[FieldTypes.V_SINT64.value] = vsint64_put
 
 
 def fuint32_put(chan, val, nnn):
-    val = ctypes.c_uint32(val).value
+    val = as_uint32(val)
     write_b32_field(chan, val, nnn)
 
 
@@ -143,7 +147,8 @@ T_PUT_FUNCS[FieldTypes.F_UINT32.value] = fuint32_put
 
 
 def fsint32_put(chan, val, nnn):
-    val = ctypes.c_int32(val).value
+    # the two's complement bit pattern, as a uint32
+    val = as_uint32(val)
     write_b32_field(chan, val, nnn)
 
 
@@ -151,10 +156,7 @@ T_PUT_FUNCS[FieldTypes.F_SINT32.value] = fsint32_put
 
 
 def ffloat_put(chan, val, nnn):
-    # @ means native byte order; < would mean little-endian
-    v_rep = struct.pack('@f', val)
-    varint_ = struct.unpack('@I', v_rep)[0]
-    write_b32_field(chan, varint_, nnn)
+    write_float_field(chan, val, nnn)
 
 
 T_PUT_FUNCS[FieldTypes.F_FLOAT.value] = ffloat_put
@@ -163,7 +165,7 @@ T_PUT_FUNCS[FieldTypes.F_FLOAT.value] = ffloat_put
 
 
 def fuint64_put(chan, val, nnn):
-    val = ctypes.c_uint64(val).value
+    val = as_uint64(val)
     write_b64_field(chan, val, nnn)
 
 
@@ -171,7 +173,7 @@ T_PUT_FUNCS[FieldTypes.F_UINT64.value] = fuint64_put
 
 
 def fsint64_put(chan, val, nnn):
-    varint_ = ctypes.c_int64(val).value
+    varint_ = as_uint64(val)
     write_b64_field(chan, varint_, nnn)
 
 
@@ -179,10 +181,7 @@ T_PUT_FUNCS[FieldTypes.F_SINT64.value] = fsint64_put
 
 
 def fdouble_put(chan, val, nnn):
-    # val = ctypes.c_double(val).value
-    v_rep = struct.pack('@d', val)       # this gives us an 8-byte string
-    varint_ = struct.unpack('@L', v_rep)[0]
-    write_b64_field(chan, varint_, nnn)
+    write_double_field(chan, val, nnn)
 
 
 T_PUT_FUNCS[FieldTypes.F_DOUBLE.value] = fdouble_put  # END B64
@@ -201,12 +200,11 @@ def lbytes_put(chan, val, nnn):
 
 T_PUT_FUNCS[FieldTypes.L_BYTES.value] = lbytes_put
 
-# XXX NOT GOOD.  val WILL BE DYNAMICALLY DEFINED
-
 
 def lmsg_put(chan, val, nnn):
-    _, _, _ = chan, val, nnn            # keep pylint quiet
-    raise NotImplementedError
+    # val is an already serialized message; see MessageSpec for
+    # encoding a message directly
+    return write_len_plus_field(chan, val, nnn)
 
 
 T_PUT_FUNCS[FieldTypes.L_MSG.value] = lmsg_put
@@ -232,6 +230,76 @@ def fbytes32_put(chan, val, nnn):
 
 T_PUT_FUNCS[FieldTypes.F_BYTES32.value] = fbytes32_put  # END B256
 
+# checked puts ------------------------------------------------------
+
+# These raise TypeError or ValueError on an integer which would not fit
+# in the field rather than writing its low-order bits.
+
+T_PUT_CHECKED_FUNCS = list(T_PUT_FUNCS)
+
+
+def venum_put_checked(chan, val, nnn):
+    write_varint_field(chan, check_uint16(val), nnn)
+
+
+T_PUT_CHECKED_FUNCS[FieldTypes.V_ENUM.value] = venum_put_checked
+
+
+def vuint32_put_checked(chan, val, nnn):
+    write_varint_field(chan, check_uint32(val), nnn)
+
+
+T_PUT_CHECKED_FUNCS[FieldTypes.V_UINT32.value] = vuint32_put_checked
+
+
+def vsint32_put_checked(chan, val, nnn):
+    write_varint_field(chan, encode_sint32(check_int32(val)), nnn)
+
+
+T_PUT_CHECKED_FUNCS[FieldTypes.V_SINT32.value] = vsint32_put_checked
+
+
+def vuint64_put_checked(chan, val, nnn):
+    write_varint_field(chan, check_uint64(val), nnn)
+
+
+T_PUT_CHECKED_FUNCS[FieldTypes.V_UINT64.value] = vuint64_put_checked
+
+
+def vsint64_put_checked(chan, val, nnn):
+    write_varint_field(chan, encode_sint64(check_int64(val)), nnn)
+
+
+T_PUT_CHECKED_FUNCS[FieldTypes.V_SINT64.value] = vsint64_put_checked
+
+
+def fuint32_put_checked(chan, val, nnn):
+    write_b32_field(chan, check_uint32(val), nnn)
+
+
+T_PUT_CHECKED_FUNCS[FieldTypes.F_UINT32.value] = fuint32_put_checked
+
+
+def fsint32_put_checked(chan, val, nnn):
+    write_b32_field(chan, as_uint32(check_int32(val)), nnn)
+
+
+T_PUT_CHECKED_FUNCS[FieldTypes.F_SINT32.value] = fsint32_put_checked
+
+
+def fuint64_put_checked(chan, val, nnn):
+    write_b64_field(chan, check_uint64(val), nnn)
+
+
+T_PUT_CHECKED_FUNCS[FieldTypes.F_UINT64.value] = fuint64_put_checked
+
+
+def fsint64_put_checked(chan, val, nnn):
+    write_b64_field(chan, as_uint64(check_int64(val)), nnn)
+
+
+T_PUT_CHECKED_FUNCS[FieldTypes.F_SINT64.value] = fsint64_put_checked
+
 # GETS ==============================================================
 
 # varint fields -------------------------------------------
@@ -292,16 +360,16 @@ T_GET_FUNCS[FieldTypes.F_UINT32.value] = fuint32_get
 
 
 def fsint32_get(chan):
-    return read_raw_b32(chan)
+    val = read_raw_b32(chan)
+    # reinterpret as two's complement
+    return val - 0x100000000 if val & 0x80000000 else val
 
 
-T_GET_FUNCS[FieldTypes.F_SINT32.value] = fuint32_get
+T_GET_FUNCS[FieldTypes.F_SINT32.value] = fsint32_get
 
 
 def ffloat_get(chan):
-    val = read_raw_b32(chan)
-    # XXX STUB: cast 32-bit val to double
-    return val
+    return read_raw_float(chan)
 
 
 T_GET_FUNCS[FieldTypes.F_FLOAT.value] = ffloat_get
@@ -317,16 +385,16 @@ T_GET_FUNCS[FieldTypes.F_UINT64.value] = fuint64_get
 
 
 def fsint64_get(chan):
-    return read_raw_b64(chan)
+    val = read_raw_b64(chan)
+    # reinterpret as two's complement
+    return val - 0x10000000000000000 if val & 0x8000000000000000 else val
 
 
-T_GET_FUNCS[FieldTypes.F_SINT64.value] = fuint64_get
+T_GET_FUNCS[FieldTypes.F_SINT64.value] = fsint64_get
 
 
 def fdouble_get(chan):
-    val = read_raw_b64(chan)
-    # XXX STUB: cast 64-bit val to double
-    return val
+    return read_raw_double(chan)
 
 
 T_GET_FUNCS[FieldTypes.F_DOUBLE.value] = fdouble_get
@@ -336,26 +404,22 @@ T_GET_FUNCS[FieldTypes.F_DOUBLE.value] = fdouble_get
 
 def lstring_get(chan):
     b_array = read_raw_len_plus(chan)
-    value = b_array.decode('utf-8')
-    # DEBUG
-    print("lStringGet '%s' => '%s'" % (b_array, value))
-    # END
-    return value
+    return b_array.decode('utf-8')
 
 
 T_GET_FUNCS[FieldTypes.L_STRING.value] = lstring_get
 
 
-def lbytes_get(chan):
-    return read_raw_len_plus(chan)
+def lbytes_get(chan, zero_copy=False):
+    return read_raw_len_plus(chan, zero_copy)
 
 
 T_GET_FUNCS[FieldTypes.L_BYTES.value] = lbytes_get
 
 
-def lmsg_get(chan):
+def lmsg_get(chan, zero_copy=False):
     # caller must interpret the raw byte array
-    return read_raw_len_plus(chan)
+    return read_raw_len_plus(chan, zero_copy)
 
 
 T_GET_FUNCS[FieldTypes.L_MSG.value] = lmsg_get
@@ -363,22 +427,22 @@ T_GET_FUNCS[FieldTypes.L_MSG.value] = lmsg_get
 # other fixed-length byte fields --------------------------
 
 
-def fbytes16_get(chan):
-    return read_raw_b128(chan)
+def fbytes16_get(chan, zero_copy=False):
+    return read_raw_b128(chan, zero_copy)
 
 
 T_GET_FUNCS[FieldTypes.F_BYTES16.value] = fbytes16_get
 
 
-def fbytes20_get(chan):
-    return read_raw_b160(chan)
+def fbytes20_get(chan, zero_copy=False):
+    return read_raw_b160(chan, zero_copy)
 
 
 T_GET_FUNCS[FieldTypes.F_BYTES20.value] = fbytes20_get
 
 
-def fbytes32_get(chan):
-    return read_raw_b256(chan)
+def fbytes32_get(chan, zero_copy=False):
+    return read_raw_b256(chan, zero_copy)
 
 
 T_GET_FUNCS[FieldTypes.F_BYTES32.value] = fbytes32_get
@@ -499,7 +563,7 @@ T_LEN_FUNCS[FieldTypes.L_STRING.value] = l_string_len
 def lbytes_len(val, ndx):
     """ Return the length of an lbytes field, with ndx the field number. """
     h_len = field_hdr_len(ndx, FieldTypes.L_BYTES)
-    v_len = len(val)
+    v_len = bytes_len(val)
     return h_len + length_as_varint(v_len) + v_len
 
 
@@ -507,9 +571,19 @@ T_LEN_FUNCS[FieldTypes.L_BYTES.value] = lbytes_len
 
 
 def lmsg_len(val, ndx):
-    """ Return the length of an lmsg field, with ndx the field number. """
+    """
+    Return the length of an lmsg field, with ndx the field number.
+
+    val is either a serialized message or an object with a wire_len
+    attribute giving the length of its serialization, or a wire_len()
+    method returning it, as a record class has.
+    """
     h_len = field_hdr_len(ndx, FieldTypes.L_MSG)
-    v_len = val.wire_len
+    v_len = getattr(val, 'wire_len', None)
+    if v_len is None:
+        v_len = bytes_len(val)
+    elif callable(v_len):
+        v_len = v_len()
     return h_len + length_as_varint(v_len) + v_len
 
 
@@ -541,3 +615,25 @@ def fbytes32_len(val, ndx):
 
 
 T_LEN_FUNCS[FieldTypes.F_BYTES32.value] = fbytes32_len
+
+# C ACCELERATION ====================================================
+
+# see the end of raw.py
+_PY_FUNCS = {
+    'encode_sint32': encode_sint32,
+    'decode_sint32': decode_sint32,
+    'encode_sint64': encode_sint64,
+    'decode_sint64': decode_sint64,
+}
+
+if not os.environ.get('WIREOPS_PURE_PYTHON'):
+    try:
+        from wireops import _speedups
+    except ImportError:
+        pass
+    else:
+        _speedups.register_fallbacks(_PY_FUNCS)
+        encode_sint32 = _speedups.encode_sint32
+        decode_sint32 = _speedups.decode_sint32
+        encode_sint64 = _speedups.encode_sint64
+        decode_sint64 = _speedups.decode_sint64
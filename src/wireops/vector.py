@@ -0,0 +1,213 @@
+# wireops/vector.py
+
+"""
+Vectorized varint and zig-zag operations on whole columns of integers.
+
+If NumPy is available the work is done on ndarrays without a Python-level
+loop per value.  Otherwise the same functions fall back to the
+pure-Python codecs in raw and typed, returning array.array objects.
+"""
+
+from array import array
+
+from wireops.chan import Channel
+from wireops.raw import length_as_varint, read_varints, write_varints
+from wireops.typed import(
+    encode_sint32, decode_sint32, encode_sint64, decode_sint64)
+
+try:
+    import numpy as np
+    HAVE_NUMPY = True
+except ImportError:
+    np = None
+    HAVE_NUMPY = False
+
+__all__ = [
+    'HAVE_NUMPY',
+    'varint_lengths', 'pack_varints', 'unpack_varints',
+    'encode_sint32s', 'decode_sint32s',
+    'encode_sint64s', 'decode_sint64s',
+    'pack_sint32s', 'unpack_sint32s',
+    'pack_sint64s', 'unpack_sint64s',
+]
+
+# PURE PYTHON #######################################################
+
+
+def _py_varint_lengths(values):
+    return array('B', [length_as_varint(v & 0xffffffffffffffff)
+                       for v in values])
+
+
+def _py_pack_varints(values):
+    values = list(values)
+    # position may never reach capacity, hence the extra byte
+    chan = Channel(10 * len(values) + 1)
+    write_varints(chan, values)
+    return bytes(chan.buffer[:chan.position])
+
+
+def _py_unpack_varints(data):
+    if not data:
+        return array('Q')
+    if data[-1] & 0x80:
+        raise ValueError("truncated varint at end of buffer")
+    count = sum(1 for b_val in data if b_val < 0x80)
+    chan = Channel(len(data) + 1, bytearray(data))
+    return read_varints(chan, count)
+
+
+def _py_encode_sint32s(values):
+    return array('Q', [encode_sint32(v) for v in values])
+
+
+def _py_decode_sint32s(values):
+    return array('i', [decode_sint32(v) for v in values])
+
+
+def _py_encode_sint64s(values):
+    return array('Q', [encode_sint64(v) for v in values])
+
+
+def _py_decode_sint64s(values):
+    return array('q', [decode_sint64(v) for v in values])
+
+# NUMPY #############################################################
+
+
+if HAVE_NUMPY:
+    # a value needs k+1 bytes if it is >= 1 << 7k
+    _THRESHOLDS = np.array([1 << (7 * k) for k in range(1, 10)],
+                           dtype=np.uint64)
+
+
+def _as_uint64(values):
+    """ Return values as an ndarray of uint64, wrapping negatives. """
+    vals = np.asarray(values)
+    if vals.dtype == np.uint64:
+        return vals
+    if vals.dtype.kind in 'biu':
+        return vals.astype(np.int64).view(np.uint64)
+    # a list mixing negatives and values above 2^63 has no integer dtype
+    return np.array([int(v) & 0xffffffffffffffff for v in values],
+                    dtype=np.uint64)
+
+
+def _np_varint_lengths(values):
+    """ Return the number of bytes each value occupies as a varint. """
+    vals = _as_uint64(values)
+    return np.searchsorted(_THRESHOLDS, vals, side='right') + 1
+
+
+def _np_pack_varints(values):
+    """ Return the values packed back to back as varints, as bytes. """
+    vals = _as_uint64(values)
+    if vals.size == 0:
+        return b''
+    lens = _np_varint_lengths(vals)
+    ends = np.cumsum(lens)
+    starts = ends - lens
+    out = np.empty(int(ends[-1]), dtype=np.uint8)
+    for k in range(int(lens.max())):
+        sel = lens > k
+        septet = (vals[sel] >> np.uint64(7 * k)) & np.uint64(0x7f)
+        more = (lens[sel] > k + 1).astype(np.uint8) << 7
+        out[starts[sel] + k] = septet.astype(np.uint8) | more
+    return out.tobytes()
+
+
+def _np_unpack_varints(data):
+    """
+    Split a run of packed varints on the bytes whose continuation bits
+    are clear and return their values as an ndarray of uint64.
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    if buf.size == 0:
+        return np.empty(0, dtype=np.uint64)
+    if buf[-1] & 0x80:
+        raise ValueError("truncated varint at end of buffer")
+    # a byte with the continuation bit clear ends a varint
+    ends = np.flatnonzero(buf < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lens = ends - starts + 1
+    max_len = int(lens.max())
+    if max_len > 10:
+        raise ValueError("varint longer than 10 bytes")
+    septets = (buf & 0x7f).astype(np.uint64)
+    vals = np.zeros(ends.size, dtype=np.uint64)
+    for k in range(max_len):
+        sel = lens > k
+        vals[sel] |= septets[starts[sel] + k] << np.uint64(7 * k)
+    return vals
+
+
+def _np_encode_sint32s(values):
+    """ Zig-zag encode values truncated to signed 32 bits. """
+    vals = np.asarray(values).astype(np.int32)
+    zigzag = (vals << np.int32(1)) ^ (vals >> np.int32(31))
+    return zigzag.view(np.uint32).astype(np.uint64)
+
+
+def _np_decode_sint32s(values):
+    """ Zig-zag decode values into signed 32-bit integers. """
+    vals = _as_uint64(values)
+    one = np.uint64(1)
+    vals = (vals >> one) ^ (np.uint64(0) - (vals & one))
+    return vals.astype(np.uint32).view(np.int32)
+
+
+def _np_encode_sint64s(values):
+    """ Zig-zag encode values truncated to signed 64 bits. """
+    vals = np.asarray(values).astype(np.int64)
+    zigzag = (vals << np.int64(1)) ^ (vals >> np.int64(63))
+    return zigzag.view(np.uint64)
+
+
+def _np_decode_sint64s(values):
+    """ Zig-zag decode values into signed 64-bit integers. """
+    vals = _as_uint64(values)
+    one = np.uint64(1)
+    vals = (vals >> one) ^ (np.uint64(0) - (vals & one))
+    return vals.view(np.int64)
+
+# PUBLIC INTERFACE ##################################################
+
+
+if HAVE_NUMPY:
+    varint_lengths = _np_varint_lengths
+    pack_varints = _np_pack_varints
+    unpack_varints = _np_unpack_varints
+    encode_sint32s = _np_encode_sint32s
+    decode_sint32s = _np_decode_sint32s
+    encode_sint64s = _np_encode_sint64s
+    decode_sint64s = _np_decode_sint64s
+else:
+    varint_lengths = _py_varint_lengths
+    pack_varints = _py_pack_varints
+    unpack_varints = _py_unpack_varints
+    encode_sint32s = _py_encode_sint32s
+    decode_sint32s = _py_decode_sint32s
+    encode_sint64s = _py_encode_sint64s
+    decode_sint64s = _py_decode_sint64s
+
+
+def pack_sint32s(values):
+    """ Zig-zag encode signed 32-bit values and pack them as varints. """
+    return pack_varints(encode_sint32s(values))
+
+
+def unpack_sint32s(data):
+    """ Unpack varints and zig-zag decode them as signed 32-bit values. """
+    return decode_sint32s(unpack_varints(data))
+
+
+def pack_sint64s(values):
+    """ Zig-zag encode signed 64-bit values and pack them as varints. """
+    return pack_varints(encode_sint64s(values))
+
+
+def unpack_sint64s(data):
+    """ Unpack varints and zig-zag decode them as signed 64-bit values. """
+    return decode_sint64s(unpack_varints(data))
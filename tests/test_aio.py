@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# test_aio.py
+
+""" Test reading and writing frames over asyncio streams. """
+
+import asyncio
+import time
+import unittest
+
+from rnglib import SimpleRNG
+from wireops import WireopsError
+from wireops.aio import(
+    read_varint, read_frame, write_frame, write_msg,
+    aiter_frames, aiter_fields)
+from wireops.enum import FieldTypes, PrimTypes
+from wireops.policy import DecodeLimitError, DecodePolicy
+from wireops.raw import(
+    write_varint_field, write_b32_field, write_len_plus_field, WireBuffer)
+from wireops.spec import MessageSpec
+
+LOG_ENTRY = MessageSpec('logEntry', [
+    ('timestamp', 0, FieldTypes.F_UINT32),
+    ('length', 3, FieldTypes.V_UINT32),
+    ('path', 5, FieldTypes.L_STRING),
+])
+
+
+async def loopback(send, receive):
+    """
+    Start a server on the loopback interface which echoes everything it
+    is sent, run the coroutine send against a connection to it, and
+    return what the coroutine receive makes of the echoed stream.
+    """
+    async def echo(reader, writer):
+        while True:
+            data = await reader.read(1 << 12)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(echo, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        result = asyncio.ensure_future(receive(reader))
+        await send(writer)
+        writer.write_eof()
+        result = await result
+        writer.close()
+        await writer.wait_closed()
+    return result
+
+
+class TestAio(unittest.TestCase):
+    """ Test reading and writing frames over asyncio streams. """
+
+    def setUp(self):
+        self.rng = SimpleRNG(time.time())
+
+    def tearDown(self):
+        pass
+
+    def test_frames(self):
+        """ Round trip frames and messages through a loopback server. """
+        payloads = [bytes(self.rng.some_bytes(size))
+                    for size in [0, 1, 127, 128, 20000] + [
+                        self.rng.next_int16(300) for _ in range(50)]]
+        msgs = [{'timestamp': n, 'length': n * n, 'path': '/a/%d' % n}
+                for n in range(100)]
+
+        async def send(writer):
+            for payload in payloads:
+                await write_frame(writer, payload)
+            for msg in msgs:
+                await write_msg(writer, LOG_ENTRY, msg)
+
+        async def receive(reader):
+            frames = []
+            for _ in payloads:
+                frames.append(await read_frame(reader))
+            decoded = [msg async for msg in aiter_frames(reader, LOG_ENTRY)]
+            return frames, decoded
+
+        frames, decoded = asyncio.run(loopback(send, receive))
+        self.assertEqual(payloads, frames)
+        self.assertEqual(msgs, decoded)
+
+    def test_fields(self):
+        """ Fields are decoded as they arrive. """
+        wb_ = WireBuffer(1024)
+        write_varint_field(wb_, 1 << 40, 1)
+        write_b32_field(wb_, 0xdeadbeef, 2)
+        write_len_plus_field(wb_, b'abc', 3)
+        data = bytes(wb_.buffer[:wb_.position])
+
+        async def send(writer):
+            # dribble the bytes out to exercise partial reads
+            for ndx in range(len(data)):
+                writer.write(data[ndx:ndx + 1])
+                await writer.drain()
+
+        async def receive(reader):
+            return [field async for field in aiter_fields(reader)]
+
+        fields = asyncio.run(loopback(send, receive))
+        self.assertEqual([(1, PrimTypes.VARINT, 1 << 40),
+                          (2, PrimTypes.B32, 0xdeadbeef),
+                          (3, PrimTypes.LEN_PLUS, b'abc')], fields)
+
+    def test_truncated(self):
+        """ A stream ending part way through a frame is an error. """
+        def reader_for(data):
+            reader = asyncio.StreamReader()
+            reader.feed_data(data)
+            reader.feed_eof()
+            return reader
+
+        async def run():
+            self.assertEqual(300, await read_varint(reader_for(b'\xac\x02')))
+            self.assertIsNone(await read_frame(reader_for(b'')))
+            with self.assertRaises(WireopsError):
+                await read_varint(reader_for(b'\xac'))
+            with self.assertRaises(WireopsError):
+                await read_frame(reader_for(b'\x05abc'))
+
+            # a length prefix longer than the policy allows
+            policy = DecodePolicy(max_varint_bytes=1)
+            with self.assertRaises(DecodeLimitError):
+                await read_frame(reader_for(b'\x81\x00' + bytes(1)),
+                                 policy)
+            self.assertEqual(b'a', await read_frame(reader_for(b'\x01a'),
+                                                    policy))
+
+        asyncio.run(run())
+
+
+if __name__ == '__main__':
+    unittest.main()
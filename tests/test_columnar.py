@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# test_columnar.py
+
+""" Test encoding and decoding batches of records held as columns. """
+
+import time
+import unittest
+from array import array
+
+from rnglib import SimpleRNG
+from wireops import WireopsError
+from wireops.columnar import encode_columns, decode_columns
+from wireops.enum import FieldTypes
+from wireops.framing import iter_frames
+from wireops.raw import WireBuffer
+from wireops.spec import MessageSpec, PACKED
+from wireops.vector import HAVE_NUMPY, np
+
+LOG_ENTRY = MessageSpec('logEntry', [
+    ('timestamp', 0, FieldTypes.F_UINT32),
+    ('node_id', 1, FieldTypes.F_BYTES20),
+    ('key', 2, FieldTypes.F_BYTES20),
+    ('length', 3, FieldTypes.V_UINT32),
+    ('by', 4, FieldTypes.L_STRING),
+    ('path', 5, FieldTypes.L_STRING),
+])
+
+
+class TestColumnar(unittest.TestCase):
+    """ Test encoding and decoding batches of records held as columns. """
+
+    def setUp(self):
+        self.rng = SimpleRNG(time.time())
+
+    def tearDown(self):
+        pass
+
+    def make_columns(self, count):
+        """ Return count random logEntry records as columns. """
+        rng = self.rng
+        return {
+            'timestamp': array('I', [rng.next_int32() for _ in range(count)]),
+            'node_id': [bytes(rng.some_bytes(20)) for _ in range(count)],
+            'key': [bytes(rng.some_bytes(20)) for _ in range(count)],
+            'length': array('I', [rng.next_int32() for _ in range(count)]),
+            'by': ['who%d' % rng.next_int16() for _ in range(count)],
+            'path': ['/p/é/%d' % n for n in range(count)],
+        }
+
+    def test_matches_spec(self):
+        """ Each record is framed exactly as MessageSpec encodes it. """
+        count = 1 + self.rng.next_int16(200)
+        columns = self.make_columns(count)
+        wb_ = encode_columns(LOG_ENTRY, columns)
+        self.assertEqual(wb_.position, wb_.limit)
+        frames = list(iter_frames(wb_.buffer, 0, wb_.limit))
+        self.assertEqual(count, len(frames))
+        for row, frame in enumerate(frames):
+            msg = {name: col[row] for name, col in columns.items()}
+            self.assertEqual(LOG_ENTRY.encode_exact(msg).buffer[
+                :LOG_ENTRY.size(msg)], frame)
+
+    def test_round_trip(self):
+        """ Columns decode to arrays, lists, and offset arrays. """
+        count = 1 + self.rng.next_int16(200)
+        columns = self.make_columns(count)
+        wb_ = encode_columns(LOG_ENTRY, columns)
+        data = bytes(wb_.buffer[:wb_.limit])
+
+        out = decode_columns(LOG_ENTRY, data)
+        self.assertEqual(columns['timestamp'], out['timestamp'])
+        self.assertEqual(columns['length'], out['length'])
+        self.assertEqual('I', out['length'].typecode)
+        self.assertEqual(columns['node_id'], out['node_id'])
+        self.assertEqual(columns['by'], out['by'])
+        self.assertEqual(columns['path'], out['path'])
+
+        out = decode_columns(LOG_ENTRY, data, names=['path', 'key'],
+                             offsets=True)
+        self.assertEqual(['key', 'path'], sorted(out))
+        blob, offs = out['path']
+        self.assertEqual(count + 1, len(offs))
+        self.assertEqual(
+            columns['path'],
+            [blob[offs[n]:offs[n + 1]].decode('utf-8')
+             for n in range(count)])
+        blob, offs = out['key']
+        self.assertEqual(b''.join(columns['key']), bytes(blob))
+
+    def test_missing_values(self):
+        """ None leaves a field out; decoding fills in a default. """
+        columns = {'timestamp': [1, None, 3],
+                   'by': [None, 'b', 'c'],
+                   'path': ['x', 'y', None]}
+        wb_ = encode_columns(LOG_ENTRY, columns)
+        out = decode_columns(LOG_ENTRY, wb_.buffer, end=wb_.limit)
+        self.assertEqual(array('I', [1, 0, 3]), out['timestamp'])
+        self.assertEqual([None, 'b', 'c'], out['by'])
+        self.assertEqual(array('I', [0, 0, 0]), out['length'])
+        blob, offs = decode_columns(
+            LOG_ENTRY, wb_.buffer, end=wb_.limit, offsets=True)['path']
+        self.assertEqual(b'xy', bytes(blob))
+        self.assertEqual(array('Q', [0, 1, 2, 2]), offs)
+
+    def test_nested_and_packed(self):
+        """ L_MSG and packed columns hold dicts and sequences. """
+        inner = MessageSpec('point', [('x', 0, FieldTypes.V_SINT32)])
+        spec = MessageSpec('sample', [
+            ('where', 0, FieldTypes.L_MSG, inner),
+            ('values', 1, FieldTypes.F_DOUBLE, PACKED),
+        ])
+        columns = {'where': [{'x': -1}, {'x': 2}],
+                   'values': [[0.5, 1.5], array('d', [2.5])]}
+        wb_ = encode_columns(spec, columns, WireBuffer(4, auto_grow=True))
+        out = decode_columns(spec, wb_.buffer, end=wb_.position)
+        self.assertEqual(columns['where'], out['where'])
+        self.assertEqual([array('d', [0.5, 1.5]), array('d', [2.5])],
+                         out['values'])
+
+    def test_bool_round_trip(self):
+        """ A decoded bool column encodes to the same records. """
+        spec = MessageSpec('flags', [('on', 0, FieldTypes.V_BOOL)])
+        columns = {'on': [True, False, True]}
+        wb_ = encode_columns(spec, columns)
+        out = decode_columns(spec, wb_.buffer, end=wb_.limit)
+        self.assertEqual(array('B', [1, 0, 1]), out['on'])
+        wb2 = encode_columns(spec, out)
+        self.assertEqual(wb_.buffer[:wb_.limit], wb2.buffer[:wb2.limit])
+
+    @unittest.skipUnless(HAVE_NUMPY, 'NumPy is not installed')
+    def test_numpy_bools(self):
+        """ A NumPy bool array encodes as the equivalent list. """
+        spec = MessageSpec('flags', [('on', 0, FieldTypes.V_BOOL)])
+        wb_ = encode_columns(spec, {'on': np.array([True, False, True])})
+        out = decode_columns(spec, wb_.buffer, end=wb_.limit)
+        self.assertEqual(array('B', [1, 0, 1]), out['on'])
+
+    def test_nested_sized_once(self):
+        """ Each nested message is sized once, with those within it. """
+        inner = MessageSpec('point', [('x', 0, FieldTypes.V_SINT32)])
+        middle = MessageSpec('segment', [
+            ('start', 0, FieldTypes.L_MSG, inner),
+            ('end', 1, FieldTypes.L_MSG, inner),
+        ])
+        spec = MessageSpec('route', [
+            ('id', 0, FieldTypes.V_UINT32),
+            ('leg', 1, FieldTypes.L_MSG, middle),
+        ])
+        count = 1 + self.rng.next_int16(50)
+        columns = {
+            'id': list(range(count)),
+            'leg': [{'start': {'x': n}, 'end': {'x': -n}}
+                    for n in range(count)]}
+        calls = []
+        original = MessageSpec._size
+        MessageSpec._size = lambda *args: calls.append(1) or original(*args)
+        try:
+            wb_ = encode_columns(spec, columns)
+        finally:
+            MessageSpec._size = original
+        # one call for each segment and each of its two points
+        self.assertEqual(3 * count, len(calls))
+        frames = list(iter_frames(wb_.buffer, 0, wb_.limit))
+        for row, frame in enumerate(frames):
+            msg = {'id': row, 'leg': columns['leg'][row]}
+            self.assertEqual(spec.encode_exact(msg).buffer[
+                :spec.size(msg)], frame)
+
+    def test_errors(self):
+        """ Bad columns and bad input raise WireopsError. """
+        with self.assertRaises(WireopsError):
+            encode_columns(LOG_ENTRY, {'nonesuch': [1]})
+        with self.assertRaises(WireopsError):
+            encode_columns(LOG_ENTRY, {'timestamp': [1, 2], 'by': ['a']})
+        with self.assertRaises(WireopsError):
+            decode_columns(LOG_ENTRY, b'', names=['nonesuch'])
+        wb_ = encode_columns(LOG_ENTRY, {'length': [1, 2]})
+        with self.assertRaises(WireopsError):
+            decode_columns(LOG_ENTRY, wb_.buffer, end=wb_.limit - 1)
+        # a field repeated within a record
+        with self.assertRaises(WireopsError):
+            decode_columns(LOG_ENTRY, b'\x04\x18\x01\x18\x02')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,7 +6,8 @@
 import time
 import unittest
 
-from wireops.enum import FieldTypes
+from wireops.chan import Channel
+from wireops.enum import FieldTypes, PrimTypes
 
 from wireops import raw, typed
 from rnglib import SimpleRNG
@@ -168,6 +169,46 @@ class TestFieldTypes(unittest.TestCase):
         len_ = raw.field_hdr_len(ndx, FieldTypes.F_BYTES32)
         self.assertEqual(len_ + 32, typed.fbytes32_len(buf, ndx))
 
+    def test_hdr_tables(self):
+        """
+        Verify that the precomputed header tables agree with encoding
+        headers directly, inside and beyond the cached range.
+        """
+        # the old if-chain mapping field types to primitive types
+        self.assertEqual(PrimTypes.VARINT,
+                         raw.FIELD_PRIM_TYPES[FieldTypes.V_SINT64.value])
+        self.assertEqual(PrimTypes.B32,
+                         raw.FIELD_PRIM_TYPES[FieldTypes.F_FLOAT.value])
+        self.assertEqual(PrimTypes.B64,
+                         raw.FIELD_PRIM_TYPES[FieldTypes.F_DOUBLE.value])
+        self.assertEqual(PrimTypes.LEN_PLUS,
+                         raw.FIELD_PRIM_TYPES[FieldTypes.L_MSG.value])
+        self.assertEqual(PrimTypes.B160,
+                         raw.FIELD_PRIM_TYPES[FieldTypes.F_BYTES20.value])
+
+        old_max = raw.max_cached_field_nbr()
+        try:
+            raw.set_max_cached_field_nbr(20)
+            self.assertEqual(20, raw.max_cached_field_nbr())
+            for ndx in [0, 1, 15, 16, 20, 21, 2047, 2048,
+                        self.rng.next_int16()]:
+                for ftype in FieldTypes:
+                    ptype = raw.FIELD_PRIM_TYPES[ftype.value]
+                    hdr = raw.field_hdr_val(ndx, ptype)
+                    self.assertEqual(raw.length_as_varint(hdr),
+                                     raw.field_hdr_len(ndx, ftype))
+
+                    chan = Channel(16)
+                    raw.write_raw_varint(chan, hdr)
+                    expected = chan.buffer[:chan.position]
+                    self.assertEqual(expected, raw.field_hdr_bytes(ndx, ptype))
+
+                    chan = Channel(16)
+                    raw.write_field_hdr(chan, ndx, ptype)
+                    self.assertEqual(expected, chan.buffer[:chan.position])
+        finally:
+            raw.set_max_cached_field_nbr(old_max)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# test_fields.py
+
+""" Test iterating over the fields in a buffer. """
+
+import time
+import unittest
+
+from rnglib import SimpleRNG
+from wireops import WireopsError
+from wireops.chan import Channel
+from wireops.enum import FieldTypes, PrimTypes
+from wireops.fields import iter_fields
+from wireops.raw import(
+    read_field_hdr, skip_field, find_field, read_raw_b160,
+    write_packed_varint_field,)
+from wireops.spec import MessageSpec
+
+LEN_BUFF = 4096
+
+EVERYTHING = MessageSpec('everything', [
+    (ftype.sym, ftype.value + 1, ftype) for ftype in FieldTypes])
+
+MSG = {
+    'vbool': True, 'venum': 7, 'vuint32': 0xffffffff,
+    'vsint32': -192, 'vuint64': 0xffffffffffffffff,
+    'vsint64': -(1 << 63), 'fuint32': 0x80000000,
+    'fsint32': -15379, 'ffloat': 0.15625,
+    'fuint64': 0x8000000000000000, 'fsint64': -2, 'fdouble': 1e300,
+    'lstring': 'été', 'lbytes': b'\x00\x01', 'lmsg': b'\x08\x01',
+    'fbytes16': bytes(range(16)), 'fbytes20': bytes(range(20)),
+    'fbytes32': bytes(range(32)), }
+
+
+class TestFields(unittest.TestCase):
+    """ Test iterating over the fields in a buffer. """
+
+    def setUp(self):
+        self.rng = SimpleRNG(time.time())
+
+    def tearDown(self):
+        pass
+
+    def make_chan(self):
+        """ Return a flipped channel holding MSG. """
+        chan = Channel(LEN_BUFF)
+        EVERYTHING.encode(chan, MSG)
+        chan.flip()
+        return chan
+
+    def test_all_types(self):
+        """ Every field is found and decodes to the value written. """
+        chan = self.make_chan()
+        records = list(iter_fields(chan))
+        self.assertEqual(0, chan.position)      # position is untouched
+        self.assertEqual(len(FieldTypes), len(records))
+        for ftype, rec in zip(FieldTypes, records):
+            self.assertEqual(ftype.value + 1, rec.field_nbr)
+            self.assertEqual(MSG[ftype.sym], rec.decode(ftype))
+        self.assertEqual(chan.limit, records[-1].end)
+
+        # lengths cover the value only
+        rec = records[FieldTypes.L_STRING.value]
+        self.assertEqual(PrimTypes.LEN_PLUS, rec.ptype)
+        self.assertEqual('été'.encode('utf-8'), rec.payload())
+        rec = records[FieldTypes.V_UINT64.value]
+        self.assertEqual(PrimTypes.VARINT, rec.ptype)
+        self.assertEqual(10, rec.length)
+
+        # a field cannot be decoded as a type its primitive can't carry
+        self.assertRaises(WireopsError, rec.decode, FieldTypes.F_UINT64)
+
+    def test_wanted(self):
+        """ Fields not wanted are stepped over. """
+        chan = self.make_chan()
+        nbrs = [FieldTypes.V_BOOL.value + 1, FieldTypes.F_BYTES20.value + 1]
+        records = list(iter_fields(chan, wanted=set(nbrs)))
+        self.assertEqual(nbrs, [rec.field_nbr for rec in records])
+        self.assertEqual(MSG['fbytes20'],
+                         records[1].decode(FieldTypes.F_BYTES20))
+
+    def test_packed(self):
+        """ Packed varint fields are stepped over as a unit. """
+        chan = Channel(LEN_BUFF)
+        values = [self.rng.next_int64() for _ in range(10)]
+        write_packed_varint_field(chan, values, 3)
+        EVERYTHING.encode(chan, {'vbool': False})
+        chan.flip()
+        records = list(iter_fields(chan))
+        self.assertEqual([3, 1], [rec.field_nbr for rec in records])
+        self.assertEqual(PrimTypes.PACKED_VARINT, records[0].ptype)
+
+    def test_truncated(self):
+        """ A field running past the end is reported. """
+        chan = self.make_chan()
+        end = chan.limit - 1
+        self.assertRaises(WireopsError, list, iter_fields(chan, end))
+
+    def test_skip_field(self):
+        """ skip_field steps over fields of every primitive type. """
+        chan = Channel(LEN_BUFF)
+        EVERYTHING.encode(chan, MSG)
+        write_packed_varint_field(chan, [1, 1 << 40, 3], 99)
+        chan.flip()
+        records = list(iter_fields(chan))
+        self.assertEqual(len(FieldTypes) + 1, len(records))
+        for rec in records:
+            (ptype, field_nbr) = read_field_hdr(chan)
+            self.assertEqual(rec.ptype, ptype)
+            self.assertEqual(rec.field_nbr, field_nbr)
+            skip_field(chan, ptype)
+            self.assertEqual(rec.end, chan.position)
+
+    def test_find_field(self):
+        """ find_field leaves the channel at the value of the field. """
+        chan = self.make_chan()
+        field_nbr = FieldTypes.F_BYTES20.value + 1
+        self.assertEqual(PrimTypes.B160, find_field(chan, field_nbr))
+        self.assertEqual(MSG['fbytes20'], read_raw_b160(chan))
+
+        # fields before the position are not found
+        self.assertIsNone(find_field(chan, 1))
+        position = chan.position
+        self.assertIsNone(find_field(chan, 1000))
+        self.assertEqual(position, chan.position)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# test_fixed_bytes.py
+
+""" Test bulk writes of raw bytes and fixed-length byte fields. """
+
+import time
+import unittest
+from array import array
+
+from rnglib import SimpleRNG
+from wireops.chan import Channel
+from wireops.enum import PrimTypes
+from wireops.raw import(
+    read_field_hdr, write_raw_bytes,
+    read_raw_b128, write_b128_field, read_raw_b160, write_b160_field,
+    read_raw_b256, write_b256_field,)
+
+LEN_BUFF = 1024
+
+
+class TestFixedBytes(unittest.TestCase):
+    """ Test bulk writes of raw bytes and fixed-length byte fields. """
+
+    def setUp(self):
+        self.rng = SimpleRNG(time.time())
+
+    def tearDown(self):
+        pass
+
+    def test_buffer_types(self):
+        """
+        Any buffer-protocol object can be written; wide items are written
+        in their in-memory representation.
+        """
+        data = bytes(self.rng.next_int16(256) for _ in range(64))
+        words = array('I', [1, 2, 3])
+        for value in (data, bytearray(data), memoryview(data), list(data),
+                      words):
+            chan = Channel(LEN_BUFF)
+            chan.position = 7
+            write_raw_bytes(chan, value)
+            expected = bytes(memoryview(value).cast('B')) \
+                if not isinstance(value, list) else data
+            self.assertEqual(7 + len(expected), chan.position)
+            self.assertEqual(expected, chan.buffer[7:chan.position])
+            # the buffer is never resized by a write
+            self.assertEqual(LEN_BUFF, len(chan.buffer))
+
+    def test_overflow(self):
+        """ Writes which would overrun the buffer raise ValueError. """
+        chan = Channel(16)
+        chan.position = 8
+        self.assertRaises(ValueError, write_raw_bytes, chan, bytes(9))
+        self.assertEqual(8, chan.position)
+        self.assertEqual(16, len(chan.buffer))
+
+    def round_trip(self, nnn, write_field, read_raw, ptype):
+        """ Round-trip a fixed-length byte field of nnn bytes. """
+        value = bytes(self.rng.next_int16(256) for _ in range(nnn))
+        field_nbr = 1 + self.rng.next_int16(1024)
+        chan = Channel(LEN_BUFF)
+        write_field(chan, value, field_nbr)
+        # only the first nnn bytes of a longer value are written
+        write_field(chan, value + b'extra', field_nbr)
+        chan.flip()
+        for _ in range(2):
+            (ptype2, field_nbr2) = read_field_hdr(chan)
+            self.assertEqual(ptype, ptype2)
+            self.assertEqual(field_nbr, field_nbr2)
+            self.assertEqual(value, read_raw(chan))
+
+        chan.clear()
+        self.assertRaises(ValueError, write_field, chan, value[:-1], 1)
+
+    def test_fixed_fields(self):
+        """ Round-trip 16, 20, and 32 byte fields. """
+        self.round_trip(16, write_b128_field, read_raw_b128, PrimTypes.B128)
+        self.round_trip(20, write_b160_field, read_raw_b160, PrimTypes.B160)
+        self.round_trip(32, write_b256_field, read_raw_b256, PrimTypes.B256)
+
+
+if __name__ == '__main__':
+    unittest.main()
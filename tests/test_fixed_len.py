@@ -11,10 +11,13 @@ import unittest
 
 from rnglib import SimpleRNG
 from wireops.chan import Channel
-from wireops.enum import PrimTypes
+from wireops.enum import FieldTypes, PrimTypes
 from wireops.raw import(
     field_hdr_val, read_field_hdr, length_as_varint,
-    read_raw_b32, write_b32_field, read_raw_b64, write_b64_field,)
+    read_raw_b32, write_b32_field, read_raw_b64, write_b64_field,
+    read_raw_b32s, write_raw_b32s, read_raw_b64s, write_raw_b64s,
+    read_raw_floats, write_raw_floats, read_raw_doubles, write_raw_doubles,)
+from wireops.typed import T_GET_FUNCS, T_PUT_FUNCS
 
 LEN_BUFF = 1024
 
@@ -128,6 +131,49 @@ class TestFixedLen(unittest.TestCase):
         self.round_trip64(0x8000000000000000)
         self.round_trip64(0xffffffffffffffff)
 
+    def test_floats(self):
+        """ Verify that floats and doubles survive a round trip. """
+        chan = Channel(LEN_BUFF)
+        # 0.15625 is exactly representable as a 32-bit float
+        T_PUT_FUNCS[FieldTypes.F_FLOAT.value](chan, 0.15625, 1)
+        T_PUT_FUNCS[FieldTypes.F_DOUBLE.value](chan, -1.0 / 3, 2)
+        chan.flip()
+
+        (field_type, _) = read_field_hdr(chan)
+        self.assertEqual(PrimTypes.B32, field_type)
+        self.assertEqual(0.15625, T_GET_FUNCS[FieldTypes.F_FLOAT.value](chan))
+        (field_type, _) = read_field_hdr(chan)
+        self.assertEqual(PrimTypes.B64, field_type)
+        self.assertEqual(-1.0 / 3,
+                         T_GET_FUNCS[FieldTypes.F_DOUBLE.value](chan))
+
+    def test_batches(self):
+        """ Verify the batch readers and writers. """
+        u32s = [self.rng.next_int32() for _ in range(16)] + [0xffffffff]
+        u64s = [self.rng.next_int64() for _ in range(16)] + [(1 << 64) - 1]
+        floats = [0.5, -2.25, 1024.0]
+        doubles = [self.rng.next_int64() / 7.0 for _ in range(8)]
+
+        chan = Channel(LEN_BUFF)
+        write_raw_b32s(chan, u32s)
+        write_raw_b64s(chan, u64s)
+        write_raw_floats(chan, floats)
+        write_raw_doubles(chan, doubles)
+        end = chan.position
+        self.assertEqual(4 * 17 + 8 * 17 + 4 * 3 + 8 * 8, end)
+        chan.flip()
+
+        self.assertEqual(u32s, read_raw_b32s(chan, len(u32s)))
+        self.assertEqual(u64s, read_raw_b64s(chan, len(u64s)))
+        self.assertEqual(floats, read_raw_floats(chan, len(floats)))
+        self.assertEqual(doubles, read_raw_doubles(chan, len(doubles)))
+        self.assertEqual(end, chan.position)
+
+        # a batch must match the same values written one at a time
+        chan.position = 0
+        self.assertEqual(u32s[0], read_raw_b32(chan))
+        self.assertRaises(ValueError, read_raw_b64s, chan, LEN_BUFF)
+
 
 if __name__ == '__main__':
     unittest.main()
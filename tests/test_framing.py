@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# test_framing.py
+
+""" Test length-delimited framing of messages. """
+
+import io
+import os
+import tempfile
+import time
+import unittest
+
+from rnglib import SimpleRNG
+from wireops import WireopsError
+from wireops.enum import FieldTypes
+from wireops.framing import(
+    FrameWriter, FrameReader, iter_frames, build_frame_index, read_frame_at)
+from wireops.spec import MessageSpec
+
+LOG_ENTRY = MessageSpec('logEntry', [
+    ('timestamp', 0, FieldTypes.F_UINT32),
+    ('node_id', 1, FieldTypes.F_BYTES20),
+    ('length', 3, FieldTypes.V_UINT32),
+    ('path', 5, FieldTypes.L_STRING),
+])
+
+
+class TestFraming(unittest.TestCase):
+    """ Test length-delimited framing of messages. """
+
+    def setUp(self):
+        self.rng = SimpleRNG(time.time())
+
+    def tearDown(self):
+        pass
+
+    def make_payloads(self, count):
+        """ Return a list of random payloads of assorted sizes. """
+        sizes = [0, 1, 127, 128, 5000] + [
+            self.rng.next_int16(300) for _ in range(count - 5)]
+        return [bytes(self.rng.next_int16(256) for _ in range(size))
+                for size in sizes]
+
+    def test_round_trip(self):
+        """ Frames written come back in order, whatever the chunk size. """
+        payloads = self.make_payloads(50)
+        out = io.BytesIO()
+        with FrameWriter(out, buffer_size=256, index=True) as writer:
+            for payload in payloads:
+                writer.write(payload)
+        data = out.getvalue()
+        self.assertEqual(writer.offset, len(data))
+
+        for chunk_size in (1, 7, 4096):
+            frames = list(FrameReader(io.BytesIO(data), chunk_size))
+            self.assertEqual(payloads, frames)
+
+        frames = list(iter_frames(data, zero_copy=True))
+        self.assertIsInstance(frames[0], memoryview)
+        self.assertEqual(payloads, [bytes(frame) for frame in frames])
+
+        # the writer's index agrees with one built by scanning
+        fileobj = io.BytesIO(data)
+        index = build_frame_index(fileobj)
+        self.assertEqual(writer.index, index)
+        for nnn in (0, 4, 17, len(payloads) - 1):
+            self.assertEqual(payloads[nnn], read_frame_at(fileobj, index, nnn))
+
+    def test_messages(self):
+        """ Messages can be written and read through a spec. """
+        msgs = [{'timestamp': n, 'node_id': bytes(20), 'length': n * n,
+                 'path': '/x/%d' % n} for n in range(100)]
+        path = None
+        try:
+            with tempfile.NamedTemporaryFile(delete=False) as file:
+                path = file.name
+                with FrameWriter(file) as writer:
+                    for msg in msgs:
+                        writer.write_msg(LOG_ENTRY, msg)
+            with open(path, 'rb') as file:
+                self.assertEqual(msgs, list(FrameReader(file,
+                                                        spec=LOG_ENTRY)))
+        finally:
+            if path:
+                os.unlink(path)
+
+    def test_truncated(self):
+        """ A stream ending part way through a frame is an error. """
+        out = io.BytesIO()
+        with FrameWriter(out) as writer:
+            writer.write(b'abcdef')
+        data = out.getvalue()[:-1]
+        self.assertRaises(WireopsError, list, FrameReader(io.BytesIO(data)))
+        self.assertRaises(WireopsError, list, iter_frames(data))
+        self.assertRaises(WireopsError, build_frame_index, io.BytesIO(data))
+
+    def test_truncated_prefix(self):
+        """ A file ending part way through a length prefix is an error. """
+        out = io.BytesIO()
+        with FrameWriter(out) as writer:
+            writer.write(b'abc')
+            writer.write(bytes(200))        # a two-byte prefix
+        data = out.getvalue()[:5]           # keep one byte of it
+        self.assertEqual(0x80, data[-1] & 0x80)
+        for func in (build_frame_index,
+                     lambda fileobj: read_frame_at(fileobj, [4], 0),
+                     lambda fileobj: list(iter_frames(fileobj.getvalue()))):
+            with self.assertRaisesRegex(WireopsError,
+                                        'frame at offset 4 is truncated'):
+                func(io.BytesIO(data))
+
+
+if __name__ == '__main__':
+    unittest.main()
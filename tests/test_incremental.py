@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# test_incremental.py
+
+""" Test decoding data fed in arbitrary pieces. """
+
+import time
+import unittest
+
+from rnglib import SimpleRNG
+from wireops import WireopsError
+from wireops.chan import Channel
+from wireops.enum import FieldTypes, PrimTypes
+from wireops.fields import iter_fields
+from wireops.incremental import FieldDecoder, FrameDecoder
+from wireops.raw import write_raw_varint, write_packed_varint_field
+from wireops.spec import MessageSpec
+
+LEN_BUFF = 8192
+
+EVERYTHING = MessageSpec('everything', [
+    (ftype.sym, ftype.value + 1, ftype) for ftype in FieldTypes])
+
+MSG = {
+    'vbool': True, 'venum': 7, 'vuint32': 0xffffffff,
+    'vsint32': -192, 'vuint64': 0xffffffffffffffff,
+    'vsint64': -(1 << 63), 'fuint32': 0x80000000,
+    'fsint32': -15379, 'ffloat': 0.15625,
+    'fuint64': 0x8000000000000000, 'fsint64': -2, 'fdouble': 1e300,
+    'lstring': 'été', 'lbytes': b'', 'lmsg': bytes(300),
+    'fbytes16': bytes(range(16)), 'fbytes20': bytes(range(20)),
+    'fbytes32': bytes(range(32)), }
+
+
+class TestIncremental(unittest.TestCase):
+    """ Test decoding data fed in arbitrary pieces. """
+
+    def setUp(self):
+        self.rng = SimpleRNG(time.time())
+
+    def tearDown(self):
+        pass
+
+    def chunks(self, data):
+        """ Split data into pieces of random sizes, some empty. """
+        offset = 0
+        while offset < len(data):
+            size = self.rng.next_int16(40)
+            yield data[offset:offset + size]
+            offset += size
+
+    def test_fields(self):
+        """
+        Fields fed in pieces come out the same as those found by
+        iter_fields over the whole buffer.
+        """
+        chan = Channel(LEN_BUFF)
+        EVERYTHING.encode(chan, MSG)
+        write_packed_varint_field(chan, [1, 1 << 40], 99)
+        chan.flip()
+        data = bytes(chan.buffer[:chan.limit])
+
+        expected = []
+        for rec in iter_fields(chan):
+            if rec.ptype == PrimTypes.VARINT:
+                value = rec.decode(FieldTypes.V_UINT64)
+            elif rec.ptype == PrimTypes.B32:
+                value = rec.decode(FieldTypes.F_UINT32)
+            elif rec.ptype == PrimTypes.B64:
+                value = rec.decode(FieldTypes.F_UINT64)
+            else:
+                value = bytes(rec.payload())
+            expected.append((rec.field_nbr, rec.ptype, value))
+
+        for pieces in ([data], [data[i:i + 1] for i in range(len(data))],
+                       list(self.chunks(data))):
+            decoder = FieldDecoder()
+            fields = []
+            for piece in pieces:
+                fields.extend(decoder.feed(piece))
+            self.assertTrue(decoder.at_boundary)
+            decoder.close()
+            self.assertEqual(expected, fields)
+
+    def test_frames(self):
+        """ Length-preceded messages are emitted once complete. """
+        msgs = [dict(MSG, vuint32=n) for n in range(20)] + [{}]
+        chan = Channel(LEN_BUFF * 4)
+        for msg in msgs:
+            write_raw_varint(chan, EVERYTHING.size(msg))
+            EVERYTHING.encode(chan, msg)
+        data = bytes(chan.buffer[:chan.position])
+
+        decoder = FrameDecoder(EVERYTHING)
+        frames = []
+        for piece in self.chunks(data):
+            frames.extend(decoder.feed(piece))
+        decoder.close()
+        self.assertEqual(msgs, frames)
+
+        # without a spec the raw messages are returned
+        decoder = FrameDecoder()
+        frames = decoder.feed(data)
+        self.assertEqual(len(msgs), len(frames))
+        self.assertEqual(b'', frames[-1])
+
+    def test_partial(self):
+        """ A decoder knows when it holds part of a value. """
+        decoder = FrameDecoder()
+        self.assertEqual([], decoder.feed(b'\x05abc'))
+        self.assertFalse(decoder.at_boundary)
+        self.assertRaises(WireopsError, decoder.close)
+        self.assertEqual([b'abcde'], decoder.feed(b'de'))
+        self.assertTrue(decoder.at_boundary)
+
+        decoder = FieldDecoder()
+        self.assertEqual([], decoder.feed(b'\x08\xff'))
+        self.assertFalse(decoder.at_boundary)
+        self.assertRaises(WireopsError, decoder.feed, b'\xff' * 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
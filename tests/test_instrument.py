@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# test_instrument.py
+
+""" Test the opt-in instrumentation of typed and raw functions. """
+
+import time
+import unittest
+
+from rnglib import SimpleRNG
+from wireops import instrument, raw, spec, typed
+from wireops.columnar import decode_columns, encode_columns
+from wireops.enum import FieldTypes
+from wireops.raw import WireBuffer
+from wireops.typed import T_PUT_FUNCS, T_GET_FUNCS, T_LEN_FUNCS
+
+
+class TestInstrument(unittest.TestCase):
+    """ Test the opt-in instrumentation of typed and raw functions. """
+
+    def setUp(self):
+        self.rng = SimpleRNG(time.time())
+        instrument.reset()
+
+    def tearDown(self):
+        instrument.disable()
+
+    def test_swapping(self):
+        """ enable() swaps wrappers in; disable() restores originals. """
+        put = T_PUT_FUNCS[FieldTypes.V_UINT32.value]
+        write_raw_varint = raw.write_raw_varint
+        read_raw_varint = typed.read_raw_varint
+        reserve = WireBuffer.reserve
+
+        instrument.enable()
+        instrument.enable()                 # no effect
+        self.assertTrue(instrument.is_enabled())
+        self.assertIsNot(put, T_PUT_FUNCS[FieldTypes.V_UINT32.value])
+        self.assertIsNot(write_raw_varint, raw.write_raw_varint)
+        self.assertIsNot(read_raw_varint, typed.read_raw_varint)
+        self.assertIsNot(reserve, WireBuffer.reserve)
+
+        instrument.disable()
+        self.assertFalse(instrument.is_enabled())
+        self.assertIs(put, T_PUT_FUNCS[FieldTypes.V_UINT32.value])
+        self.assertIs(write_raw_varint, raw.write_raw_varint)
+        self.assertIs(read_raw_varint, typed.read_raw_varint)
+        self.assertIs(reserve, WireBuffer.reserve)
+
+    def test_counts(self):
+        """ Calls and bytes are counted per field type and primitive. """
+        # enough fields to overflow the 16 byte buffer below
+        count = 16 + self.rng.next_int16(32)
+        value = self.rng.next_int32()
+        ndx = FieldTypes.V_UINT32.value
+        instrument.enable()
+        chan = WireBuffer(16, auto_grow=True)
+        for _ in range(count):
+            T_PUT_FUNCS[ndx](chan, value, 1)
+            T_LEN_FUNCS[ndx](value, 1)
+        end = chan.position
+        chan.position = 0
+        for _ in range(count):
+            # call through the module: names imported here are not swapped
+            raw.read_field_hdr(chan)
+            self.assertEqual(value, T_GET_FUNCS[ndx](chan))
+        instrument.disable()
+
+        snap = instrument.snapshot()
+        field_len = T_LEN_FUNCS[ndx](value, 1)
+        counts = snap['typed']['vuint32']
+        self.assertEqual(count, counts['put']['calls'])
+        self.assertEqual(end, counts['put']['bytes'])
+        self.assertEqual(count * field_len, counts['len']['bytes'])
+        self.assertEqual(count, counts['get']['calls'])
+        self.assertEqual(end - count, counts['get']['bytes'])
+        self.assertTrue(counts['put']['seconds'] > 0)
+
+        self.assertEqual(count, snap['raw']['write_varint_field']['calls'])
+        self.assertEqual(count, snap['raw']['read_field_hdr']['calls'])
+        # once for each header and once for each value
+        self.assertEqual(2 * count,
+                         snap['raw']['read_raw_varint']['calls'])
+        # the 16 byte buffer had to grow at least once
+        self.assertTrue(snap['growth']['events'] >= 1)
+        self.assertEqual(chan.capacity - 16, snap['growth']['bytes'])
+
+        instrument.reset()
+        self.assertEqual({'typed': {}, 'raw': {},
+                          'growth': {'events': 0, 'bytes': 0}},
+                         instrument.snapshot())
+
+    def test_tables(self):
+        """
+        Raw functions held in module-level tables, directly or in a
+        partial, are counted, and restored by disable().
+        """
+        # pylint: disable=protected-access
+        puts = list(spec._VALUE_PUTS)
+        instrument.enable()
+        msg_spec = spec.MessageSpec('sample', [
+            ('tick', 0, FieldTypes.F_UINT32),
+            ('key', 1, FieldTypes.F_BYTES20), ])
+        count = 1 + self.rng.next_int16(16)
+        wb_ = encode_columns(msg_spec, {
+            'tick': list(range(count)),
+            'key': [bytes(self.rng.some_bytes(20)) for _ in range(count)]})
+        decode_columns(msg_spec, wb_.buffer, end=wb_.limit, offsets=True)
+        instrument.disable()
+        self.assertEqual(puts, spec._VALUE_PUTS)
+
+        snap = instrument.snapshot()['raw']
+        for name in ('write_raw_b32', 'write_raw_b160', 'read_raw_b32',
+                     'read_raw_b160'):
+            self.assertEqual(count, snap[name]['calls'], name)
+
+
+if __name__ == '__main__':
+    unittest.main()
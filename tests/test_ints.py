@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# test_ints.py
+
+""" Test normalization of ints to fixed-width integers. """
+
+import ctypes
+import time
+import unittest
+
+from rnglib import SimpleRNG
+from wireops.enum import FieldTypes
+from wireops.ints import(
+    as_uint16, as_int32, as_uint32, as_int64, as_uint64,
+    check_uint16, check_int32, check_uint32, check_int64, check_uint64)
+from wireops.raw import WireBuffer
+from wireops.spec import MessageSpec
+from wireops.typed import(
+    T_PUT_FUNCS, T_PUT_CHECKED_FUNCS,
+    encode_sint32, decode_sint32, encode_sint64, decode_sint64)
+
+EDGES = [0, 1, -1, 0x7fff, 0xffff, 0x10000, 0x7fffffff, 0x80000000,
+         0xffffffff, 1 << 32, -(1 << 31), -(1 << 31) - 1,
+         (1 << 63) - 1, 1 << 63, (1 << 64) - 1, 1 << 64,
+         -(1 << 63), -(1 << 63) - 1, 1 << 100, -(1 << 100)]
+
+# each checked function, the unchecked function that matches it in
+# range, and the range
+CHECKS = [
+    (check_uint16, as_uint16, 0, 0xffff),
+    (check_uint32, as_uint32, 0, 0xffffffff),
+    (check_int32, as_int32, -(1 << 31), (1 << 31) - 1),
+    (check_uint64, as_uint64, 0, (1 << 64) - 1),
+    (check_int64, as_int64, -(1 << 63), (1 << 63) - 1),
+]
+
+
+class TestInts(unittest.TestCase):
+    """ Test normalization of ints to fixed-width integers. """
+
+    def setUp(self):
+        self.rng = SimpleRNG(time.time())
+        self.values = EDGES + [
+            (self.rng.next_int64() << self.rng.next_int16(8)) *
+            (1 if self.rng.next_boolean() else -1) for _ in range(200)]
+
+    def tearDown(self):
+        pass
+
+    def test_unchecked(self):
+        """ Masking and shifting agrees with the ctypes casts. """
+        for value in self.values:
+            self.assertEqual(ctypes.c_uint16(value).value, as_uint16(value))
+            self.assertEqual(ctypes.c_uint32(value).value, as_uint32(value))
+            self.assertEqual(ctypes.c_int32(value).value, as_int32(value))
+            self.assertEqual(ctypes.c_uint64(value).value, as_uint64(value))
+            self.assertEqual(ctypes.c_int64(value).value, as_int64(value))
+
+    def test_checked(self):
+        """ Values in range pass; others raise. """
+        for value in self.values:
+            for check, cast, lowest, highest in CHECKS:
+                if lowest <= value <= highest:
+                    self.assertEqual(value, check(value))
+                    self.assertEqual(value, cast(value))
+                else:
+                    self.assertRaises(ValueError, check, value)
+        for check, _, _, _ in CHECKS:
+            self.assertRaises(TypeError, check, 1.0)
+            self.assertRaises(TypeError, check, '1')
+
+    def test_zigzag(self):
+        """ Zig-zag encoding round trips in range. """
+        for value in self.values:
+            if -(1 << 31) <= value < (1 << 31):
+                self.assertEqual(value, decode_sint32(encode_sint32(value)))
+            if -(1 << 63) <= value < (1 << 63):
+                self.assertEqual(value, decode_sint64(encode_sint64(value)))
+        self.assertEqual(1, encode_sint32(-1))
+        self.assertEqual(0xffffffff, encode_sint32(-(1 << 31)))
+        self.assertEqual(0xffffffffffffffff, encode_sint64(-(1 << 63)))
+
+    def test_checked_puts(self):
+        """ Checked puts write what unchecked puts do, or raise. """
+        for ftype, check in (
+                (FieldTypes.V_ENUM, check_uint16),
+                (FieldTypes.V_UINT32, check_uint32),
+                (FieldTypes.V_SINT32, check_int32),
+                (FieldTypes.V_UINT64, check_uint64),
+                (FieldTypes.V_SINT64, check_int64),
+                (FieldTypes.F_UINT32, check_uint32),
+                (FieldTypes.F_SINT32, check_int32),
+                (FieldTypes.F_UINT64, check_uint64),
+                (FieldTypes.F_SINT64, check_int64), ):
+            put = T_PUT_FUNCS[ftype.value]
+            put_checked = T_PUT_CHECKED_FUNCS[ftype.value]
+            self.assertIsNot(put, put_checked)
+            for value in self.values:
+                wb1 = WireBuffer(32)
+                wb2 = WireBuffer(32)
+                try:
+                    check(value)
+                except ValueError:
+                    self.assertRaises(ValueError, put_checked, wb2, value, 1)
+                    continue
+                put(wb1, value, 1)
+                put_checked(wb2, value, 1)
+                self.assertEqual(wb1.buffer, wb2.buffer)
+        self.assertIs(T_PUT_FUNCS[FieldTypes.L_STRING.value],
+                      T_PUT_CHECKED_FUNCS[FieldTypes.L_STRING.value])
+
+    def test_checked_spec(self):
+        """ A checked spec rejects what an unchecked spec truncates. """
+        fields = [('count', 0, FieldTypes.V_UINT32),
+                  ('delta', 1, FieldTypes.F_SINT32)]
+        spec = MessageSpec('sample', fields)
+        checked = MessageSpec('sample', fields, checked=True)
+        self.assertFalse(spec.checked)
+        self.assertTrue(checked.checked)
+        good = {'count': 7, 'delta': -7}
+        self.assertEqual(spec.encode_exact(good).buffer,
+                         checked.encode_exact(good).buffer)
+        for bad in ({'count': -1}, {'count': 1 << 32},
+                    {'delta': 1 << 31}):
+            spec.encode_exact(bad)
+            self.assertRaises(ValueError, checked.encode_exact, bad)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,13 +5,17 @@
 
 import time
 import unittest
+from array import array
 
 from rnglib import SimpleRNG
 from wireops.chan import Channel
-from wireops.enum import PrimTypes
+from wireops.enum import FieldTypes, PrimTypes
 from wireops.raw import(
-    field_hdr_val, read_field_hdr, length_as_varint,
-    read_raw_len_plus, write_len_plus_field,)
+    field_hdr_val, read_field_hdr, length_as_varint, bytes_len,
+    read_raw_len_plus, write_len_plus_field,
+    read_raw_b160, write_b160_field,)
+from wireops.spec import MessageSpec
+from wireops.typed import T_LEN_FUNCS, lbytes_get
 
 LEN_BUFF = 1024
 
@@ -82,6 +86,65 @@ class TestLenPlus(unittest.TestCase):
         self.round_trip('ndx_'.encode('utf8'))
         self.round_trip('should be a random string of bytes'.encode('utf8'))
 
+    def test_wide_items(self):
+        """
+        A buffer of items wider than a byte is prefixed with its length
+        in bytes, not in items.
+        """
+        values = array('I', [1, 2])
+        self.assertEqual(8, bytes_len(values))
+        self.assertEqual(3, bytes_len([1, 2, 3]))
+        chan = Channel(LEN_BUFF)
+        write_len_plus_field(chan, values, 3)
+        self.assertEqual(T_LEN_FUNCS[FieldTypes.L_BYTES.value](values, 3),
+                         chan.position)
+        chan.flip()
+        read_field_hdr(chan)
+        self.assertEqual(values.tobytes(), read_raw_len_plus(chan))
+
+        spec = MessageSpec('blob', [('data', 0, FieldTypes.L_BYTES)])
+        msg = {'data': values}
+        wb_ = spec.encode_exact(msg)
+        self.assertEqual(spec.size(msg), wb_.limit)
+        self.assertEqual({'data': values.tobytes()}, spec.decode_bytes(
+            bytes(wb_.buffer[:wb_.limit])))
+
+    def test_zero_copy(self):
+        """
+        Verify that zero-copy reads return views of the channel's buffer
+        while the default mode returns independent copies.
+        """
+        chan = Channel(LEN_BUFF)
+        payload = 'a longer string of bytes'.encode('utf8')
+        key = bytes(range(20))
+        write_len_plus_field(chan, payload, 1)
+        write_b160_field(chan, key, 2)
+        end = chan.position
+        chan.flip()
+
+        read_field_hdr(chan)
+        view = lbytes_get(chan, zero_copy=True)
+        self.assertIsInstance(view, memoryview)
+        self.assertEqual(payload, view)
+        read_field_hdr(chan)
+        key_view = read_raw_b160(chan, zero_copy=True)
+        self.assertEqual(key, key_view)
+        self.assertEqual(end, chan.position)
+
+        # views track the underlying buffer ...
+        chan.buffer[chan.position - 20] = 0xff
+        self.assertEqual(0xff, key_view[0])
+
+        # ... while copies do not
+        chan.position = 0
+        read_field_hdr(chan)
+        copy = read_raw_len_plus(chan)
+        self.assertIsInstance(copy, bytearray)
+        chan.buffer[chan.position - 1] = 0
+        self.assertEqual(payload, copy)
+        view.release()
+        key_view.release()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# test_mapped.py
+
+""" Test channels over memory-mapped files. """
+
+import os
+import tempfile
+import time
+import unittest
+
+from rnglib import SimpleRNG
+from wireops.enum import FieldTypes, PrimTypes
+from wireops.framing import FrameWriter, iter_frames
+from wireops.mapped import MappedBuffer
+from wireops.raw import(
+    read_field_hdr, read_raw_varint, read_raw_b64, read_raw_len_plus,
+    write_varint_field, write_b64_field, write_len_plus_field)
+from wireops.spec import MessageSpec
+
+LOG_ENTRY = MessageSpec('logEntry', [
+    ('timestamp', 0, FieldTypes.F_UINT32),
+    ('length', 3, FieldTypes.V_UINT32),
+    ('path', 5, FieldTypes.L_STRING),
+])
+
+
+class TestMapped(unittest.TestCase):
+    """ Test channels over memory-mapped files. """
+
+    def setUp(self):
+        self.rng = SimpleRNG(time.time())
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'data')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_read_write(self):
+        """ Fields written to a writable mapping can be read back. """
+        value = self.rng.next_int64()
+        text = self.rng.some_bytes(1 + self.rng.next_int16(200))
+        with MappedBuffer(self.path, writable=True, size=4096) as mbuf:
+            self.assertEqual(4096, mbuf.capacity)
+            self.assertEqual(4096, os.path.getsize(self.path))
+            write_varint_field(mbuf, 300, 1)
+            write_b64_field(mbuf, value, 2)
+            write_len_plus_field(mbuf, text, 3)
+            end = mbuf.position
+
+        with MappedBuffer(self.path) as mbuf:
+            self.assertFalse(mbuf.writable)
+            self.assertEqual((PrimTypes.VARINT, 1), read_field_hdr(mbuf))
+            self.assertEqual(300, read_raw_varint(mbuf))
+            self.assertEqual((PrimTypes.B64, 2), read_field_hdr(mbuf))
+            self.assertEqual(value, read_raw_b64(mbuf))
+            self.assertEqual((PrimTypes.LEN_PLUS, 3), read_field_hdr(mbuf))
+            self.assertEqual(text, read_raw_len_plus(mbuf))
+            self.assertEqual(end, mbuf.position)
+            self.assertRaises(TypeError, write_varint_field, mbuf, 1, 1)
+        self.assertTrue(mbuf.closed)
+
+    def test_fixed_size(self):
+        """ A mapping is never grown: writers raise instead. """
+        with MappedBuffer(self.path, writable=True, size=16) as mbuf:
+            write_len_plus_field(mbuf, bytes(13), 1)
+            self.assertRaises(ValueError, write_varint_field, mbuf, 1, 1)
+            self.assertRaises(ValueError, mbuf.reserve, 1)
+        self.assertRaises(ValueError, MappedBuffer, self.path, size=16)
+
+    def test_frames(self):
+        """ Frames and messages decode straight from the mapping. """
+        msgs = [{'timestamp': n, 'length': n * 3, 'path': '/p/%d' % n}
+                for n in range(500)]
+        with open(self.path, 'wb') as file:
+            with FrameWriter(file) as writer:
+                for msg in msgs:
+                    writer.write_msg(LOG_ENTRY, msg)
+
+        with MappedBuffer(self.path) as mbuf:
+            frames = list(iter_frames(mbuf.buffer, zero_copy=True))
+            self.assertIsInstance(frames[0], memoryview)
+            self.assertEqual(msgs, [LOG_ENTRY.decode_bytes(frame)
+                                    for frame in frames])
+            # views of the mapping must be released before it is closed
+            for frame in frames:
+                frame.release()
+            del frames
+
+            # a message may run right up to the end of the file
+            chan = mbuf.copy()
+            for msg in msgs:
+                len_ = read_raw_varint(chan)
+                self.assertEqual(msg, LOG_ENTRY.decode(
+                    chan, chan.position + len_))
+            self.assertEqual(mbuf.capacity, chan.position)
+
+
+if __name__ == '__main__':
+    unittest.main()
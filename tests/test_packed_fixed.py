@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# test_packed_fixed.py
+
+""" Test packed fields of fixed length values. """
+
+import pickle
+import struct
+import time
+import unittest
+from array import array
+
+from rnglib import SimpleRNG
+from wireops import WireopsError
+from wireops.chan import Channel
+from wireops.enum import FieldTypes, PrimTypes
+from wireops.fields import iter_fields
+from wireops.raw import(
+    PACKED_FIXED_TYPES, packed_fixed_len, read_field_hdr,
+    read_raw_packed_fixed, write_packed_fixed_field, WireBuffer)
+from wireops.spec import MessageSpec, PACKED
+
+LEN_BUFF = 1 << 16
+
+
+class TestPackedFixed(unittest.TestCase):
+    """ Test packed fields of fixed length values. """
+
+    def setUp(self):
+        self.rng = SimpleRNG(time.time())
+
+    def tearDown(self):
+        pass
+
+    def random_values(self, ftype, count):
+        """ Return count random values which fit ftype exactly. """
+        code = PACKED_FIXED_TYPES[ftype]
+        if code in 'fd':
+            # round trip through the wire format so floats compare equal
+            values = [self.rng.next_int32() / 7.0 for _ in range(count)]
+            packed = struct.pack('<%d%s' % (count, code), *values)
+            return list(struct.unpack('<%d%s' % (count, code), packed))
+        size = struct.calcsize(code)
+        vals = [self.rng.next_int64() & ((1 << (8 * size)) - 1)
+                for _ in range(count)]
+        if code.islower():
+            top = 1 << (8 * size - 1)
+            vals = [((v ^ top) - top) for v in vals]
+        return vals
+
+    def test_round_trip(self):
+        """ Write and read back each packable type, copied and not. """
+        for ftype, code in PACKED_FIXED_TYPES.items():
+            count = 1 + self.rng.next_int16(64)
+            values = self.random_values(ftype, count)
+            chan = Channel(LEN_BUFF)
+            write_packed_fixed_field(chan, values, ftype, 3)
+            self.assertEqual(chan.position,
+                             1 + packed_fixed_len(values, ftype))
+
+            # the wire format is little-endian whatever the host
+            chan.flip()
+            self.assertEqual((PrimTypes.LEN_PLUS, 3), read_field_hdr(chan))
+            start = chan.position
+            copied = read_raw_packed_fixed(chan, ftype)
+            self.assertIsInstance(copied, array)
+            self.assertEqual(code, copied.typecode)
+            self.assertEqual(values, copied.tolist())
+            end = chan.position
+            self.assertEqual(
+                struct.pack('<%d%s' % (count, code), *values),
+                bytes(chan.buffer[end - len(copied) * copied.itemsize:end]))
+
+            chan.position = start
+            view = read_raw_packed_fixed(chan, ftype, zero_copy=True)
+            self.assertEqual(values, view.tolist())
+            self.assertEqual(end, chan.position)
+            if isinstance(view, memoryview):
+                self.assertEqual(code, view.format)
+                view.release()
+
+    def test_array_input(self):
+        """ An array of the right typecode is written as is. """
+        values = array('d', [self.rng.next_int32() * 0.5
+                             for _ in range(1000)])
+        chan = Channel(LEN_BUFF)
+        write_packed_fixed_field(chan, values, FieldTypes.F_DOUBLE, 1)
+        chan.flip()
+        read_field_hdr(chan)
+        self.assertEqual(values,
+                         read_raw_packed_fixed(chan, FieldTypes.F_DOUBLE))
+
+        # an array of another typecode is converted
+        chan = Channel(LEN_BUFF)
+        ints = array('i', [1, -2, 3])
+        write_packed_fixed_field(chan, ints, FieldTypes.F_FLOAT, 1)
+        chan.flip()
+        read_field_hdr(chan)
+        self.assertEqual([1.0, -2.0, 3.0],
+                         read_raw_packed_fixed(
+                             chan, FieldTypes.F_FLOAT).tolist())
+
+    def test_bad_input(self):
+        """ Unpackable types, bad values, and bad lengths raise. """
+        chan = Channel(LEN_BUFF)
+        with self.assertRaises(WireopsError):
+            write_packed_fixed_field(chan, [1], FieldTypes.V_UINT32, 1)
+        with self.assertRaises(ValueError):
+            write_packed_fixed_field(chan, [-1], FieldTypes.F_UINT32, 1)
+        # nothing was written
+        self.assertEqual(0, chan.position)
+
+        chan.buffer[0:6] = b'\x05abcde'
+        chan.position = 0
+        with self.assertRaises(ValueError):
+            read_raw_packed_fixed(chan, FieldTypes.F_UINT32)
+
+    def test_growth(self):
+        """ An auto_grow buffer grows to hold a long packed field. """
+        values = self.random_values(FieldTypes.F_FLOAT, 4096)
+        wb_ = WireBuffer(16, auto_grow=True)
+        write_packed_fixed_field(wb_, values, FieldTypes.F_FLOAT, 1)
+        wb_.position = 0
+        read_field_hdr(wb_)
+        self.assertEqual(values, read_raw_packed_fixed(
+            wb_, FieldTypes.F_FLOAT).tolist())
+
+    def test_field_record(self):
+        """ FieldRecord.packed returns the values in place. """
+        values = self.random_values(FieldTypes.F_UINT64, 100)
+        chan = Channel(LEN_BUFF)
+        write_packed_fixed_field(chan, values, FieldTypes.F_UINT64, 7)
+        chan.flip()
+        rec, = list(iter_fields(chan))
+        self.assertEqual(7, rec.field_nbr)
+        self.assertEqual(values, rec.packed(FieldTypes.F_UINT64).tolist())
+        with self.assertRaises(WireopsError):
+            rec.packed(FieldTypes.F_BYTES32)
+        # the same 800 bytes viewed as 4-byte values
+        self.assertEqual(200, len(rec.packed(FieldTypes.F_UINT32)))
+
+    def test_spec(self):
+        """ A spec encodes and decodes packed fields. """
+        spec = MessageSpec('telemetry', [
+            ('sensor', 0, FieldTypes.V_UINT32),
+            ('samples', 1, FieldTypes.F_FLOAT, PACKED),
+            ('ticks', 2, FieldTypes.F_SINT64, PACKED),
+        ])
+        msg = {'sensor': 9,
+               'samples': self.random_values(FieldTypes.F_FLOAT, 2000),
+               'ticks': array('q', self.random_values(
+                   FieldTypes.F_SINT64, 10))}
+        wb_ = spec.encode_exact(msg)
+        self.assertEqual(spec.size(msg), wb_.position)
+        wb_.position = 0
+        out = spec.decode(wb_)
+        self.assertEqual(9, out['sensor'])
+        self.assertEqual(msg['samples'], out['samples'].tolist())
+        self.assertEqual(msg['ticks'], out['ticks'])
+
+        # decoded values are copies which outlive the buffer
+        out = spec.decode_bytes(bytes(wb_.buffer[:wb_.limit]))
+        self.assertEqual(msg['ticks'], pickle.loads(pickle.dumps(out))[
+            'ticks'])
+        spec2 = pickle.loads(pickle.dumps(spec))
+        self.assertEqual(out, spec2.decode_bytes(
+            bytes(wb_.buffer[:wb_.limit])))
+
+        with self.assertRaises(WireopsError):
+            MessageSpec('bad', [('name', 0, FieldTypes.L_STRING, PACKED)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# test_packed_varint.py
+
+""" Test bulk and packed varint operations. """
+
+import time
+import unittest
+
+from rnglib import SimpleRNG
+from wireops.chan import Channel
+from wireops.enum import PrimTypes
+from wireops.raw import(
+    read_field_hdr, length_as_varint, read_raw_varint, write_raw_varint,
+    read_varints, write_varints,
+    read_raw_packed_varint, write_packed_varint_field,)
+
+LEN_BUFF = 4096
+
+BORDER_VALUES = [
+    0, 42, 0x7f, 0x80, 0x3fff, 0x4000, 0x1fffff, 0x200000,
+    0xfffffff, 0x10000000, 0x7ffffffff, 0x800000000,
+    0x7fffffffffffffff, 0x8000000000000000, 0xffffffffffffffff, ]
+
+
+class TestPackedVarint(unittest.TestCase):
+    """ Test bulk and packed varint operations. """
+
+    def setUp(self):
+        self.rng = SimpleRNG(time.time())
+
+    def tearDown(self):
+        pass
+
+    def test_bulk_matches_single(self):
+        """
+        Verify that write_varints produces the same bytes as repeated
+        calls to write_raw_varint, and that read_varints reads them back.
+        """
+        values = BORDER_VALUES + [self.rng.next_int64() for _ in range(64)]
+
+        chan = Channel(LEN_BUFF)
+        for value in values:
+            write_raw_varint(chan, value)
+        expected = chan.buffer[:chan.position]
+
+        chan2 = Channel(LEN_BUFF)
+        write_varints(chan2, values)
+        self.assertEqual(chan.position, chan2.position)
+        self.assertEqual(expected, chan2.buffer[:chan2.position])
+
+        chan2.flip()
+        self.assertEqual(values, list(read_varints(chan2, len(values))))
+        self.assertEqual(chan.position, chan2.position)
+
+    def test_negative_values(self):
+        """ Negative values are written as 64 bit unsigned numbers. """
+        chan = Channel(LEN_BUFF)
+        write_varints(chan, [-1, -2])
+        chan.flip()
+        self.assertEqual([0xffffffffffffffff, 0xfffffffffffffffe],
+                         list(read_varints(chan, 2)))
+
+    def test_overflow(self):
+        """ Writing more than fits in the buffer raises ValueError. """
+        chan = Channel(8)
+        self.assertRaises(ValueError, write_varints, chan, [1 << 40] * 4)
+
+    def test_packed_field(self):
+        """ Round-trip a packed varint field. """
+        values = BORDER_VALUES + [self.rng.next_int32() for _ in range(64)]
+        field_nbr = 1 + self.rng.next_int16(1024)
+
+        chan = Channel(LEN_BUFF)
+        write_packed_varint_field(chan, values, field_nbr)
+        end = chan.position
+        chan.flip()
+
+        (ptype, field_nbr2) = read_field_hdr(chan)
+        self.assertEqual(PrimTypes.PACKED_VARINT, ptype)
+        self.assertEqual(field_nbr, field_nbr2)
+        self.assertEqual(values, list(read_raw_packed_varint(chan)))
+        self.assertEqual(end, chan.position)
+
+        # the length prefix counts bytes, not values
+        chan.position = 0
+        read_field_hdr(chan)
+        self.assertEqual(sum(length_as_varint(v) for v in values),
+                         read_raw_varint(chan))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# test_parallel.py
+
+""" Test decoding framed files in a process pool. """
+
+import os
+import pickle
+import tempfile
+import time
+import unittest
+
+from rnglib import SimpleRNG
+from wireops import WireopsError
+from wireops.enum import FieldTypes
+from wireops.framing import FrameWriter, build_frame_index
+from wireops.parallel import split_frames, decode_range, decode_file
+from wireops.spec import MessageSpec
+
+POINT = MessageSpec('point', [
+    ('x', 0, FieldTypes.V_SINT32),
+    ('y', 1, FieldTypes.V_SINT32),
+])
+LOG_ENTRY = MessageSpec('logEntry', [
+    ('timestamp', 0, FieldTypes.F_UINT32),
+    ('length', 3, FieldTypes.V_UINT32),
+    ('path', 5, FieldTypes.L_STRING),
+    ('where', 6, FieldTypes.L_MSG, POINT),
+])
+
+
+class TestParallel(unittest.TestCase):
+    """ Test decoding framed files in a process pool. """
+
+    def setUp(self):
+        self.rng = SimpleRNG(time.time())
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'archive')
+        self.msgs = [
+            {'timestamp': n, 'length': self.rng.next_int32(),
+             'path': '/%x' % self.rng.next_int64(),
+             'where': {'x': n, 'y': -n}}
+            for n in range(2000)]
+        with open(self.path, 'wb') as file:
+            with FrameWriter(file, index=True) as writer:
+                for msg in self.msgs:
+                    writer.write_msg(LOG_ENTRY, msg)
+        self.index = writer.index
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_pickle_spec(self):
+        """ A spec survives pickling, nested specs included. """
+        spec = pickle.loads(pickle.dumps(LOG_ENTRY))
+        self.assertEqual(LOG_ENTRY.name, spec.name)
+        self.assertEqual(self.msgs[7], spec.decode_bytes(
+            LOG_ENTRY.encode_exact(self.msgs[7]).buffer[
+                :LOG_ENTRY.size(self.msgs[7])]))
+
+    def test_split(self):
+        """ Ranges cover the file and begin on frame boundaries. """
+        size = os.path.getsize(self.path)
+        with open(self.path, 'rb') as file:
+            boundaries = set(build_frame_index(file))
+        for index in (None, self.index):
+            for nnn in (1, 3, 16, 5000):
+                ranges = split_frames(self.path, nnn, index)
+                self.assertTrue(len(ranges) <= nnn)
+                self.assertEqual(0, ranges[0][0])
+                self.assertEqual(size, ranges[-1][1])
+                for (_, end), (start, _) in zip(ranges, ranges[1:]):
+                    self.assertEqual(end, start)
+                    self.assertIn(start, boundaries)
+                decoded = []
+                for start, end in ranges:
+                    decoded.extend(
+                        decode_range(self.path, LOG_ENTRY, start, end))
+                self.assertEqual(self.msgs, decoded)
+
+    def test_truncated_prefix(self):
+        """ A file ending within a length prefix raises WireopsError. """
+        with open(self.path, 'wb') as file:
+            # an empty frame, then a prefix cut short
+            file.write(b'\x00\xff\xff')
+        with self.assertRaisesRegex(WireopsError, 'offset 1 is truncated'):
+            split_frames(self.path, 3)
+        with self.assertRaisesRegex(WireopsError, 'offset 1 is truncated'):
+            decode_range(self.path, None, 0, 3)
+
+    def test_decode_file(self):
+        """ Decode in a pool, in order and out of order. """
+        self.assertEqual(self.msgs, list(decode_file(
+            self.path, LOG_ENTRY, max_workers=2)))
+        unordered = list(decode_file(self.path, LOG_ENTRY, max_workers=2,
+                                     chunks=7, ordered=False))
+        self.assertEqual(self.msgs, sorted(
+            unordered, key=lambda msg: msg['timestamp']))
+        payloads = list(decode_file(self.path, max_workers=2,
+                                    index=self.index))
+        self.assertEqual(self.msgs, [LOG_ENTRY.decode_bytes(payload)
+                                     for payload in payloads])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# test_policy.py
+
+""" Test decoding untrusted input under a DecodePolicy. """
+
+import time
+import unittest
+
+from rnglib import SimpleRNG
+from wireops import WireopsError
+from wireops.enum import FieldTypes, PrimTypes
+from wireops.fields import iter_fields
+from wireops.incremental import FrameDecoder
+from wireops.policy import DecodeLimitError, DecodePolicy
+from wireops.raw import(
+    field_hdr_bytes, write_raw_varint, write_len_plus_field, WireBuffer)
+from wireops.spec import MessageSpec
+
+NODE = MessageSpec('node', [
+    ('value', 0, FieldTypes.V_SINT64),
+    ('label', 1, FieldTypes.L_STRING),
+])
+
+
+def make_tree(depth):
+    """
+    Return a spec for messages nested depth deep, and such a message.
+    """
+    spec = NODE
+    msg = {'value': -1, 'label': 'leaf'}
+    for level in range(depth - 1):
+        spec = MessageSpec('level%d' % level, [
+            ('value', 0, FieldTypes.V_SINT64),
+            ('child', 1, FieldTypes.L_MSG, spec)])
+        msg = {'value': level, 'child': msg}
+    return spec, msg
+
+
+def encode(spec, msg):
+    """ Return msg encoded as bytes. """
+    return bytes(spec.encode_exact(msg).buffer[:spec.size(msg)])
+
+
+class TestPolicy(unittest.TestCase):
+    """ Test decoding untrusted input under a DecodePolicy. """
+
+    def setUp(self):
+        self.rng = SimpleRNG(time.time())
+
+    def tearDown(self):
+        pass
+
+    def test_agrees(self):
+        """ Good input decodes the same with or without a policy. """
+        spec, msg = make_tree(5)
+        data = encode(spec, msg)
+        policy = DecodePolicy()
+        self.assertEqual(msg, spec.decode_bytes(data))
+        self.assertEqual(msg, spec.decode_bytes(data, policy))
+        chan = WireBuffer(len(data) + 1, bytearray(data))
+        self.assertEqual(msg, spec.decode(chan, len(data), policy))
+        self.assertEqual(len(data), chan.position)
+        self.assertEqual(
+            [(rec.field_nbr, rec.offset, rec.length)
+             for rec in iter_fields(chan.copy(), len(data))],
+            [(rec.field_nbr, rec.offset, rec.length)
+             for rec in iter_fields(chan.copy(), len(data), policy=policy)])
+
+    def test_depth_and_fields(self):
+        """ Deep nesting and too many fields are refused. """
+        spec, msg = make_tree(6)
+        data = encode(spec, msg)
+        spec.decode_bytes(data, DecodePolicy(max_depth=6))
+        self.assertRaises(DecodeLimitError, spec.decode_bytes, data,
+                          DecodePolicy(max_depth=5))
+        # two fields at each of five levels, and two in the leaf
+        spec.decode_bytes(data, DecodePolicy(max_fields=12))
+        self.assertRaises(DecodeLimitError, spec.decode_bytes, data,
+                          DecodePolicy(max_fields=11))
+        chan = WireBuffer(len(data) + 1, bytearray(data))
+        self.assertRaises(DecodeLimitError, list, iter_fields(
+            chan, len(data), policy=DecodePolicy(max_fields=1)))
+
+    def test_hostile(self):
+        """ Overlong varints and huge declared lengths are refused. """
+        label_hdr = field_hdr_bytes(1, PrimTypes.LEN_PLUS)
+        policy = DecodePolicy(max_len_plus=1000)
+
+        # a length prefix claiming far more than the limit
+        wb_ = WireBuffer(64)
+        write_len_plus_field(wb_, b'x' * 8, 1)
+        good = bytes(wb_.buffer[:wb_.position])
+        huge = label_hdr + b'\xff\xff\xff\xff\x0f' + b'x' * 8
+        self.assertEqual({'label': 'xxxxxxxx'},
+                         NODE.decode_bytes(good, policy))
+        self.assertRaises(DecodeLimitError, NODE.decode_bytes, huge, policy)
+
+        # a length within the limit but beyond the message
+        short = label_hdr + b'\x40' + b'x' * 8
+        self.assertRaises(WireopsError, NODE.decode_bytes, short, policy)
+
+        # an endless varint
+        endless = field_hdr_bytes(0, PrimTypes.VARINT) + b'\xff' * 100
+        self.assertRaises(DecodeLimitError, NODE.decode_bytes, endless,
+                          policy)
+        self.assertRaises(DecodeLimitError, NODE.decode_bytes,
+                          b'\x00\xff\x01', DecodePolicy(max_varint_bytes=1))
+
+        # a frame announcing more than the limit is refused at once
+        decoder = FrameDecoder(NODE, policy)
+        wb_ = WireBuffer(16)
+        write_raw_varint(wb_, 1 << 30)
+        self.assertRaises(DecodeLimitError, decoder.feed,
+                          wb_.buffer[:wb_.position])
+        decoder = FrameDecoder(NODE, policy)
+        self.assertRaises(DecodeLimitError, decoder.feed,
+                          bytes([len(huge)]) + huge)
+
+        # so is a frame length prefix longer than max_varint_bytes,
+        # even one split across chunks
+        decoder = FrameDecoder(NODE, DecodePolicy(max_varint_bytes=2))
+        self.assertEqual([], decoder.feed(b'\x80'))
+        self.assertRaises(DecodeLimitError, decoder.feed, b'\x80')
+        decoder = FrameDecoder(NODE, DecodePolicy(max_varint_bytes=2))
+        self.assertEqual([{}], decoder.feed(b'\x80\x00'))
+
+    def test_bad_policy(self):
+        """ Limits must make sense. """
+        self.assertRaises(ValueError, DecodePolicy, max_varint_bytes=0)
+        self.assertRaises(ValueError, DecodePolicy, max_varint_bytes=11)
+        self.assertRaises(ValueError, DecodePolicy, max_depth=-1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# test_pool.py
+
+""" Test the pool of reusable WireBuffers. """
+
+import threading
+import time
+import unittest
+
+from rnglib import SimpleRNG
+from wireops.pool import WireBufferPool
+from wireops.raw import write_raw_bytes
+
+
+class TestPool(unittest.TestCase):
+    """ Test the pool of reusable WireBuffers. """
+
+    def setUp(self):
+        self.rng = SimpleRNG(time.time())
+
+    def tearDown(self):
+        pass
+
+    def test_size_classes(self):
+        """ Buffers are reused within a size class only. """
+        pool = WireBufferPool(max_per_class=2)
+        wb_ = pool.acquire(1000)
+        self.assertEqual(1024, wb_.capacity)
+        self.assertEqual((0, 1), (pool.hits, pool.misses))
+
+        wb_.position = 100
+        pool.release(wb_)
+        self.assertEqual({1024: 1}, pool.free_counts())
+
+        self.assertIs(wb_, pool.acquire(513))
+        self.assertEqual(0, wb_.position)
+        self.assertEqual(wb_.capacity, wb_.limit)
+        self.assertEqual((1, 1), (pool.hits, pool.misses))
+
+        # a different size class misses
+        other = pool.acquire(2048)
+        self.assertIsNot(wb_, other)
+        self.assertEqual((1, 2), (pool.hits, pool.misses))
+
+    def test_cap(self):
+        """ No more than max_per_class free buffers are kept. """
+        pool = WireBufferPool(max_per_class=2)
+        buffers = [pool.acquire(64) for _ in range(3)]
+        for wb_ in buffers:
+            pool.release(wb_)
+        self.assertEqual({64: 2}, pool.free_counts())
+        self.assertEqual(1, pool.discards)
+        pool.clear()
+        self.assertEqual({}, pool.free_counts())
+
+    def test_context_manager(self):
+        """ Buffers are released even if the body raises. """
+        pool = WireBufferPool(auto_grow=True)
+        with pool.buffer(16) as wb_:
+            self.assertTrue(wb_.auto_grow)
+            write_raw_bytes(wb_, bytes(100))
+        # the buffer grew, so it is filed under its new capacity
+        self.assertEqual({128: 1}, pool.free_counts())
+        try:
+            with pool.buffer(128) as wb2:
+                self.assertIs(wb_, wb2)
+                raise RuntimeError('oops')
+        except RuntimeError:
+            pass
+        self.assertEqual({128: 1}, pool.free_counts())
+
+    def test_threads(self):
+        """ The pool can be shared by several threads. """
+        pool = WireBufferPool(max_per_class=4)
+        sizes = [1 << (4 + self.rng.next_int16(6)) for _ in range(8)]
+
+        def worker():
+            for _ in range(200):
+                for size in sizes:
+                    with pool.buffer(size) as wb_:
+                        wb_.position = size // 2
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(4 * 200 * len(sizes), pool.hits + pool.misses)
+        for count in pool.free_counts().values():
+            self.assertTrue(count <= 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
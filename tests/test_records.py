@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# test_records.py
+
+""" Test record classes generated from message specs. """
+
+import gc
+import time
+import unittest
+from array import array
+
+from rnglib import SimpleRNG
+from wireops import WireopsError
+from wireops.enum import FieldTypes
+from wireops.raw import WireBuffer
+from wireops import records
+from wireops.records import record_class
+from wireops.spec import MessageSpec, PACKED
+from wireops.typed import T_LEN_FUNCS
+
+LOG_ENTRY = MessageSpec('logEntry', [
+    ('timestamp', 0, FieldTypes.F_UINT32),
+    ('node_id', 1, FieldTypes.F_BYTES20),
+    ('key', 2, FieldTypes.F_BYTES20),
+    ('length', 3, FieldTypes.V_UINT32),
+    ('by', 4, FieldTypes.L_STRING),
+    ('path', 5, FieldTypes.L_STRING),
+])
+
+POINT = MessageSpec('point', [
+    ('x', 0, FieldTypes.V_SINT32),
+    ('y', 1, FieldTypes.V_SINT32),
+])
+
+TRACK = MessageSpec('track', [
+    ('name', 0, FieldTypes.L_STRING),
+    ('start', 1, FieldTypes.L_MSG, POINT),
+    ('end', 2, FieldTypes.L_MSG, POINT),
+    ('speeds', 3, FieldTypes.F_FLOAT, PACKED),
+])
+
+
+class TestRecords(unittest.TestCase):
+    """ Test record classes generated from message specs. """
+
+    def setUp(self):
+        self.rng = SimpleRNG(time.time())
+
+    def tearDown(self):
+        pass
+
+    def make_log_entry(self):
+        """ Return a random logEntry as a dict. """
+        rng = self.rng
+        return {
+            'timestamp': rng.next_int32(),
+            'node_id': bytearray(rng.some_bytes(20)),
+            'key': bytearray(rng.some_bytes(20)),
+            'length': rng.next_int32(),
+            'by': 'who%d' % rng.next_int16(),
+            'path': '/var/é/%d' % rng.next_int16(),
+        }
+
+    def test_class(self):
+        """ A class has a slot per field and is generated once. """
+        cls = record_class(LOG_ENTRY)
+        self.assertIs(cls, record_class(LOG_ENTRY))
+        self.assertEqual('logEntry', cls.__name__)
+        self.assertEqual(('timestamp', 'node_id', 'key', 'length', 'by',
+                          'path'), cls.__slots__)
+        rec = cls(length=3)
+        self.assertIsNone(rec.by)
+        with self.assertRaises(AttributeError):
+            rec.nonesuch = 1
+
+    def test_field_named_self(self):
+        """ A field may be named self. """
+        cls = record_class(MessageSpec('node', [
+            ('self', 0, FieldTypes.V_UINT32),
+            ('chan', 1, FieldTypes.V_UINT32)]))
+        rec = cls(self=3, chan=4)
+        self.assertEqual({'self': 3, 'chan': 4}, rec.as_dict())
+        self.assertEqual(rec, cls.decode_bytes(b'\x00\x03\x08\x04'))
+
+    def test_matches_spec(self):
+        """ Records encode and decode exactly as the spec does. """
+        cls = record_class(LOG_ENTRY)
+        msg = self.make_log_entry()
+        rec = cls(**msg)
+        self.assertEqual(LOG_ENTRY.size(msg), rec.wire_len())
+
+        wb_ = WireBuffer(256)
+        rec.encode_into(wb_)
+        expected = LOG_ENTRY.encode_exact(msg)
+        self.assertEqual(expected.buffer[:expected.limit],
+                         wb_.buffer[:wb_.position])
+
+        wb_.limit = wb_.position
+        wb_.position = 0
+        rec2 = cls.decode_from(wb_)
+        self.assertEqual(rec, rec2)
+        self.assertEqual(msg, rec2.as_dict())
+        self.assertEqual(rec, cls.decode_bytes(
+            bytes(expected.buffer[:expected.limit])))
+
+    def test_lmsg_len(self):
+        """ The typed L_MSG length function sizes a record. """
+        rec = record_class(POINT)(x=300, y=-2)
+        wb_ = WireBuffer(16)
+        rec.encode_into(wb_)
+        self.assertEqual(2 + wb_.position,
+                         T_LEN_FUNCS[FieldTypes.L_MSG.value](rec, 1))
+
+    def test_nested_reuse(self):
+        """ decode_into reuses the record and its nested records. """
+        track = record_class(TRACK)
+        point = record_class(POINT)
+        recs = [track(name='t%d' % n,
+                      start=point(x=n, y=-n),
+                      end=point(x=-n) if n % 2 else None,
+                      speeds=array('f', [n, n + 0.5]))
+                for n in range(8)]
+        wb_ = WireBuffer(16, auto_grow=True)
+        for rec in recs:
+            rec.encode_into(wb_)
+        ends = []
+        wb_.position = 0
+        for rec in recs:
+            ends.append(wb_.position + rec.wire_len())
+            wb_.position = ends[-1]
+
+        out = track()
+        start = None
+        wb_.position = 0
+        for rec, end in zip(recs, ends):
+            self.assertIs(out, out.decode_into(wb_, end))
+            self.assertEqual(rec, out)
+            if start is None:
+                start = out.start
+            self.assertIs(start, out.start)
+        self.assertEqual(TRACK.decode_bytes(
+            bytes(wb_.buffer[ends[-2]:ends[-1]])), out.as_dict())
+
+    def test_nested_sized_once(self):
+        """ encode_into() sizes each nested record just once. """
+        segment = MessageSpec('segment', [
+            ('start', 0, FieldTypes.L_MSG, POINT),
+            ('end', 1, FieldTypes.L_MSG, POINT),
+        ])
+        route = MessageSpec('route', [
+            ('name', 0, FieldTypes.L_STRING),
+            ('leg', 1, FieldTypes.L_MSG, segment),
+        ])
+        point = record_class(POINT)
+        rec = record_class(route)(
+            name='r', leg=record_class(segment)(
+                start=point(x=1, y=2), end=point(x=-3)))
+        calls = []
+        original = point._size_into
+        point._size_into = lambda *args: calls.append(1) or original(*args)
+        try:
+            wb_ = WireBuffer(64)
+            rec.encode_into(wb_)
+        finally:
+            point._size_into = original
+        self.assertEqual(2, len(calls))
+        msg = rec.as_dict()
+        self.assertEqual(route.size(msg), wb_.position)
+        self.assertEqual(route.encode_exact(msg).buffer[:wb_.position],
+                         wb_.buffer[:wb_.position])
+
+    def test_class_cache(self):
+        """ A class is dropped from the cache with its spec. """
+        spec = MessageSpec('transient', [('n', 0, FieldTypes.V_UINT32)])
+        cache = records._CLASSES          # pylint: disable=protected-access
+        record_class(spec)
+        count = len(cache)
+        del spec
+        gc.collect()
+        self.assertEqual(count - 1, len(cache))
+
+    def test_errors(self):
+        """ Bad field names and bad input raise WireopsError. """
+        with self.assertRaises(WireopsError):
+            record_class(MessageSpec('bad', [
+                ('wire_len', 0, FieldTypes.V_UINT32)]))
+        cls = record_class(POINT)
+        with self.assertRaises(WireopsError):
+            cls.decode_bytes(b'\x18\x01')       # field 3
+        with self.assertRaises(ValueError):
+            cls.decode_bytes(b'\x08')           # truncated
+
+
+if __name__ == '__main__':
+    unittest.main()
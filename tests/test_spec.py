@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# test_spec.py
+
+""" Test compiled message specifications. """
+
+import time
+import unittest
+
+from rnglib import SimpleRNG
+from wireops import WireopsError
+from wireops.chan import Channel
+from wireops.enum import FieldTypes
+from wireops.spec import MessageSpec
+from wireops.typed import T_LEN_FUNCS, T_PUT_FUNCS
+
+LEN_BUFF = 4096
+
+LOG_ENTRY = MessageSpec('logEntry', [
+    ('timestamp', 0, FieldTypes.F_UINT32),
+    ('node_id', 1, FieldTypes.F_BYTES20),
+    ('key', 2, FieldTypes.F_BYTES20),
+    ('length', 3, FieldTypes.V_UINT32),
+    ('by', 4, FieldTypes.L_STRING),
+    ('path', 5, FieldTypes.L_STRING),
+])
+
+EVERYTHING = MessageSpec('everything', [
+    (ftype.sym, ftype.value + 1, ftype) for ftype in FieldTypes
+    if ftype != FieldTypes.L_MSG])
+
+ENVELOPE = MessageSpec('envelope', [
+    ('seq', 1, FieldTypes.V_UINT64),
+    ('entry', 2, FieldTypes.L_MSG, LOG_ENTRY),
+    ('trailer', 3, FieldTypes.L_BYTES),
+])
+
+
+class TestSpec(unittest.TestCase):
+    """ Test compiled message specifications. """
+
+    def setUp(self):
+        self.rng = SimpleRNG(time.time())
+
+    def tearDown(self):
+        pass
+
+    def make_log_entry(self):
+        """ Return a logEntry message with random contents. """
+        return {
+            'timestamp': self.rng.next_int32(),
+            'node_id': bytes(self.rng.next_int16(256) for _ in range(20)),
+            'key': bytes(self.rng.next_int16(256) for _ in range(20)),
+            'length': self.rng.next_int32(),
+            'by': self.rng.next_file_name(16),
+            'path': '/var/log/été/' + self.rng.next_file_name(32),
+        }
+
+    def round_trip(self, spec, msg):
+        """ Encode and decode msg, checking the size calculation. """
+        chan = Channel(LEN_BUFF)
+        spec.encode(chan, msg)
+        self.assertEqual(spec.size(msg), chan.position)
+        chan.flip()
+        decoded = spec.decode(chan)
+        self.assertEqual(chan.limit, chan.position)
+        return decoded
+
+    def test_log_entry(self):
+        """ Round-trip the logEntry message from the README. """
+        msg = self.make_log_entry()
+        self.assertEqual(msg, self.round_trip(LOG_ENTRY, msg))
+
+    def test_matches_typed(self):
+        """ A spec writes the same bytes as the T_PUT_FUNCS table. """
+        msg = self.make_log_entry()
+        chan = Channel(LEN_BUFF)
+        LOG_ENTRY.encode(chan, msg)
+
+        chan2 = Channel(LEN_BUFF)
+        for fname, field_nbr, ftype in LOG_ENTRY.fields:
+            T_PUT_FUNCS[ftype.value](chan2, msg[fname], field_nbr)
+        self.assertEqual(chan.buffer[:chan.position],
+                         chan2.buffer[:chan2.position])
+
+    def test_all_types(self):
+        """ Round-trip a value of every field type. """
+        msg = {
+            'vbool': True, 'venum': 7, 'vuint32': 0xffffffff,
+            'vsint32': -192, 'vuint64': 0xffffffffffffffff,
+            'vsint64': -(1 << 63), 'fuint32': 0x80000000,
+            'fsint32': -15379, 'ffloat': 0.15625,
+            'fuint64': 0x8000000000000000, 'fsint64': -2, 'fdouble': 1e300,
+            'lstring': 'abc', 'lbytes': b'\x00\x01',
+            'fbytes16': bytes(range(16)), 'fbytes20': bytes(range(20)),
+            'fbytes32': bytes(range(32)), }
+        self.assertEqual(msg, self.round_trip(EVERYTHING, msg))
+
+        # fields which are absent or None are not written
+        self.assertEqual({'vbool': False},
+                         self.round_trip(EVERYTHING, {'vbool': False,
+                                                      'venum': None}))
+
+    def test_nested(self):
+        """ Round-trip a message containing another. """
+        msg = {'seq': 42, 'entry': self.make_log_entry(),
+               'trailer': b'end'}
+        self.assertEqual(msg, self.round_trip(ENVELOPE, msg))
+
+    def test_size_with_plan(self):
+        """
+        encode() given the nested lengths from size_with_plan() writes
+        the same bytes without sizing the message again.
+        """
+        msg = {'seq': 7, 'entry': self.make_log_entry(), 'trailer': b'z'}
+        size, sizes = ENVELOPE.size_with_plan(msg)
+        self.assertEqual(ENVELOPE.size(msg), size)
+        self.assertEqual([LOG_ENTRY.size(msg['entry'])], sizes)
+
+        expected = Channel(LEN_BUFF)
+        ENVELOPE.encode(expected, msg)
+        chan = Channel(LEN_BUFF)
+        calls = []
+        original = MessageSpec._size
+        MessageSpec._size = lambda *args: calls.append(1) or original(*args)
+        try:
+            ENVELOPE.encode(chan, msg, sizes)
+        finally:
+            MessageSpec._size = original
+        self.assertEqual([], calls)
+        self.assertEqual(expected.buffer[:size], chan.buffer[:size])
+        self.assertEqual(size, chan.position)
+
+    def test_plan(self):
+        """ The plan describes each field as the spec encodes it. """
+        plan = ENVELOPE.plan
+        self.assertEqual([decl[0] for decl in ENVELOPE.fields],
+                         [field.name for field in plan])
+        msg = {'seq': 7, 'entry': self.make_log_entry(), 'trailer': b'z'}
+        for field in plan:
+            self.assertEqual(field.field_nbr, field.hdr >> 3)
+            self.assertFalse(field.packed)
+            if field.sub is None:
+                chan = Channel(LEN_BUFF)
+                field.put(chan, msg[field.name])
+                self.assertEqual(field.size(msg[field.name]), chan.position)
+                chan.flip()
+                self.assertEqual(msg[field.name], field.get(chan))
+            else:
+                self.assertIs(LOG_ENTRY, field.sub)
+                self.assertIsNone(field.put)
+
+    def test_encode_exact(self):
+        """
+        encode_exact sizes a nested message in one pass and writes it
+        into a buffer which is just big enough.
+        """
+        msg = {'seq': 1, 'entry': self.make_log_entry(), 'trailer': b'x'}
+        wb_ = ENVELOPE.encode_exact(msg)
+        size = ENVELOPE.size(msg)
+        self.assertEqual(size, wb_.position)
+        self.assertEqual(size, wb_.limit)
+        self.assertEqual(size + 1, wb_.capacity)
+        self.assertEqual(size + 1, len(wb_.buffer))
+        self.assertFalse(wb_.auto_grow)
+
+        chan = Channel(LEN_BUFF)
+        ENVELOPE.encode(chan, msg)
+        self.assertEqual(chan.buffer[:size], wb_.buffer[:size])
+
+        wb_.position = 0
+        self.assertEqual(msg, ENVELOPE.decode(wb_))
+
+    def test_lmsg_typed(self):
+        """ The typed L_MSG functions handle serialized messages. """
+        entry = LOG_ENTRY.encode_exact(self.make_log_entry())
+        payload = entry.buffer[:entry.limit]
+        chan = Channel(LEN_BUFF)
+        T_PUT_FUNCS[FieldTypes.L_MSG.value](chan, payload, 2)
+        self.assertEqual(chan.position,
+                         T_LEN_FUNCS[FieldTypes.L_MSG.value](payload, 2))
+
+    def test_bad_specs(self):
+        """ Badly formed specs are rejected. """
+        self.assertRaises(WireopsError, MessageSpec, '5abc', [])
+        self.assertRaises(WireopsError, MessageSpec, 'm', [
+            ('a.b', 1, FieldTypes.V_BOOL)])
+        self.assertRaises(WireopsError, MessageSpec, 'm', [
+            ('a', 1, FieldTypes.V_BOOL), ('a', 2, FieldTypes.V_BOOL)])
+        self.assertRaises(WireopsError, MessageSpec, 'm', [
+            ('a', 1, FieldTypes.V_BOOL), ('b', 1, FieldTypes.V_BOOL)])
+        self.assertRaises(WireopsError, MessageSpec, 'm', [
+            ('a', 1, FieldTypes.L_BYTES, LOG_ENTRY)])
+
+    def test_unknown_field(self):
+        """ Decoding a field not in the spec raises WireopsError. """
+        chan = Channel(LEN_BUFF)
+        EVERYTHING.encode(chan, {'vuint64': 99})
+        chan.flip()
+        self.assertRaises(WireopsError, LOG_ENTRY.decode, chan)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# test_speedups.py
+
+""" Test that the C extension agrees with the pure Python code. """
+
+import os
+import subprocess
+import sys
+import time
+import unittest
+from mmap import mmap
+
+from rnglib import SimpleRNG
+from wireops import raw, typed
+from wireops.raw import HAVE_SPEEDUPS, WireBuffer
+from wireops.vector import HAVE_NUMPY, np
+
+EDGES = [0, 1, 0x7f, 0x80, 0x3fff, 0x4000, (1 << 31) - 1, 1 << 31,
+         (1 << 32) - 1, 1 << 32, (1 << 63) - 1, 1 << 63, (1 << 64) - 1,
+         -1, -(1 << 31), -(1 << 63), 1 << 64, 1 << 70, -(1 << 70)]
+if HAVE_NUMPY:
+    # integers which are not ints go to the pure Python code
+    EDGES += [np.int64(-5), np.int64(1 << 40), np.uint32(7),
+              np.uint32((1 << 32) - 1), np.uint64(1 << 63)]
+
+
+@unittest.skipUnless(HAVE_SPEEDUPS, "the C extension is not built")
+class TestSpeedups(unittest.TestCase):
+    """ Test that the C extension agrees with the pure Python code. """
+
+    def setUp(self):
+        self.rng = SimpleRNG(time.time())
+        self.values = EDGES + [self.rng.next_int64() >> self.rng.next_int16(64)
+                               for _ in range(200)]
+
+    def tearDown(self):
+        pass
+
+    def outcome(self, func, *args):
+        """ Return what func returns, or the type of what it raises. """
+        try:
+            return func(*args)
+        except Exception as exc:                # pylint: disable=W0703
+            return type(exc)
+
+    def check_funcs(self, module, name, args):
+        """ Check that both versions of a function agree on args. """
+        fast = getattr(module, name)
+        slow = getattr(module, '_PY_FUNCS')[name]
+        self.assertIsNot(fast, slow)
+        self.assertEqual(self.outcome(slow, *args),
+                         self.outcome(fast, *args), (name, args))
+
+    def test_scalars(self):
+        """ Varint lengths and zig-zag encoding agree on every value. """
+        for value in self.values + [1.5, None]:
+            self.check_funcs(raw, 'length_as_varint', (value,))
+            for name in ('encode_sint32', 'decode_sint32',
+                         'encode_sint64', 'decode_sint64'):
+                self.check_funcs(typed, name, (value,))
+
+    def check_channel(self, name, make_chan, args):
+        """
+        Check that both versions of a reader or writer leave identical
+        channels and return identical results.
+        """
+        fast_chan = make_chan()
+        slow_chan = make_chan()
+        self.assertEqual(
+            self.outcome(raw._PY_FUNCS[name], slow_chan, *args),
+            self.outcome(getattr(raw, name), fast_chan, *args),
+            (name, args))
+        self.assertEqual(bytes(slow_chan.buffer), bytes(fast_chan.buffer))
+        self.assertEqual(slow_chan.position, fast_chan.position)
+
+    def test_channels(self):
+        """ Readers and writers agree, including at the buffer's end. """
+        for value in self.values + [1.5]:
+            for size in (4, 8, 16):
+                for auto_grow in (False, True):
+                    for name in ('write_raw_varint', 'write_raw_b32',
+                                 'write_raw_b64'):
+                        def make_chan(size=size, auto_grow=auto_grow):
+                            return WireBuffer(size, auto_grow=auto_grow)
+                        self.check_channel(name, make_chan, (value,))
+
+        data = bytes(self.rng.some_bytes(64))
+        for offset in range(64):
+            def make_chan(offset=offset):
+                chan = WireBuffer(64, bytearray(data))
+                chan.position = offset
+                return chan
+            for name in ('read_raw_varint', 'read_raw_b32', 'read_raw_b64'):
+                self.check_channel(name, make_chan, ())
+
+        # a varint of more than 64 bits is decoded as Python would
+        data = b'\xff' * 12 + b'\x01'
+        self.check_channel('read_raw_varint',
+                           lambda: WireBuffer(16, bytearray(data)), ())
+
+    def test_read_only(self):
+        """ A read-only buffer is read, but not written, by both. """
+        anon = mmap(-1, 16)
+        anon[0:3] = b'\xac\x02\x00'
+
+        class ReadOnly(object):
+            """ A channel over a read-only view. """
+            buffer = memoryview(anon).toreadonly()
+            position = 0
+        self.check_channel('read_raw_varint', ReadOnly, ())
+        self.check_channel('write_raw_varint', ReadOnly, (300,))
+
+    def test_pure_python(self):
+        """ WIREOPS_PURE_PYTHON turns the extension off. """
+        env = dict(os.environ, WIREOPS_PURE_PYTHON='1')
+        out = subprocess.check_output(
+            [sys.executable, '-c',
+             'import wireops.raw; print(wireops.raw.HAVE_SPEEDUPS)'],
+            env=env)
+        self.assertEqual(b'False', out.strip())
+
+
+if __name__ == '__main__':
+    unittest.main()
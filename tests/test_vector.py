@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# test_vector.py
+
+""" Test the vectorized varint and zig-zag operations. """
+
+import time
+import unittest
+
+from rnglib import SimpleRNG
+from wireops import vector
+from wireops.chan import Channel
+from wireops.raw import length_as_varint, write_varints
+from wireops.typed import(
+    encode_sint32, decode_sint32, encode_sint64, decode_sint64)
+
+BORDER_VALUES = [
+    0, 42, 0x7f, 0x80, 0x3fff, 0x4000, 0x1fffff, 0x200000,
+    0xfffffff, 0x10000000, 0x7ffffffff, 0x800000000,
+    0x7fffffffffffffff, 0x8000000000000000, 0xffffffffffffffff, ]
+
+SIGNED32 = [0, -1, 1, -2, 2, -192, 15379, -15379,
+            -128 * 256 * 256 * 256, 128 * 256 * 256 * 256 - 1]
+SIGNED64 = SIGNED32 + [-(1 << 63), (1 << 63) - 1]
+
+
+class TestVector(unittest.TestCase):
+    """ Test the vectorized varint and zig-zag operations. """
+
+    def setUp(self):
+        self.rng = SimpleRNG(time.time())
+
+    def tearDown(self):
+        pass
+
+    def expected_bytes(self, values):
+        """ Pack values one at a time using write_varints. """
+        chan = Channel(10 * len(values) + 1)
+        write_varints(chan, values)
+        return bytes(chan.buffer[:chan.position])
+
+    def check_impl(self, pack, unpack, lengths):
+        """ Exercise one implementation of the varint functions. """
+        values = BORDER_VALUES + [self.rng.next_int64() for _ in range(32)]
+        data = pack(values)
+        self.assertEqual(self.expected_bytes(values), data)
+        self.assertEqual(values, [int(v) for v in unpack(data)])
+        self.assertEqual([length_as_varint(v) for v in values],
+                         [int(n) for n in lengths(values)])
+
+        self.assertEqual(b'', pack([]))
+        self.assertEqual(0, len(unpack(b'')))
+        self.assertRaises(ValueError, unpack, b'\x01\x80')
+
+    def check_zigzag(self, enc32, dec32, enc64, dec64):
+        """ Exercise one implementation of the zig-zag functions. """
+        self.assertEqual([encode_sint32(v) for v in SIGNED32],
+                         [int(v) for v in enc32(SIGNED32)])
+        self.assertEqual(SIGNED32, [int(v) for v in dec32(enc32(SIGNED32))])
+        self.assertEqual([encode_sint64(v) for v in SIGNED64],
+                         [int(v) for v in enc64(SIGNED64)])
+        self.assertEqual(SIGNED64, [int(v) for v in dec64(enc64(SIGNED64))])
+
+        encoded = [encode_sint32(v) for v in SIGNED32]
+        self.assertEqual([decode_sint32(v) for v in encoded],
+                         [int(v) for v in dec32(encoded)])
+        encoded = [encode_sint64(v) for v in SIGNED64]
+        self.assertEqual([decode_sint64(v) for v in encoded],
+                         [int(v) for v in dec64(encoded)])
+
+    def test_pure_python(self):
+        """ The fallback path must work whether or not NumPy is present. """
+        # pylint: disable=protected-access
+        self.check_impl(vector._py_pack_varints, vector._py_unpack_varints,
+                        vector._py_varint_lengths)
+        self.check_zigzag(vector._py_encode_sint32s,
+                          vector._py_decode_sint32s,
+                          vector._py_encode_sint64s,
+                          vector._py_decode_sint64s)
+
+    @unittest.skipUnless(vector.HAVE_NUMPY, 'NumPy is not installed')
+    def test_numpy(self):
+        """ The NumPy path must agree with the pure-Python codecs. """
+        # pylint: disable=protected-access
+        self.check_impl(vector._np_pack_varints, vector._np_unpack_varints,
+                        vector._np_varint_lengths)
+        self.check_zigzag(vector._np_encode_sint32s,
+                          vector._np_decode_sint32s,
+                          vector._np_encode_sint64s,
+                          vector._np_decode_sint64s)
+
+    def test_signed_round_trip(self):
+        """ Round-trip signed values through the public interface. """
+        self.assertEqual(SIGNED32, [int(v) for v in vector.unpack_sint32s(
+            vector.pack_sint32s(SIGNED32))])
+        self.assertEqual(SIGNED64, [int(v) for v in vector.unpack_sint64s(
+            vector.pack_sint64s(SIGNED64))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,8 @@ import unittest
 from rnglib import SimpleRNG
 from wireops.raw import(
     next_power_of_two,
+    read_raw_varint, write_raw_varint, write_varints,
+    write_raw_b32, write_raw_b64s, write_raw_bytes,
     WireBuffer,
 )
 # from wireops.raw import *
@@ -66,6 +68,61 @@ class TestWireBuffer(unittest.TestCase):
 
         self.assertEqual(wb_.buffer, wb_2.buffer)
 
+    def test_large_reserve(self):
+        """ A request much larger than the capacity is met in one step. """
+        wb_ = WireBuffer(16)
+        wb_.position = 8
+        wb_.reserve(5000)
+        self.assertEqual(8192, wb_.capacity)
+        self.assertEqual(8192, wb_.limit)
+        self.assertEqual(5008, wb_.high_water)
+
+    def test_exact(self):
+        """ An exact buffer's capacity is not rounded up. """
+        wb_ = WireBuffer(1026, exact=True)
+        self.assertEqual(1026, wb_.capacity)
+        self.assertEqual(1026, len(wb_.buffer))
+        self.assertEqual(1026, wb_.limit)
+        wb_ = WireBuffer(0, buffer=bytearray(100), exact=True)
+        self.assertEqual(100, wb_.capacity)
+
+        # a copy shares the buffer without growing it
+        wb_ = WireBuffer(11, exact=True)
+        wb_2 = wb_.copy()
+        self.assertIs(wb_.buffer, wb_2.buffer)
+        self.assertEqual(11, len(wb_.buffer))
+        self.assertEqual(11, wb_2.capacity)
+        wb_.limit = 11
+
+    def test_auto_grow(self):
+        """
+        Writers grow an auto-growing buffer as required but raise if
+        the buffer is fixed.
+        """
+        fixed = WireBuffer(16)
+        self.assertFalse(fixed.auto_grow)
+        self.assertRaises(ValueError, write_raw_bytes, fixed, bytes(32))
+        self.assertRaises(ValueError, write_raw_b64s, fixed, [1, 2])
+
+        wb_ = WireBuffer(16, auto_grow=True)
+        self.assertTrue(wb_.auto_grow)
+        write_raw_varint(wb_, 0xffffffffffffffff)
+        write_raw_b32(wb_, 0x12345678)
+        write_raw_bytes(wb_, bytes(range(100)))
+        values = [self.rng.next_int64() for _ in range(100)]
+        write_varints(wb_, values)
+        write_raw_b64s(wb_, values)
+        end = wb_.position
+        self.assertTrue(end < wb_.capacity)
+        self.assertEqual(next_power_of_two(end + 1), wb_.capacity)
+        self.assertEqual(end, wb_.high_water)
+
+        wb_.position = 0
+        self.assertEqual(0xffffffffffffffff, read_raw_varint(wb_))
+
+        # the copy shares the buffer and grows in the same way
+        self.assertTrue(wb_.copy().auto_grow)
+
 
 if __name__ == '__main__':
     unittest.main()